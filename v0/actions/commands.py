@@ -1,6 +1,8 @@
+import os
 import subprocess
 import json
-from sonos import play_on_sonos
+from sonos import broadcast_on_sonos
+from tts import synthesize_speech_elevenlabs
 from db.models import add_todo, get_todos, supabase
 from utilities.activity_logger import logger
 
@@ -13,10 +15,13 @@ def open_garage_door():
         logger.error(f"Error in open_garage_door: {e}")
         return f"Failed to open the garage door: {e}"
 
-def dinner_is_ready():
-    logger.info("Function dinner_is_ready triggered")
+def dinner_is_ready(rooms=None):
+    # rooms: "all", a comma-separated list of room names, or a list.
+    rooms = rooms or os.getenv("JARVIS_ANNOUNCE_ROOMS", "Bedroom")
+    logger.info(f"Function dinner_is_ready triggered for rooms: {rooms}")
     try:
-        play_on_sonos("dinner is ready", room_name="Bedroom")
+        filename = synthesize_speech_elevenlabs("Dinner is ready.")
+        broadcast_on_sonos(filename, rooms)
         return "I announced that dinner is ready."
     except Exception as e:
         logger.error(f"Error in dinner_is_ready: {e}")
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+
+# Answer commands the router is sure of locally instead of through the LLM (0 to always ask the LLM).
+FAST_INTENTS = os.getenv("JARVIS_FAST_INTENTS", "1") == "1"
+
+# Politeness and address that don't change what is being asked.
+_FILLER = re.compile(
+    r"^(?:(?:hey |ok |okay )?jarvis,? )?(?:(?:could|can|would|will) you (?:please )?|please )?|"
+    r"(?:,? please|,? jarvis|,? thanks|,? thank you)+$"
+)
+
+def _normalize(text):
+    text = " ".join(re.sub(r"[^\w\s',]", " ", text.lower()).split())
+    return _FILLER.sub("", text).strip(" ,")
+
+# Arguments that only make sense with context the router doesn't have ("mark it as done").
+_VAGUE = {"it", "that", "this", "them", "those", "everything", "all", "something"}
+# A task name is a short phrase; anything longer, or with a question or a second
+# clause in it, is more likely chat than a command and goes to the LLM.
+MAX_ARGUMENT_WORDS = 8
+MAX_ARGUMENT_CHARS = 60
+_NOT_AN_ARGUMENT = {"and", "what", "how", "should", "why", "when", "where", "which", "who"}
+
+def _plausible(value):
+    words = value.split()
+    return (value not in _VAGUE and len(value) <= MAX_ARGUMENT_CHARS and len(words) <= MAX_ARGUMENT_WORDS
+            and "," not in value and not _NOT_AN_ARGUMENT.intersection(words))
+
+def _failed(result):
+    return result.startswith(("Failed", "Error", "No task", "Multiple tasks", "All tasks", "Function"))
+
+def _acknowledge(result):
+    if _failed(result):
+        return f"I'm afraid that didn't work, sir. {result}"
+    return f"Very good, sir. {result}"
+
+def _list_tasks(result):
+    if _failed(result):
+        return _acknowledge(result)
+    open_tasks = [re.sub(r"^\d+\. | - In progress$", "", line) for line in result.splitlines() if line.endswith("In progress")]
+    if not open_tasks:
+        return "Your list is clear, sir. Nothing outstanding."
+    if len(open_tasks) == 1:
+        return f"Just the one, sir: {open_tasks[0]}."
+    return f"You have {len(open_tasks)} things on the list, sir: {', '.join(open_tasks[:-1])} and {open_tasks[-1]}."
+
+class Intent:
+    """
+    A command the router can recognise: the function it maps to, anchored
+    patterns over the normalized utterance (named groups become arguments),
+    and a template that turns the function's result into Jarvis's reply.
+    Only intents that are themselves questions ("what are my tasks?") accept
+    an utterance ending in a question mark.
+    """
+    def __init__(self, name, patterns, reply=_acknowledge, question=False):
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.reply = reply
+        self.question = question
+
+    def match(self, text, question=False):
+        if question and not self.question:
+            return None
+        for pattern in self.patterns:
+            found = pattern.fullmatch(text)
+            if found:
+                arguments = {key: value.strip() for key, value in found.groupdict().items() if value}
+                if all(_plausible(value) for value in arguments.values()):
+                    return arguments
+        return None
+
+_TASK = r"(?:task|todo|to do|to-do)"
+_LIST = r"(?:(?:my |the )?(?:task|todo|to do|to-do) list|(?:my |the )?(?:tasks|todos|to dos|to-dos))"
+# The task's name: no commas, and not "list" or "app" ("create a todo list for my trip").
+_NAME = r"(?!(?:list|lists|app|apps)\b)(?P<task>[\w' ]+?)"
+
+INTENTS = [
+    Intent("open_garage_door", [
+        r"(?:open|raise) (?:up )?(?:the |my )?garage(?: door)?",
+    ]),
+    Intent("get_tasks", [
+        rf"what(?:'s| is| are)(?: on)? {_LIST}",
+        rf"(?:list|show|read|tell me|give me|get) (?:me )?{_LIST}",
+        r"(?:do i have any|have i got any|any) (?:tasks|todos|to dos)",
+    ], reply=_list_tasks, question=True),
+    Intent("create_task", [
+        rf"(?:add|create|make) (?:a |an )?(?:new )?{_TASK}(?: to| for| called| named)? {_NAME}",
+        rf"(?:add|put) {_NAME} (?:to|on) {_LIST}",
+        rf"remind me to {_NAME}",
+    ]),
+    Intent("mark_task_done", [
+        rf"(?:mark|set) (?:the )?(?:{_TASK} )?{_NAME} (?:as )?(?:done|complete|completed|finished)",
+        rf"(?:tick|check|cross) off (?:the )?(?:{_TASK} )?{_NAME}(?: (?:on|from) (?:{_LIST}|(?:my |the )?list))?",
+        rf"(?:complete|finish) (?:the )?{_TASK} {_NAME}",
+        rf"i(?:'ve| have)? (?:finished|completed|done) (?:the )?{_TASK} {_NAME}",
+    ]),
+]
+
+class IntentRouter:
+    """
+    Local fast path for common commands. An utterance that fully matches one
+    of an intent's patterns (after dropping "Jarvis", "please" and the like)
+    is dispatched straight to its function in the AVAILABLE_FUNCTIONS
+    registry and answered from the intent's template, with no LLM round
+    trips. Anything less certain returns None and goes to the LLM as before:
+    questions, several clauses, or an argument too long to be a task name.
+    Intents whose function isn't registered are left out.
+    """
+    def __init__(self, intents=INTENTS, functions=None):
+        if functions is None:
+            from actions.commands import AVAILABLE_FUNCTIONS as functions
+        self.intents = [intent for intent in intents if intent.name in functions]
+
+    def match(self, text):
+        """(intent, function_call) for a confident match, or None."""
+        normalized = _normalize(text)
+        question = "?" in text
+        for intent in self.intents:
+            arguments = intent.match(normalized, question)
+            if arguments is not None:
+                return intent, {"name": intent.name, "arguments": json.dumps(arguments) if arguments else ""}
+        return None
+
+_router = None
+
+def route_intent(text):
+    """Match text against the shared router; None when fast intents are off or nothing matches confidently."""
+    global _router
+    if not FAST_INTENTS:
+        return None
+    if _router is None:
+        _router = IntentRouter()
+    return _router.match(text)
+
+if __name__ == "__main__":
+    # Match timing over a mix of commands and ordinary chat; the fast path adds
+    # this to every turn and saves two LLM round trips on the ones it takes.
+    router = IntentRouter(functions={intent.name: None for intent in INTENTS})
+    samples = [
+        "Jarvis, open the garage door please.",
+        "What are my tasks?",
+        "Add a task to buy milk",
+        "Remind me to call the plumber tomorrow.",
+        "Mark buy milk as done",
+        "Mark it as done",
+        "Could you tell me a joke?",
+        "What's the weather like in London?",
+        "Is the garage door open?",
+        "I've finished my homework, what should I do next?",
+        "Create a todo list for my trip",
+    ]
+    for sample in samples:
+        found = router.match(sample)
+        print(f"{sample!r:45} -> {found[1] if found else 'LLM'}")
+    start = time.perf_counter()
+    rounds = 2000
+    for _ in range(rounds):
+        for sample in samples:
+            router.match(sample)
+    print(f"{(time.perf_counter() - start) / (rounds * len(samples)) * 1e6:.1f} us per utterance")
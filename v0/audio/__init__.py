@@ -0,0 +1,2 @@
+from .broker import StreamBroker
+from .ringbuffer import AudioRingBuffer, RingReader
@@ -0,0 +1,321 @@
+import socket
+import selectors
+import threading
+import time
+from collections import deque
+from .features import FrameFeatures, RunningMean
+from .protocol import (
+    ROLE_PUBLISHER, ROLE_SUBSCRIBER, ROLE_FRAMED_PUBLISHER, ROLE_FRAMED_SUBSCRIBER,
+    SAMPLE_INT16, FrameParser, ProtocolError, StreamFormat, encode_frame, to_mono_int16,
+)
+
+class _Subscriber:
+    def __init__(self, sock, address, max_buffer_bytes, framed=False):
+        self.sock = sock
+        self.address = address
+        self.framed = framed
+        self.parser = FrameParser() if framed else None
+        self.max_buffer_bytes = max_buffer_bytes
+        self.chunks = deque()
+        self.head_offset = 0  # Bytes of chunks[0] already sent.
+        self.buffered = 0
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.chunks_dropped = 0
+        self.connected_at = time.time()
+
+    def enqueue(self, data):
+        self.chunks.append(data)
+        self.buffered += len(data)
+        # Drop the oldest audio once the subscriber falls too far behind, but never
+        # a chunk that is half sent, or the subscriber would lose sample/frame alignment.
+        # Framed subscribers see the drop as a gap in sequence numbers.
+        while self.buffered > self.max_buffer_bytes and len(self.chunks) > 1:
+            index = 1 if self.head_offset else 0
+            dropped = self.chunks[index]
+            del self.chunks[index]
+            self.buffered -= len(dropped)
+            self.bytes_dropped += len(dropped)
+            self.chunks_dropped += 1
+
+    def flush(self):
+        """Send as much buffered audio as the socket will take without blocking."""
+        while self.chunks:
+            view = memoryview(self.chunks[0])[self.head_offset:]
+            try:
+                sent = self.sock.send(view)
+            except BlockingIOError:
+                return
+            self.bytes_sent += sent
+            self.buffered -= sent
+            if sent < len(view):
+                self.head_offset += sent
+                return
+            self.chunks.popleft()
+            self.head_offset = 0
+
+class _Connection:
+    """A client that connected but hasn't sent its role marker yet."""
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.pending = b""
+
+class StreamBroker:
+    """
+    Single-threaded pub/sub fan-out for PCM streams.
+    All sockets are non-blocking and multiplexed with selectors, so the thread
+    count stays constant however many clients connect. Each subscriber gets a
+    bounded buffer: a slow or stalled subscriber only loses its own oldest
+    audio (drop-oldest) and never holds up the publisher or other subscribers.
+
+    Clients speak either the original raw protocol (PUB/SUB followed by bare
+    44.1 kHz PCM) or the framed protocol in audio.protocol (PBF/SBF), whose
+    headers carry the sample rate, channels, format and a sequence number.
+    Raw publishers are wrapped into frames for framed subscribers, and framed
+    payloads are converted to mono 16-bit and forwarded bare to raw
+    subscribers, which have no header to learn any other layout from.
+    Framed subscribers get the stream as published and convert it themselves.
+    """
+    def __init__(self, listen_socket, chunk_size=4096, max_buffer_seconds=2.0,
+                 bytes_per_second=44100 * 2, on_publish=None):
+        self.listen_socket = listen_socket
+        self.chunk_size = chunk_size
+        self.bytes_per_second = bytes_per_second
+        self.max_buffer_bytes = int(max_buffer_seconds * bytes_per_second)
+        self.on_publish = on_publish
+        self.selector = selectors.DefaultSelector()
+        self.publishers = {}  # socket -> {"address", "bytes", "remainder", "parser", "format", "level", "peak"}
+        self._features = FrameFeatures(chunk_size)
+        self.subscribers = {}  # socket -> _Subscriber
+        self.current_format = None
+        self.sequence = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._wake_r, self._wake_w = socket.socketpair()
+
+    def serve_forever(self):
+        self.listen_socket.setblocking(False)
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, "accept")
+        self._wake_r.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+        self._running = True
+        try:
+            while self._running:
+                for key, mask in self.selector.select(timeout=1.0):
+                    try:
+                        self._dispatch(key, mask)
+                    except Exception as e:
+                        print(f"Stream broker error: {e}")
+        finally:
+            for sock in list(self.publishers) + list(self.subscribers):
+                self._close(sock)
+            self.selector.close()
+
+    def stop(self):
+        self._running = False
+        try:
+            self._wake_w.send(b"x")
+        except OSError:
+            pass
+
+    def _dispatch(self, key, mask):
+        if key.data == "accept":
+            client_socket, address = self.listen_socket.accept()
+            client_socket.setblocking(False)
+            self.selector.register(client_socket, selectors.EVENT_READ, _Connection(client_socket, address))
+        elif key.data == "wake":
+            self._wake_r.recv(64)
+        elif isinstance(key.data, _Connection):
+            self._handle_handshake(key.data)
+        elif key.data == "publisher":
+            self._handle_publisher(key.fileobj)
+        elif isinstance(key.data, _Subscriber):
+            self._handle_subscriber(key.data, mask)
+
+    def _handle_handshake(self, conn):
+        data = conn.sock.recv(3 - len(conn.pending))
+        if not data:
+            self._close(conn.sock)
+            return
+        conn.pending += data
+        if len(conn.pending) < 3:
+            return
+        # Read role marker (3 bytes)
+        role = conn.pending
+        if role in (ROLE_PUBLISHER, ROLE_FRAMED_PUBLISHER):
+            framed = role == ROLE_FRAMED_PUBLISHER
+            print(f"Publisher connected from {conn.address}{' (framed)' if framed else ''}")
+            with self._lock:
+                self.publishers[conn.sock] = {
+                    "address": conn.address,
+                    "bytes": 0,
+                    "remainder": b"",
+                    "parser": FrameParser() if framed else None,
+                    "format": None if framed else StreamFormat(),
+                    "level": RunningMean(32),  # Mean RMS (dBFS) over the last 32 chunks.
+                    "peak": -200.0,
+                }
+            self.selector.modify(conn.sock, selectors.EVENT_READ, "publisher")
+        elif role in (ROLE_SUBSCRIBER, ROLE_FRAMED_SUBSCRIBER):
+            framed = role == ROLE_FRAMED_SUBSCRIBER
+            print(f"Subscriber connected from {conn.address}{' (framed)' if framed else ''}")
+            subscriber = _Subscriber(conn.sock, conn.address, self.max_buffer_bytes, framed=framed)
+            with self._lock:
+                self.subscribers[conn.sock] = subscriber
+            self.selector.modify(conn.sock, selectors.EVENT_READ, subscriber)
+            if framed and self.current_format:
+                # Tell the new subscriber what it is about to receive.
+                subscriber.enqueue(encode_frame(self.current_format, self.sequence, b""))
+                self._flush(subscriber)
+        else:
+            print(f"Unknown role from {conn.address}, closing connection")
+            self._close(conn.sock)
+
+    def _handle_publisher(self, sock):
+        publisher = self.publishers[sock]
+        try:
+            data = sock.recv(self.chunk_size * 2)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            print(f"Error handling publisher {publisher['address']}: {e}")
+            data = b""
+        if not data:
+            print(f"Publisher disconnected {publisher['address']}")
+            self._close(sock)
+            return
+        publisher["bytes"] += len(data)
+        if publisher["parser"]:
+            try:
+                frames = publisher["parser"].feed(data)
+            except ProtocolError as e:
+                print(f"Error handling publisher {publisher['address']}: {e}")
+                self._close(sock)
+                return
+            for fmt, _sequence, timestamp_us, payload in frames:
+                publisher["format"] = fmt
+                if payload:
+                    self._meter(publisher, fmt, payload)
+                    self._publish(fmt, payload, timestamp_us)
+            return
+        # Forward whole 16-bit samples only, so dropping a chunk never shifts alignment.
+        data = publisher["remainder"] + data
+        usable = len(data) - (len(data) % 2)
+        publisher["remainder"] = data[usable:]
+        data = data[:usable]
+        if data:
+            self._meter(publisher, publisher["format"], data)
+            self._publish(publisher["format"], data)
+
+    def _meter(self, publisher, fmt, payload):
+        if fmt.sample_format == SAMPLE_INT16:
+            self._features.compute(payload)
+            publisher["level"].add(self._features.rms_db)
+            publisher["peak"] = max(self._features.peak_db, publisher["peak"] - 0.5)  # Slowly decaying peak hold.
+
+    def _publish(self, fmt, payload, timestamp_us=None):
+        if fmt != self.current_format:
+            print(f"Stream format is now {fmt}")
+            self.current_format = fmt
+        if self.on_publish:
+            self.on_publish(payload, fmt)
+        self.broadcast(fmt, payload, timestamp_us)
+
+    def broadcast(self, fmt, payload, timestamp_us=None):
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        frame = pcm = None
+        for subscriber in list(self.subscribers.values()):
+            # Encode and convert once, shared by every subscriber of each kind.
+            if subscriber.framed:
+                if frame is None:
+                    frame = encode_frame(fmt, self.sequence, payload, timestamp_us)
+                subscriber.enqueue(frame)
+            else:
+                if pcm is None:
+                    pcm = to_mono_int16(payload, fmt)
+                subscriber.enqueue(pcm)
+            self._flush(subscriber)
+
+    def _flush(self, subscriber):
+        try:
+            subscriber.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            # Subscriber disconnected; remove silently.
+            self._close(subscriber.sock)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.chunks else 0)
+        try:
+            self.selector.modify(subscriber.sock, events, subscriber)
+        except (KeyError, ValueError):
+            pass
+
+    def _handle_subscriber(self, subscriber, mask):
+        if mask & selectors.EVENT_READ:
+            try:
+                data = subscriber.sock.recv(1024)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError:
+                data = b""
+            if data == b"":
+                self._close(subscriber.sock)
+                return
+            if data and subscriber.framed:
+                # The only thing a framed subscriber sends is its hello with the format it would like.
+                # It gets the stream as published either way and converts it on receipt.
+                try:
+                    for fmt, _sequence, _timestamp, _payload in subscriber.parser.feed(data):
+                        if self.current_format and fmt != self.current_format:
+                            print(f"Subscriber {subscriber.address} asked for {fmt}, stream is {self.current_format}")
+                except ProtocolError as e:
+                    print(f"Error in subscriber {subscriber.address}: {e}")
+                    self._close(subscriber.sock)
+                    return
+        if mask & selectors.EVENT_WRITE:
+            self._flush(subscriber)
+
+    def _close(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        with self._lock:
+            self.publishers.pop(sock, None)
+            subscriber = self.subscribers.pop(sock, None)
+        if subscriber:
+            print(f"Subscriber {subscriber.address} disconnected")
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def stats(self):
+        """Per-client counters; subscriber lag is the audio buffered but not yet sent."""
+        now = time.time()
+        bytes_per_second = self.current_format.bytes_per_second if self.current_format else self.bytes_per_second
+        with self._lock:
+            publishers = [
+                {
+                    "address": p["address"],
+                    "bytes_received": p["bytes"],
+                    "format": repr(p["format"]),
+                    "level_db": p["level"].mean if p["level"].count else None,
+                    "peak_db": p["peak"] if p["level"].count else None,
+                }
+                for p in self.publishers.values()
+            ]
+            subscribers = [
+                {
+                    "address": s.address,
+                    "framed": s.framed,
+                    "bytes_sent": s.bytes_sent,
+                    "buffered_bytes": s.buffered,
+                    "lag_seconds": s.buffered / bytes_per_second,
+                    "bytes_dropped": s.bytes_dropped,
+                    "chunks_dropped": s.chunks_dropped,
+                    "connected_seconds": now - s.connected_at,
+                }
+                for s in self.subscribers.values()
+            ]
+        return {"publishers": publishers, "subscribers": subscribers}
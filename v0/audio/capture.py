@@ -0,0 +1,87 @@
+import threading
+import pyaudio
+from .ringbuffer import AudioRingBuffer
+
+class MicrophoneCapture:
+    """
+    One PyAudio input stream, opened once and read continuously by a
+    background thread into an AudioRingBuffer. Hotword detection, recording
+    and anything else that needs the microphone take their own reader()
+    cursor instead of opening streams of their own, so nothing is lost
+    between consumers and "flushing" is just moving a cursor to the end.
+    If reads keep failing (the device was unplugged, say) capture stops after
+    max_read_errors in a row and closes the ring, so readers see the end of
+    the audio instead of waiting on a dead microphone.
+    """
+    max_read_errors = 10
+
+    def __init__(self, rate=16000, frames_per_buffer=512, device_index=None, buffer_seconds=35):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.device_index = device_index
+        self.ring = AudioRingBuffer(int(buffer_seconds * rate * 2))
+        self.pa = None
+        self.stream = None
+        self._thread = None
+        self._running = False
+        self.overflows = 0
+
+    def start(self):
+        self.pa = pyaudio.PyAudio()
+        try:
+            self.stream = self.pa.open(
+                rate=self.rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                frames_per_buffer=self.frames_per_buffer,
+                input_device_index=self.device_index
+            )
+        except Exception:
+            self.pa.terminate()
+            self.pa = None
+            raise
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        errors = 0
+        while self._running:
+            try:
+                data = self.stream.read(self.frames_per_buffer, exception_on_overflow=False)
+            except IOError as e:
+                # Input overflow on some hosts; the samples are gone, keep capturing.
+                self.overflows += 1
+                errors += 1
+                print("Microphone read error:", e)
+                if errors >= self.max_read_errors:
+                    print(f"Microphone capture stopped after {errors} read errors in a row.")
+                    self._running = False
+                    break
+                continue
+            except Exception as e:
+                if self._running:
+                    print("Microphone capture stopped:", e)
+                break
+            errors = 0
+            self.ring.write(data)
+        self.ring.close()
+
+    def reader(self):
+        """A cursor at the live end of the capture."""
+        return self.ring.reader()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.pa:
+            self.pa.terminate()
+            self.pa = None
+        self.ring.close()
@@ -0,0 +1,189 @@
+import os
+import random
+import shutil
+import platform
+import threading
+import subprocess
+import numpy as np
+from config import BASE_DIR
+from .encode import to_rate
+
+try:
+    import soundfile
+except Exception:
+    soundfile = None
+
+try:
+    import pyaudio
+except Exception:
+    pyaudio = None
+
+CHIMES_DIR = os.path.join(BASE_DIR, "v0", "assets", "voice", "activate")
+# What each activation clip says, so a recording that only caught the clip can be ignored.
+ACTIVATION_TEXTS = {
+    "welcome-back.mp3": "Welcome back, sir.",
+    "goodday.mp3": "Good day, sir.",
+    "greetings.mp3": "Greetings, sir.",
+    "listening.mp3": "Listening, sir.",
+    "right-here.mp3": "Right here, sir.",
+    "yes-sir.mp3": "Yes, sir.",
+}
+
+class ActivationChimes:
+    """
+    The clips Jarvis answers the wake word with, loaded once. Every clip is
+    decoded into memory at one output rate and played through a single
+    PyAudio output stream that stays open, so a chime starts within one
+    buffer of play() and play() returns at once. For Sonos the clips are
+    copied into audio_cache/ up front and played from a background thread;
+    the speaker's playback lock holds the reply back until the chime has
+    finished and the speaker is restored.
+    Without an output device, local clips fall back to afplay or playsound.
+
+    play() returns the clip's samples at the caller's rate so the voice loop
+    can register them with its echo suppressor and start recording straight
+    away with the chime masked out. A clip that couldn't be decoded (no
+    soundfile) can't be masked, so play() waits for it to finish instead.
+    """
+    def __init__(self, assets_dir=CHIMES_DIR, texts=ACTIVATION_TEXTS, output=True):
+        self.assets_dir = assets_dir
+        self.texts = dict(texts)
+        self.names = [name for name in self.texts if os.path.exists(os.path.join(assets_dir, name))]
+        self.rate = None
+        self._clips = {}
+        self._references = {}
+        self._lock = threading.Lock()
+        self._playing = np.empty(0, dtype=np.int16)
+        self._pa = None
+        self._stream = None
+        self._staged = False
+        self._decode()
+        if output and self._clips:
+            self._open_output()
+
+    def _decode(self):
+        if soundfile is None:
+            return
+        decoded = {}
+        for name in self.names:
+            try:
+                samples, rate = soundfile.read(os.path.join(self.assets_dir, name), dtype="float32", always_2d=True)
+            except Exception as e:
+                print(f"Could not decode activation clip {name}: {e}")
+                continue
+            pcm = np.clip(samples.mean(axis=1) * 32768.0, -32768, 32767).astype(np.int16).tobytes()
+            decoded[name] = (pcm, rate)
+        if not decoded:
+            return
+        # Play everything at the most common rate so one output stream serves all clips.
+        rates = [rate for _pcm, rate in decoded.values()]
+        self.rate = max(set(rates), key=rates.count)
+        for name, (pcm, rate) in decoded.items():
+            self._clips[name] = np.frombuffer(to_rate(pcm, rate, self.rate), dtype=np.int16)
+
+    def _open_output(self):
+        if pyaudio is None:
+            return
+        try:
+            self._pa = pyaudio.PyAudio()
+            self._stream = self._pa.open(
+                rate=self.rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                output=True,
+                frames_per_buffer=512,
+                stream_callback=self._callback,
+            )
+        except Exception as e:
+            print("No output stream for activation clips, using the system player:", e)
+            self.close()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        with self._lock:
+            chunk = self._playing[:frame_count]
+            self._playing = self._playing[frame_count:]
+        if len(chunk) < frame_count:
+            chunk = np.concatenate((chunk, np.zeros(frame_count - len(chunk), dtype=np.int16)))
+        return chunk.tobytes(), pyaudio.paContinue
+
+    def choose(self):
+        """A random clip name, or None if there are no clips."""
+        return random.choice(self.names) if self.names else None
+
+    def text(self, name):
+        return self.texts.get(name, "")
+
+    def reference(self, name, rate):
+        """The clip's samples resampled to rate (cached), or None if it couldn't be decoded."""
+        clip = self._clips.get(name)
+        if clip is None:
+            return None
+        key = (name, rate)
+        if key not in self._references:
+            pcm = clip.tobytes()
+            self._references[key] = clip if rate == self.rate else np.frombuffer(to_rate(pcm, self.rate, rate), dtype=np.int16)
+        return self._references[key]
+
+    def stage(self):
+        """Copy every clip into audio_cache/ once, where the audio server serves Sonos from."""
+        if self._staged:
+            return
+        cache_dir = os.path.join(BASE_DIR, "audio_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in self.names:
+            cache_path = os.path.join(cache_dir, name)
+            if not os.path.exists(cache_path):
+                shutil.copy(os.path.join(self.assets_dir, name), cache_path)
+        self._staged = True
+
+    def play(self, name, speaker=None, rate=None):
+        """
+        Play a clip on the Sonos room speaker if given, otherwise locally.
+        Returns the clip at rate for the echo suppressor without waiting for
+        it; if it has no decoded samples, returns None once it has finished.
+        """
+        reference = self.reference(name, rate or self.rate)
+        if speaker:
+            self.stage()
+            play, args = self._play_sonos, (name, speaker)
+        elif self._stream is not None and reference is not None:
+            with self._lock:
+                self._playing = self._clips[name]
+            return reference
+        else:
+            play, args = self._play_system, (name,)
+        if reference is None:
+            play(*args)
+        else:
+            threading.Thread(target=play, args=args, daemon=True).start()
+        return reference
+
+    def _play_sonos(self, name, speaker):
+        from sonos import play_on_sonos
+        try:
+            play_on_sonos(name, room_name=speaker)
+        except Exception as e:
+            print("Error playing confirmation sound:", e)
+
+    def _play_system(self, name):
+        path = os.path.join(self.assets_dir, name)
+        try:
+            if platform.system() == "Darwin":
+                subprocess.call(["afplay", path])
+            else:
+                from playsound import playsound
+                playsound(path)
+        except Exception as e:
+            print("Error playing confirmation sound:", e)
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop_stream()
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
@@ -0,0 +1,220 @@
+import os
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .encode import to_rate
+
+try:
+    import soundfile
+except Exception:
+    soundfile = None
+
+# How far behind the playback the echo can reach the microphone: a few tens of ms for
+# the local speakers, seconds for Sonos (which buffers) or a remote stream publisher.
+ECHO_MAX_DELAY_MS = float(os.getenv("JARVIS_ECHO_MAX_DELAY_MS", "400"))
+# How far a band has to rise above the expected echo to count as the user talking.
+ECHO_MARGIN_DB = float(os.getenv("JARVIS_ECHO_MARGIN_DB", "8"))
+
+def load_reference(path, rate):
+    """Decode a file about to be played into 16-bit mono PCM at rate; None if it can't be decoded."""
+    if soundfile is None:
+        return None
+    try:
+        samples, file_rate = soundfile.read(path, dtype="float32", always_2d=True)
+    except Exception as e:
+        print(f"Could not decode {os.path.basename(path)} as an echo reference: {e}")
+        return None
+    pcm = np.clip(samples.mean(axis=1) * 32768.0, -32768, 32767).astype(np.int16).tobytes()
+    return np.frombuffer(to_rate(pcm, file_rate, rate), dtype=np.int16)
+
+class EchoSuppressor:
+    """
+    Tells the user's voice apart from Jarvis's own playback coming back through
+    the microphone, using what is being played as a reference signal.
+
+    Playback is registered against positions in the microphone's ring buffer.
+    For each microphone frame, the reference's band energies, delayed by the
+    speaker-to-microphone latency and scaled by the learned acoustic coupling,
+    give the echo expected in that frame; bands well above it are the near-end
+    talker. Until the delay has been measured (by correlating energy envelopes
+    once a couple of seconds have played) the estimate takes the loudest
+    reference anywhere in the max_delay_ms window, which errs towards missing
+    a barge-in rather than Jarvis interrupting itself.
+
+    If a file can't be decoded the playback is registered "blind": near_end()
+    reports no speech until stop(), so only the wake word can interrupt.
+    """
+    BANDS = 16
+
+    def __init__(self, rate, frame_length, max_delay_ms=ECHO_MAX_DELAY_MS, margin_db=ECHO_MARGIN_DB, min_bands=3):
+        self.rate = rate
+        self.frame_length = frame_length
+        self.hop = max(1, frame_length // 2)
+        self.max_delay = int(max_delay_ms / 1000.0 * rate)
+        self.margin_db = margin_db
+        self.min_bands = min_bands
+        self.window = np.hanning(frame_length).astype(np.float32)
+        # Log-spaced bands over the speech range; each starts at an rfft bin.
+        edges = np.geomspace(100.0, min(rate / 2.0, 7000.0), self.BANDS + 1)
+        self._band_starts = np.unique(np.round(edges[:-1] * frame_length / rate).astype(int))
+        self._band_stop = int(round(edges[-1] * frame_length / rate))
+        self.coupling_db = np.zeros(len(self._band_starts))
+        self.noise_db = None
+        self._mic_energy = np.zeros(len(self._band_starts))
+        self._ref_energy = np.zeros(len(self._band_starts))
+        self._decay = float(np.exp(-frame_length / rate / 1.5))
+        self._coupling_samples = 0
+        self.delay = None
+        self._references = []  # [start sample, band dB per hop, length in samples]
+        self._end = 0
+        self._blind = False
+        self._history = []  # (sample position, total mic dB) while a reference plays
+        self._lock = threading.Lock()
+
+    def _band_db(self, frames):
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2)[..., :self._band_stop]
+        return 10.0 * np.log10(np.add.reduceat(power, self._band_starts, axis=-1) + 1e-3)
+
+    def _fit(self, frame):
+        samples = np.zeros(self.frame_length, dtype=np.float32)
+        n = min(len(frame), self.frame_length)
+        samples[:n] = frame[:n]
+        return samples
+
+    def add_reference(self, samples, position):
+        """
+        Register audio about to play. position is the ring position (bytes) it
+        starts at; a file queued behind one still playing starts when that ends.
+        """
+        with self._lock:
+            start = max(position // 2, self._end)
+            if samples is None:
+                self._blind = True
+                return
+            padded = np.concatenate((samples.astype(np.float32), np.zeros(self.frame_length, dtype=np.float32)))
+            frames = sliding_window_view(padded, self.frame_length)[::self.hop]
+            self._references.append([start, self._band_db(frames), len(samples)])
+            self._end = start + len(samples)
+            # Anything that ended a minute ago can no longer show up in a read.
+            horizon = start - 60 * self.rate
+            self._references = [ref for ref in self._references if ref[0] + ref[2] > horizon]
+
+    def stop(self, position):
+        """Playback was cut off (or finished) at ring position; nothing after it will be heard."""
+        with self._lock:
+            cut = position // 2
+            for ref in self._references:
+                if ref[0] + ref[2] > cut:
+                    ref[2] = max(0, cut - ref[0])
+                    ref[1] = ref[1][:-(-ref[2] // self.hop)] if ref[2] else ref[1][:0]
+            self._end = min(self._end, cut)
+            self._blind = False
+            self._history.clear()
+
+    def _expected(self, sample_position, n):
+        """
+        Reference band energies that could be arriving during [sample_position, +n):
+        the loudest (dB) and the mean power over the delay window, or None if
+        nothing played then.
+        """
+        if self.delay is None:
+            low_delay, high_delay = 0, self.max_delay
+        else:
+            low_delay, high_delay = max(0, self.delay - self.hop), self.delay + self.hop
+        spans = []
+        for start, band_db, length in self._references:
+            first = sample_position - high_delay - start
+            last = sample_position + n - low_delay - start
+            if last <= 0 or first >= length:
+                continue
+            k0 = max(0, first // self.hop)
+            k1 = min(len(band_db), -(-last // self.hop))
+            if k0 < k1:
+                spans.append(band_db[k0:k1])
+        if not spans:
+            return None, None
+        window = np.concatenate(spans)
+        return window.max(axis=0), np.mean(10.0 ** (window / 10.0), axis=0)
+
+    def _reference_level(self, sample_position):
+        for start, band_db, length in self._references:
+            if start <= sample_position < start + length:
+                return float(np.log10(np.sum(10.0 ** (band_db[(sample_position - start) // self.hop] / 10.0))))
+        return -3.0
+
+    def _estimate_delay(self):
+        """Pick the delay whose reference envelope best matches the microphone's."""
+        positions = np.array([position for position, _ in self._history])
+        mic = np.array([level for _, level in self._history])
+        mic = mic - mic.mean()
+        best, best_corr = None, 0.6
+        for delay in range(0, self.max_delay + 1, self.hop):
+            reference = np.array([self._reference_level(p - delay) for p in positions])
+            reference = reference - reference.mean()
+            denominator = np.sqrt(np.dot(mic, mic) * np.dot(reference, reference))
+            if denominator > 0 and np.dot(mic, reference) / denominator > best_corr:
+                best, best_corr = delay, np.dot(mic, reference) / denominator
+        if best is not None:
+            self.delay = best
+            print(f"Echo delay measured: {best * 1000 // self.rate} ms (correlation {best_corr:.2f})")
+
+    def near_end(self, frame, position):
+        """
+        True if the frame at ring position holds sound Jarvis isn't playing
+        (always true when nothing is playing). Every frame heard during playback
+        also updates the room's coupling, the decaying ratio of microphone to
+        reference energy per band over the last second or two.
+        """
+        with self._lock:
+            if self._blind:
+                return False
+            sample_position = position // 2
+            loudest, mean_power = self._expected(sample_position, len(frame))
+            if loudest is None:
+                return True
+            mic = self._band_db(self._fit(frame))
+            if self.noise_db is None:
+                self.noise_db = mic.copy()
+            floor = np.maximum(loudest + self.coupling_db, self.noise_db)
+            talking = np.count_nonzero(mic - floor > self.margin_db) >= self.min_bands
+            # The background level per band: follows quiet frames down fast and creeps up slowly.
+            self.noise_db += np.where(mic < self.noise_db, 0.3, 0.01) * (mic - self.noise_db)
+            echo_power = np.maximum(10.0 ** (mic / 10.0) - 10.0 ** (self.noise_db / 10.0), 0.0)
+            self._mic_energy = self._decay * self._mic_energy + echo_power
+            self._ref_energy = self._decay * self._ref_energy + mean_power
+            # Until the echo has had time to arrive the ratio only sees the reference,
+            # so keep the starting estimate for the first half second past the delay.
+            self._coupling_samples += len(frame)
+            settle = self.rate // 2 + (self.max_delay if self.delay is None else self.delay)
+            if self._coupling_samples >= settle:
+                self.coupling_db = 10.0 * np.log10((self._mic_energy + 1e-3) / (self._ref_energy + 1e-3))
+            if self.delay is None:
+                self._history.append((sample_position, float(np.log10(np.sum(10.0 ** (mic / 10.0))))))
+                # Try once two seconds have played, then every half second, over the last four.
+                frames_per_second = self.rate / self.frame_length
+                if len(self._history) >= 2 * frames_per_second and len(self._history) % int(frames_per_second / 2) == 0:
+                    self._history = self._history[-int(4 * frames_per_second):]
+                    self._estimate_delay()
+            return bool(talking)
+
+    def suppress(self, frame, position):
+        """
+        The frame with the expected echo taken out band by band (Wiener-style
+        gains, floored at -20 dB), for the wake-word detector; returned unchanged
+        when nothing is playing.
+        """
+        with self._lock:
+            echo = None if self._blind else self._expected(position // 2, len(frame))[0]
+            if echo is None:
+                return frame
+            samples = self._fit(frame)
+            mic = self._band_db(samples)
+            echo_power = 10.0 ** ((echo + self.coupling_db - mic) / 10.0)
+            gains = np.sqrt(np.clip(1.0 - echo_power, 0.01, 1.0))
+            bin_gains = np.ones(self.frame_length // 2 + 1, dtype=np.float32)
+            bounds = list(self._band_starts) + [self._band_stop]
+            for band, gain in enumerate(gains):
+                bin_gains[bounds[band]:bounds[band + 1]] = gain
+            cleaned = np.fft.irfft(np.fft.rfft(samples) * bin_gains, n=self.frame_length)[:len(frame)]
+            return np.clip(np.round(cleaned), -32768, 32767).astype(np.int16)
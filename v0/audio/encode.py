@@ -0,0 +1,57 @@
+import io
+import os
+import wave
+from math import gcd
+import numpy as np
+import scipy.signal
+
+try:
+    import soundfile
+except Exception:
+    soundfile = None
+
+# Whisper resamples everything to 16 kHz mono anyway, so uploading more is wasted bandwidth.
+UPLOAD_RATE = int(os.getenv("JARVIS_STT_UPLOAD_RATE", "16000"))
+UPLOAD_FORMAT = os.getenv("JARVIS_STT_UPLOAD_FORMAT", "flac")
+
+def to_rate(pcm: bytes, rate: int, target_rate: int) -> bytes:
+    """Resample a whole 16-bit mono utterance in one go."""
+    if not target_rate or rate == target_rate:
+        return pcm
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    divisor = gcd(rate, target_rate)
+    resampled = scipy.signal.resample_poly(samples.astype(np.float32), target_rate // divisor, rate // divisor)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16).tobytes()
+
+def encode_wav(pcm: bytes, rate: int, channels: int = 1) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = "audio.wav"
+    return buffer
+
+def encode_flac(pcm: bytes, rate: int, channels: int = 1) -> io.BytesIO:
+    samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels)
+    buffer = io.BytesIO()
+    soundfile.write(buffer, samples, rate, format="FLAC", subtype="PCM_16")
+    buffer.seek(0)
+    buffer.name = "audio.flac"
+    return buffer
+
+def encode_for_upload(pcm: bytes, rate: int, target_rate=UPLOAD_RATE, fmt=UPLOAD_FORMAT) -> io.BytesIO:
+    """
+    Package 16-bit mono PCM for a speech-to-text upload entirely in memory.
+    Downsamples to target_rate (0 keeps the original rate) and compresses to
+    FLAC when soundfile is installed, falling back to WAV otherwise. The
+    returned buffer has a .name with the right extension, which the OpenAI
+    client uses to tell the API the file type.
+    """
+    pcm = to_rate(pcm, rate, target_rate)
+    rate = target_rate or rate
+    if fmt == "flac" and soundfile is not None:
+        return encode_flac(pcm, rate)
+    return encode_wav(pcm, rate)
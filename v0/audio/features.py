@@ -0,0 +1,136 @@
+import math
+import numpy as np
+
+FULL_SCALE = 32768.0
+
+class FrameFeatures:
+    """
+    Per-frame level features for int16 PCM, computed into preallocated
+    scratch buffers so the per-frame cost is a handful of in-place numpy
+    calls and no temporary arrays:
+      rms  - root mean square, in int16 units
+      peak - largest absolute sample
+      zcr  - zero-crossing rate, crossings per sample (high for hiss and
+             fricatives, low for voiced speech and hum)
+    Frames longer than the scratch size grow it once.
+    """
+    def __init__(self, frame_length=512):
+        self._allocate(frame_length)
+        self.rms = 0.0
+        self.peak = 0
+        self.zcr = 0.0
+
+    def _allocate(self, frame_length):
+        self.frame_length = frame_length
+        self._float = np.empty(frame_length, dtype=np.float32)
+        self._signs = np.empty(frame_length, dtype=bool)
+        self._crossings = np.empty(frame_length - 1 if frame_length > 1 else 1, dtype=bool)
+
+    def compute(self, frame):
+        """frame is an int16 array (or a buffer of int16 bytes); returns self for chaining."""
+        if not isinstance(frame, np.ndarray):
+            frame = np.frombuffer(frame, dtype=np.int16)
+        n = len(frame)
+        if n == 0:
+            self.rms, self.peak, self.zcr = 0.0, 0, 0.0
+            return self
+        if n > self.frame_length:
+            self._allocate(n)
+        scratch = self._float[:n]
+        np.copyto(scratch, frame, casting="unsafe")
+        self.rms = math.sqrt(float(np.dot(scratch, scratch)) / n)
+        np.abs(scratch, out=scratch)
+        self.peak = int(scratch.max())
+        signs = self._signs[:n]
+        np.less(frame, 0, out=signs)
+        crossings = self._crossings[:n - 1]
+        np.not_equal(signs[:-1], signs[1:], out=crossings)
+        self.zcr = np.count_nonzero(crossings) / n if n > 1 else 0.0
+        return self
+
+    @property
+    def rms_db(self):
+        """RMS in dB relative to int16 full scale."""
+        return 20.0 * math.log10(self.rms / FULL_SCALE + 1e-10)
+
+    @property
+    def peak_db(self):
+        return 20.0 * math.log10(self.peak / FULL_SCALE + 1e-10)
+
+class RunningMean:
+    """Mean of the last `size` values, kept as a running sum over a fixed ring (O(1) per update)."""
+    def __init__(self, size):
+        self.size = max(1, size)
+        self._values = [0.0] * self.size
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        if self.count == self.size:
+            self.total -= self._values[self._index]
+        else:
+            self.count += 1
+        self._values[self._index] = value
+        self.total += value
+        self._index = (self._index + 1) % self.size
+        return self.total / self.count
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+if __name__ == "__main__":
+    # Micro-benchmark: the per-frame level code the voice loop used to run
+    # (frombuffer -> astype -> square -> mean -> sqrt, then np.mean over a deque
+    # of the last second of values) against FrameFeatures + RunningMean, on
+    # 512-sample frames at 16 kHz (31.25 frames per second).
+    import time
+    import tracemalloc
+    from collections import deque
+
+    frame_length, frames_per_second, seconds = 512, 16000 / 512, 120
+    rng = np.random.default_rng(0)
+    frames = [(rng.normal(0, 2000, frame_length)).astype(np.int16).tobytes()
+              for _ in range(int(frames_per_second * seconds))]
+
+    def legacy():
+        window = deque(maxlen=31)
+        def step(data):
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            current_rms = np.sqrt(np.mean(samples ** 2)) if samples.size > 0 else 0.0
+            window.append(current_rms)
+            return np.mean(window)
+        return step
+
+    def vectorized():
+        features, window = FrameFeatures(frame_length), RunningMean(31)
+        def step(data):
+            features.compute(data)
+            return window.add(features.rms)
+        return step
+
+    for name, make_step in [("legacy per-frame RMS", legacy), ("FrameFeatures (rms+peak+zcr)", vectorized)]:
+        step = make_step()
+        start = time.perf_counter()
+        for data in frames:
+            step(data)
+        per_frame = (time.perf_counter() - start) / len(frames)
+        # Temporaries are freed as soon as each frame is done, so sum the traced
+        # peak above baseline frame by frame.
+        step = make_step()
+        sample_frames = frames[:300]
+        transient = 0
+        tracemalloc.start()
+        for data in sample_frames:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            step(data)
+            transient += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        print(f"{name:32s} {per_frame * 1e6:7.1f} us/frame  "
+              f"{transient / len(sample_frames) * frames_per_second / 1024:8.1f} KiB/s of temporaries")
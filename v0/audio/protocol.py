@@ -0,0 +1,230 @@
+import socket
+import struct
+import time
+import numpy as np
+from .ringbuffer import AudioRingBuffer
+
+# Role markers sent by a client right after connecting. PUB/SUB are the
+# original raw-PCM roles; PBF/SBF speak the framed protocol below.
+ROLE_PUBLISHER = b"PUB"
+ROLE_SUBSCRIBER = b"SUB"
+ROLE_FRAMED_PUBLISHER = b"PBF"
+ROLE_FRAMED_SUBSCRIBER = b"SBF"
+
+MAGIC = b"JA"
+VERSION = 1
+SAMPLE_INT16 = 1
+SAMPLE_FLOAT32 = 2
+SAMPLE_WIDTHS = {SAMPLE_INT16: 2, SAMPLE_FLOAT32: 4}
+
+# magic, version, sample format, channels, reserved, rate, sequence, timestamp (us), payload length
+HEADER = struct.Struct("!2sBBBxIIQI")
+
+# What raw PUB publishers are assumed to send.
+LEGACY_RATE = 44100
+LEGACY_CHANNELS = 1
+
+# Subscriber-side buffer: comfortably more than one 30 s utterance of legacy 44.1 kHz audio.
+STREAM_BUFFER_BYTES = 40 * LEGACY_RATE * 2
+
+class ProtocolError(Exception):
+    pass
+
+class StreamFormat:
+    def __init__(self, rate=LEGACY_RATE, channels=LEGACY_CHANNELS, sample_format=SAMPLE_INT16):
+        self.rate = rate
+        self.channels = channels
+        self.sample_format = sample_format
+
+    @property
+    def bytes_per_second(self):
+        return self.rate * self.channels * SAMPLE_WIDTHS[self.sample_format]
+
+    def __eq__(self, other):
+        return isinstance(other, StreamFormat) and \
+            (self.rate, self.channels, self.sample_format) == (other.rate, other.channels, other.sample_format)
+
+    def __repr__(self):
+        return f"StreamFormat(rate={self.rate}, channels={self.channels}, sample_format={self.sample_format})"
+
+def to_mono_int16(payload, fmt):
+    """
+    Convert a payload in fmt to mono 16-bit PCM, the only layout the voice
+    loop and local playback handle: channels are averaged and float32
+    samples (full scale 1.0) are scaled and clipped. Trailing bytes short of
+    a whole frame are dropped.
+    """
+    if fmt.channels == 1 and fmt.sample_format == SAMPLE_INT16:
+        return payload
+    frame_bytes = fmt.channels * SAMPLE_WIDTHS[fmt.sample_format]
+    payload = payload[:len(payload) - len(payload) % frame_bytes]
+    if fmt.sample_format == SAMPLE_FLOAT32:
+        samples = np.frombuffer(payload, dtype=np.float32) * 32768.0
+    else:
+        samples = np.frombuffer(payload, dtype=np.int16).astype(np.float32)
+    if fmt.channels > 1:
+        samples = samples.reshape(-1, fmt.channels).mean(axis=1)
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16).tobytes()
+
+def encode_frame(fmt, sequence, payload, timestamp_us=None):
+    if timestamp_us is None:
+        timestamp_us = int(time.time() * 1_000_000)
+    header = HEADER.pack(MAGIC, VERSION, fmt.sample_format, fmt.channels, fmt.rate,
+                         sequence & 0xFFFFFFFF, timestamp_us, len(payload))
+    return header + payload
+
+def decode_header(data, offset=0):
+    magic, version, sample_format, channels, rate, sequence, timestamp_us, length = HEADER.unpack_from(data, offset)
+    if magic != MAGIC or version != VERSION or sample_format not in SAMPLE_WIDTHS or not channels:
+        raise ProtocolError(f"Bad frame header: {bytes(data[offset:offset + HEADER.size])!r}")
+    return StreamFormat(rate, channels, sample_format), sequence, timestamp_us, length
+
+class FrameParser:
+    """Incrementally splits a byte stream into (format, sequence, timestamp_us, payload) frames."""
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            fmt, sequence, timestamp_us, length = decode_header(self.buffer, offset)
+            end = offset + HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            with memoryview(self.buffer) as view:
+                frames.append((fmt, sequence, timestamp_us, bytes(view[offset + HEADER.size:end])))
+            offset = end
+        # Consume parsed frames in one go rather than shifting the buffer per frame.
+        del self.buffer[:offset]
+        return frames
+
+class FramedStreamReader:
+    """
+    Subscriber side of the framed protocol.
+    Receives each frame's header into a small buffer and then its payload
+    into an AudioRingBuffer that consumers read with their own cursors (see
+    reader()). Mono 16-bit payloads, the usual case, are received straight
+    into the ring with recv_into, so the audio is copied once, from the
+    kernel. Other layouts go through a scratch buffer and are converted to
+    mono 16-bit, so `format` (the layout of the ring) always has one channel
+    of int16 at the publisher's rate; `source_format` is what the publisher
+    actually sends. Counts sequence gaps (frames the broker dropped because
+    we fell behind).
+    """
+    def __init__(self, sock, buffer_bytes=STREAM_BUFFER_BYTES):
+        self.sock = sock
+        self.ring = AudioRingBuffer(buffer_bytes)
+        self._header = bytearray(HEADER.size)
+        self._header_view = memoryview(self._header)
+        self._header_received = 0
+        # Payload of the frame being received: bytes still to come, and its format if it needs converting.
+        self._payload_remaining = 0
+        self._convert_format = None
+        self._scratch = bytearray()
+        self._scratch_received = 0
+        self.format = None
+        self.source_format = None
+        self.last_sequence = None
+        self.gaps = 0
+        self.frames_lost = 0
+        self.format_changed = False
+
+    def fill(self, timeout=None):
+        """
+        Receive once from the socket; returns False on timeout (with timeout=0,
+        when nothing is waiting), raises ConnectionError on EOF.
+        """
+        self.sock.settimeout(timeout)
+        try:
+            if not self._payload_remaining:
+                n = self.sock.recv_into(self._header_view[self._header_received:])
+            elif self._convert_format:
+                n = self.sock.recv_into(memoryview(self._scratch)[self._scratch_received:])
+            else:
+                n = self.ring.recv_into(self.sock, self._payload_remaining)
+        except (socket.timeout, BlockingIOError):
+            return False
+        finally:
+            self.sock.settimeout(None)
+        if not n:
+            self.ring.close()
+            raise ConnectionError("Stream server closed the connection")
+        if not self._payload_remaining:
+            self._header_received += n
+            if self._header_received == HEADER.size:
+                self._header_received = 0
+                self._start_frame(*decode_header(self._header))
+        elif self._convert_format:
+            self._payload_remaining -= n
+            self._scratch_received += n
+            if not self._payload_remaining:
+                self.ring.write(to_mono_int16(self._scratch, self._convert_format))
+        else:
+            self._payload_remaining -= n
+        return True
+
+    def _start_frame(self, fmt, sequence, _timestamp, length):
+        pcm_format = StreamFormat(rate=fmt.rate)
+        if fmt != self.source_format and fmt != pcm_format:
+            print(f"Stream is {fmt}, converting to mono 16-bit")
+        self.source_format = fmt
+        if not length:
+            # Header-only frame: the server announcing the stream format.
+            self.format = self.format or pcm_format
+            return
+        if self.format is not None and pcm_format != self.format:
+            print(f"Stream format changed: {self.format} -> {pcm_format}")
+            self.format_changed = True
+        self.format = pcm_format
+        if self.last_sequence is not None:
+            missing = (sequence - self.last_sequence - 1) & 0xFFFFFFFF
+            if missing:
+                self.gaps += 1
+                self.frames_lost += missing
+        self.last_sequence = sequence
+        self._payload_remaining = length
+        if fmt == pcm_format:
+            self._convert_format = None
+        else:
+            self._convert_format = fmt
+            if len(self._scratch) != length:
+                self._scratch = bytearray(length)
+            self._scratch_received = 0
+
+    def reader(self):
+        """A cursor at the live end of the stream that pulls from the socket when it runs dry."""
+        return self.ring.reader(fill=self.fill)
+
+    def wait_for_format(self):
+        """Block until the stream format is known (announced, or from the first frame)."""
+        while self.format is None:
+            self.fill()
+        return self.format
+
+    def drain(self):
+        """Receive whatever the socket already holds, without waiting for more."""
+        while self.fill(0):
+            pass
+
+def connect_subscriber(addr, preferred=None):
+    """
+    Connect to the stream server as a framed subscriber.
+    Sends a header-only hello frame with the format we would like; the server
+    answers with a header-only frame describing the stream's actual format as
+    soon as a publisher has announced one. Returns (socket, FramedStreamReader).
+    """
+    ip, port_str = addr.split(":")
+    sock = socket.create_connection((ip, int(port_str)))
+    sock.sendall(ROLE_FRAMED_SUBSCRIBER)
+    sock.sendall(encode_frame(preferred or StreamFormat(), 0, b""))
+    reader = FramedStreamReader(sock)
+    reader.wait_for_format()
+    return sock, reader
+
+def connect_publisher(addr):
+    ip, port_str = addr.split(":")
+    sock = socket.create_connection((ip, int(port_str)))
+    sock.sendall(ROLE_FRAMED_PUBLISHER)
+    return sock
@@ -0,0 +1,127 @@
+from math import gcd
+import numpy as np
+import scipy.signal
+from numpy.lib.stride_tricks import as_strided
+
+class StreamingResampler:
+    """
+    Polyphase FIR resampler for audio that arrives in blocks.
+    Works like scipy.signal.resample_poly, but the filter history is carried
+    from one call to the next, so consecutive blocks join without the edge
+    artifacts of resampling each block on its own.
+    The output pattern repeats every `down` input samples (one period, `up`
+    outputs; 441 in and 160 out for 44.1 kHz to 16 kHz), so everything that
+    depends on the phase is worked out once: the outputs of a period are
+    split into groups of `group`, each with a small dense kernel over the
+    input span it covers. A block is then a zero-copy strided view of whole
+    periods times those kernels, one batched matmul, with no per-call index
+    arithmetic or gathers. Only whole periods are resampled; the rest waits
+    for the next block.
+    Output is delayed by the filter's group delay (about half_len samples at
+    the lower of the two rates) plus up to one period, and a block doesn't
+    always produce the same number of samples; callers that need fixed
+    frames should buffer.
+    """
+    def __init__(self, from_rate, to_rate, half_len=10, beta=5.0, group=16):
+        divisor = gcd(int(from_rate), int(to_rate))
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.up = int(to_rate) // divisor
+        self.down = int(from_rate) // divisor
+        max_rate = max(self.up, self.down)
+        taps = scipy.signal.firwin(2 * half_len * max_rate + 1, 1.0 / max_rate, window=("kaiser", beta))
+        taps *= self.up
+        self.taps_per_phase = -(-len(taps) // self.up)
+        padded = np.zeros(self.taps_per_phase * self.up)
+        padded[:len(taps)] = taps
+        # phases[p] is the sub-filter for output phase p, reversed so it lines up with
+        # a window of input samples in time order (oldest first).
+        phases = padded.reshape(self.taps_per_phase, self.up).T[:, ::-1]
+
+        # Output q of a period reads taps_per_phase inputs from starts[q] with sub-filter phase[q].
+        starts, phase = np.divmod(np.arange(self.up) * self.down, self.up)
+        group = min(group, self.up)
+        groups = -(-self.up // group)
+        # Group j reads from j * step, which keeps the groups' windows one strided view.
+        self._step = group * self.down // self.up
+        span = max(starts[min((j + 1) * group, self.up) - 1] - j * self._step for j in range(groups)) + self.taps_per_phase
+        self._kernels = np.zeros((groups, span, group), dtype=np.float32)
+        for q in range(self.up):
+            j, column = divmod(q, group)
+            offset = starts[q] - j * self._step
+            self._kernels[j, offset:offset + self.taps_per_phase, column] = phases[phase[q]]
+        # Input samples one period's outputs depend on, counted from the period's start.
+        self._period_span = (groups - 1) * self._step + span
+        self.reset()
+
+    def reset(self):
+        # Starts one period on, with taps_per_phase - 1 samples of silence as history.
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+
+    def process(self, samples):
+        """Resample one block; int16 in gives int16 out, float in gives float32 out."""
+        samples = np.asarray(samples)
+        if self.up == self.down:
+            return samples
+        buf = np.concatenate((self._history, samples.astype(np.float32)))
+        periods = max(0, (len(buf) - self._period_span) // self.down + 1)
+        groups, span, group = self._kernels.shape
+        item = buf.strides[0]
+        windows = as_strided(buf, shape=(groups, periods, span), strides=(self._step * item, self.down * item, item))
+        out = np.matmul(windows, self._kernels)
+        out = out.transpose(1, 0, 2).reshape(periods, groups * group)[:, :self.up].reshape(-1)
+        self._history = buf[periods * self.down:].copy()
+
+        if samples.dtype == np.int16:
+            np.rint(out, out=out)
+            return np.clip(out, -32768, 32767, out=out).astype(np.int16)
+        return out
+
+if __name__ == "__main__":
+    # Benchmark: CPU cost of turning 44.1 kHz stream audio into 512-sample 16 kHz
+    # wake-word frames, extrapolated to one hour of audio.
+    import time
+
+    source_rate, target_rate, frame_length = 44100, 16000, 512
+    block = int(round(frame_length * source_rate / target_rate))
+    seconds = 60
+    t = np.arange(source_rate * seconds) / source_rate
+    signal = (8000 * np.sin(2 * np.pi * 440 * t) + 500 * np.random.randn(len(t))).astype(np.int16)
+    blocks = [signal[i:i + block] for i in range(0, len(signal) - block, block)]
+
+    def per_frame_fft():
+        for chunk in blocks:
+            scipy.signal.resample(chunk, frame_length).astype(np.int16)
+
+    def per_frame_poly():
+        for chunk in blocks:
+            scipy.signal.resample_poly(chunk, target_rate, source_rate).astype(np.int16)
+
+    def streaming():
+        resampler = StreamingResampler(source_rate, target_rate)
+        for chunk in blocks:
+            resampler.process(chunk)
+
+    for name, fn in [("scipy.signal.resample per frame", per_frame_fft),
+                     ("scipy.signal.resample_poly per frame", per_frame_poly),
+                     ("StreamingResampler", streaming)]:
+        start = time.process_time()
+        fn()
+        cpu = time.process_time() - start
+        print(f"{name:40s} {cpu * 3600 / seconds:8.1f} CPU s per hour of audio")
+
+    # Accuracy: compare each 512-sample frame against the matching stretch of the
+    # whole signal resampled in one go. Per-frame FFT resampling treats every frame
+    # as periodic, which smears the frame edges.
+    reference = scipy.signal.resample_poly(signal.astype(np.float64), target_rate, source_rate)
+    resampler = StreamingResampler(source_rate, target_rate)
+    stream_out = np.concatenate([resampler.process(chunk.astype(np.float32)) for chunk in blocks])
+    delay = resampler.taps_per_phase // 2 * resampler.up // resampler.down
+    fft_errors, stream_errors = [], []
+    for i, chunk in enumerate(blocks[1:-1], start=1):
+        start = int(round(i * block * target_rate / source_rate))
+        expected = reference[start:start + frame_length]
+        fft_errors.append(scipy.signal.resample(chunk.astype(np.float64), frame_length) - expected)
+        stream_errors.append(stream_out[start + delay:start + delay + frame_length] - expected)
+    for name, errors in [("scipy.signal.resample per frame", fft_errors), ("StreamingResampler", stream_errors)]:
+        print(f"{name:40s} RMS error vs one-shot: {np.sqrt(np.mean(np.concatenate(errors) ** 2)):8.2f}")
@@ -0,0 +1,152 @@
+import threading
+
+class AudioRingBuffer:
+    """
+    Preallocated circular byte buffer for PCM audio.
+    Positions are absolute byte offsets since the buffer was created, so a
+    consumer's cursor stays valid across wrap-arounds; anything older than
+    `capacity` bytes behind the write position has been overwritten. Writers
+    copy straight into the buffer (or recv_into it from a socket) and readers
+    copy out into their own preallocated frames, so steady-state capture and
+    frame reads allocate nothing.
+    """
+    def __init__(self, capacity):
+        capacity -= capacity % 2  # Keep 16-bit samples from straddling the wrap point.
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self.written = 0
+        self.closed = False
+        # Bytes recv_into is filling past written; readers treat them as already overwritten.
+        self._reserved = 0
+        self._cond = threading.Condition()
+
+    @property
+    def oldest(self):
+        """Oldest position still held in the buffer."""
+        return max(0, self.written + self._reserved - self.capacity)
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        if len(data) > self.capacity:
+            data = data[-self.capacity:]
+        with self._cond:
+            start = self.written % self.capacity
+            first = min(len(data), self.capacity - start)
+            self._view[start:start + first] = data[:first]
+            self._view[:len(data) - first] = data[first:]
+            self.written += len(data)
+            self._cond.notify_all()
+        return len(data)
+
+    def recv_into(self, sock, max_bytes=65536):
+        """Receive from a socket directly into the buffer; returns the byte count (0 on EOF)."""
+        with self._cond:
+            start = self.written % self.capacity
+            self._reserved = length = min(max_bytes, self.capacity - start)
+        try:
+            n = sock.recv_into(self._view[start:start + length])
+        finally:
+            with self._cond:
+                self._reserved = 0
+        if n:
+            with self._cond:
+                self.written += n
+                self._cond.notify_all()
+        return n
+
+    def copy_into(self, position, out):
+        """Copy len(out) bytes starting at an absolute position into out; the range must be held."""
+        out = memoryview(out).cast("B")
+        # Under the write lock, so a writer can't overwrite the range halfway through the copy.
+        with self._cond:
+            start = position % self.capacity
+            first = min(len(out), self.capacity - start)
+            out[:first] = self._view[start:start + first]
+            out[first:] = self._view[:len(out) - first]
+
+    def get(self, start, end):
+        """Return bytes between two absolute positions, clamped to what is still held."""
+        with self._cond:
+            start = max(start, self.oldest)
+            end = min(end, self.written)
+            out = bytearray(max(0, end - start))
+            self.copy_into(start, out)
+        return bytes(out)
+
+    def wait(self, position, timeout=None):
+        """Block until the write position reaches position; returns False on timeout or close."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written >= position or self.closed, timeout) \
+                and self.written >= position
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def reader(self, fill=None, position=None):
+        return RingReader(self, fill=fill, position=position)
+
+class RingReader:
+    """
+    One consumer's cursor into an AudioRingBuffer.
+    If `fill` is given it is called as fill(timeout) to produce more audio when
+    the reader runs dry (pulling from a socket on the caller's thread) and
+    returns False if nothing arrived in time; otherwise the reader waits for a
+    writer thread. A reader that falls more than the buffer's
+    capacity behind skips ahead and counts the overwritten bytes in `lost`.
+    """
+    def __init__(self, ring, fill=None, position=None):
+        self.ring = ring
+        self.fill = fill
+        self.position = ring.written if position is None else position
+        self.lost = 0
+
+    @property
+    def available(self):
+        return self.ring.written - self.position
+
+    def read_into(self, out, timeout=None):
+        """
+        Fill out with the next len(out) bytes; returns the count read, short only
+        on EOF or close. If the timeout expires first it returns 0 and leaves any
+        partial frame unread for the next call.
+        """
+        n = memoryview(out).nbytes
+        target = self.position + n
+        while self.ring.written < target:
+            if self.fill:
+                try:
+                    if self.fill(timeout) is False:
+                        return 0
+                except ConnectionError:
+                    break
+            elif not self.ring.wait(target, timeout):
+                if not self.ring.closed:
+                    return 0
+                break
+        # Check what is still held and copy it in one step, or a writer could lap the reader in between.
+        with self.ring._cond:
+            if self.position < self.ring.oldest:
+                self.lost += self.ring.oldest - self.position
+                self.position = self.ring.oldest
+            n = min(n, self.ring.written - self.position)
+            if n > 0:
+                self.ring.copy_into(self.position, memoryview(out).cast("B")[:n])
+                self.position += n
+        return max(n, 0)
+
+    def read(self, n, timeout=None):
+        out = bytearray(n)
+        count = self.read_into(out, timeout)
+        return bytes(out[:count])
+
+    def skip_to_end(self):
+        """Discard everything buffered so far."""
+        self.position = self.ring.written
+
+    def rewind(self, nbytes):
+        """Move back up to nbytes into already-consumed audio, e.g. to include pre-roll."""
+        nbytes -= nbytes % 2
+        self.position = max(self.ring.oldest, self.position - nbytes)
@@ -0,0 +1,148 @@
+import os
+import numpy as np
+from .features import FrameFeatures
+from .resample import StreamingResampler
+
+try:
+    import webrtcvad
+except Exception:
+    webrtcvad = None
+
+VAD_ENGINE = os.getenv("JARVIS_VAD", "energy").lower()
+# Trailing non-speech needed to close an utterance, and leading speech needed to open one.
+VAD_END_MS = float(os.getenv("JARVIS_VAD_END_MS", "300"))
+VAD_START_MS = float(os.getenv("JARVIS_VAD_START_MS", "60"))
+
+class EnergyVAD:
+    """
+    Speech/non-speech per frame from energy above an adaptive noise floor,
+    confirmed by a spectral check. The floor follows the room's background
+    level (quickly downwards, slowly upwards), so a fan or TV raises the bar
+    instead of holding the recorder open. A frame counts as speech if it is
+    `margin_db` above the floor and above an absolute minimum, and either
+    has a peaky (harmonic) spectrum like voiced speech or is loud enough
+    (twice the margin) that it can't be mistaken for background noise.
+    """
+    def __init__(self, rate, margin_db=9.0, min_db=-62.0, max_flatness=0.3):
+        self.rate = rate
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.max_flatness = max_flatness
+        self.features = FrameFeatures()
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+
+    @property
+    def needs_calibration(self):
+        return self.noise_floor_db is None
+
+    def calibrate(self, samples, frame_length):
+        """Seed the noise floor from audio known to be mostly background (the quietest fifth of its frames)."""
+        frames = samples[:len(samples) - len(samples) % frame_length].reshape(-1, frame_length)
+        if len(frames):
+            power = np.mean((frames.astype(np.float32) / 32768.0) ** 2, axis=1)
+            self.noise_floor_db = float(10.0 * np.log10(np.percentile(power, 20) + 1e-10))
+
+    @staticmethod
+    def spectral_flatness(samples):
+        """Geometric over arithmetic mean of the power spectrum: near 1 for noise, near 0 for voiced sound."""
+        power = np.abs(np.fft.rfft(samples)) ** 2 + 1e-12
+        return float(np.exp(np.mean(np.log(power))) / np.mean(power))
+
+    def is_speech(self, frame):
+        energy_db = self.features.compute(frame).rms_db
+        if self.noise_floor_db is None:
+            self.noise_floor_db = energy_db
+        above_floor = energy_db - self.noise_floor_db
+        speech = above_floor > self.margin_db and energy_db > self.min_db and (
+            above_floor > 2 * self.margin_db or self.spectral_flatness(frame) < self.max_flatness
+        )
+        if energy_db < self.noise_floor_db:
+            self.noise_floor_db += 0.3 * (energy_db - self.noise_floor_db)
+        elif not speech:
+            self.noise_floor_db += 0.05 * (energy_db - self.noise_floor_db)
+        else:
+            self.noise_floor_db += 0.002 * (energy_db - self.noise_floor_db)
+        return bool(speech)
+
+class WebRTCVAD:
+    """
+    Google's WebRTC VAD (the optional webrtcvad package). It only takes 10/20/30 ms
+    frames at 8/16/32/48 kHz, so other rates are resampled to 16 kHz and each
+    frame is judged by the majority of the 30 ms sub-frames it completes.
+    """
+    SUPPORTED_RATES = (8000, 16000, 32000, 48000)
+
+    def __init__(self, rate, aggressiveness=2):
+        if webrtcvad is None:
+            raise RuntimeError("webrtcvad is not installed")
+        self.rate = rate
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.vad_rate = rate if rate in self.SUPPORTED_RATES else 16000
+        self.subframe = self.vad_rate * 30 // 1000
+        self.reset()
+
+    needs_calibration = False
+
+    def calibrate(self, samples, frame_length):
+        pass
+
+    def reset(self):
+        self._resampler = StreamingResampler(self.rate, self.vad_rate) if self.rate != self.vad_rate else None
+        self._pending = np.empty(0, dtype=np.int16)
+        self._last = False
+
+    def is_speech(self, frame):
+        samples = self._resampler.process(frame) if self._resampler else frame
+        samples = np.concatenate((self._pending, samples))
+        whole = len(samples) - len(samples) % self.subframe
+        votes = [
+            self.vad.is_speech(samples[i:i + self.subframe].tobytes(), self.vad_rate)
+            for i in range(0, whole, self.subframe)
+        ]
+        self._pending = samples[whole:]
+        if votes:
+            self._last = sum(votes) * 2 >= len(votes)
+        return self._last
+
+class Endpointer:
+    """
+    Turns per-frame VAD decisions into utterance boundaries. update() returns
+    "start" once start_ms of consecutive speech is seen, "end" once end_ms of
+    non-speech follows at least min_speech_ms of speech, and None otherwise.
+    """
+    def __init__(self, frame_duration, start_ms=VAD_START_MS, end_ms=VAD_END_MS, min_speech_ms=0.0):
+        self.frame_duration = frame_duration
+        self.start_frames = max(1, int(round(start_ms / 1000.0 / frame_duration)))
+        self.end_frames = max(1, int(round(end_ms / 1000.0 / frame_duration)))
+        self.min_speech_frames = int(round(min_speech_ms / 1000.0 / frame_duration))
+        self.started = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.frames_since_start = 0
+
+    def update(self, is_speech):
+        if not self.started:
+            self.speech_run = self.speech_run + 1 if is_speech else 0
+            if self.speech_run >= self.start_frames:
+                self.started = True
+                self.frames_since_start = self.speech_run
+                return "start"
+            return None
+        self.frames_since_start += 1
+        self.silence_run = 0 if is_speech else self.silence_run + 1
+        if self.silence_run >= self.end_frames and self.frames_since_start >= self.min_speech_frames:
+            return "end"
+        return None
+
+def get_vad(rate, engine=None):
+    """Build the VAD named by JARVIS_VAD (energy or webrtc); webrtc falls back to energy if unavailable."""
+    engine = (engine or VAD_ENGINE).lower()
+    if engine == "webrtc":
+        try:
+            return WebRTCVAD(rate)
+        except Exception as e:
+            print(f"WebRTC VAD unavailable, using energy VAD: {e}")
+    return EnergyVAD(rate)
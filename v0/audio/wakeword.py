@@ -0,0 +1,275 @@
+import os
+import time
+import queue
+import signal
+import itertools
+import threading
+import multiprocessing
+from collections import Counter, defaultdict, deque
+import numpy as np
+
+KEYWORD_FILE = os.getenv("JARVIS_KEYWORD_FILE", "v0/Jarvis_en_mac_v3_0_0.ppn")
+# Unset (None) means one worker per core; 0 runs Porcupine in each room's own thread instead.
+WAKEWORD_WORKERS = int(os.environ["JARVIS_WAKEWORD_WORKERS"]) if os.getenv("JARVIS_WAKEWORD_WORKERS") else None
+# Frames a stream may have queued or in a worker before new ones are dropped (about a second).
+MAX_IN_FLIGHT = 32
+
+def create_porcupine():
+    """A Porcupine handle for the Jarvis keyword; needs PORCUPINE_ACCESS_KEY."""
+    import pvporcupine
+    access_key = os.getenv("PORCUPINE_ACCESS_KEY")
+    if not access_key:
+        raise RuntimeError("PORCUPINE_ACCESS_KEY not set")
+    return pvporcupine.create(access_key=access_key, keyword_paths=[KEYWORD_FILE])
+
+def _worker_main(conn, factory):
+    """
+    Worker process: one detector per stream it has been given (wake-word
+    engines keep state across frames), fed batches of (stream, seq, frame).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    detectors = {}
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            kind, payload = message
+            if kind == "frames":
+                counts, detections = Counter(), []
+                for stream_id, sequence, frame in payload:
+                    detector = detectors.get(stream_id)
+                    if detector is None:
+                        detector = detectors[stream_id] = factory()
+                    index = detector.process(np.frombuffer(frame, dtype=np.int16))
+                    counts[stream_id] += 1
+                    if index >= 0:
+                        detections.append((stream_id, sequence, index))
+                conn.send(("detections", (dict(counts), detections)))
+            elif kind == "close":
+                detector = detectors.pop(payload, None)
+                if detector is not None:
+                    detector.delete()
+            elif kind == "info":
+                detector = factory()
+                conn.send(("info", (detector.sample_rate, detector.frame_length)))
+                detector.delete()
+    except EOFError:
+        pass
+    finally:
+        for detector in detectors.values():
+            detector.delete()
+
+class WakeWordStream:
+    """
+    One audio stream's handle on a WakeWordPool, a drop-in for a Porcupine
+    handle in the voice loop. process() queues the frame and returns the
+    keyword index of any detection reported since the previous call (-1 if
+    none), so the caller never waits on a worker; a detection shows up a
+    frame or two after the audio that caused it.
+    """
+    def __init__(self, pool, stream_id, slot, name=None):
+        self.pool = pool
+        self.stream_id = stream_id
+        self.slot = slot
+        self.name = name or f"stream-{stream_id}"
+        self.sample_rate = pool.sample_rate
+        self.frame_length = pool.frame_length
+        self.sequence = 0
+        self.in_flight = 0
+        self.dropped = 0
+        self.detections = deque()
+
+    def process(self, pcm):
+        self.pool._submit(self, np.asarray(pcm, dtype=np.int16).tobytes())
+        return self.detections.popleft()[1] if self.detections else -1
+
+    def clear(self):
+        """Forget detections not yet returned, e.g. for audio from before a reply."""
+        self.detections.clear()
+
+    def delete(self):
+        self.pool._release(self)
+
+class WakeWordPool:
+    """
+    Wake-word detection for many streams on a pool of worker processes, one
+    per core by default, so a single box can listen in a dozen rooms. Each
+    stream is pinned to the least-loaded worker when it registers (the
+    detector's state lives there). A dispatcher thread drains submitted
+    frames in batches, interleaving streams round-robin so a backlogged one
+    can't starve the rest, and ships one message per worker per batch.
+    Detections come back to the owning WakeWordStream. A worker that dies is
+    restarted and its streams carry on with fresh detectors.
+    """
+    def __init__(self, workers=WAKEWORD_WORKERS, factory=create_porcupine):
+        self.factory = factory
+        self._context = multiprocessing.get_context("spawn")
+        self._frames = queue.Queue()
+        self._info = queue.Queue()
+        self._streams = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._workers = [None] * max(1, workers)
+        self.frames_processed = 0
+        self.batches = 0
+        for slot in range(len(self._workers)):
+            self._spawn(slot)
+        self._send(0, ("info", None))
+        self.sample_rate, self.frame_length = self._info.get(timeout=30)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="wakeword-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.factory), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[slot] = (process, parent_conn, threading.Lock())
+        threading.Thread(target=self._collect, args=(slot, parent_conn), name=f"wakeword-results-{slot}", daemon=True).start()
+
+    def _send(self, slot, message):
+        _process, conn, send_lock = self._workers[slot]
+        try:
+            with send_lock:
+                conn.send(message)
+            return True
+        except (BrokenPipeError, EOFError, OSError):
+            return False
+
+    def stream(self, name=None):
+        """Register a new audio stream and return its handle."""
+        with self._lock:
+            load = Counter(stream.slot for stream in self._streams.values())
+            slot = min(range(len(self._workers)), key=lambda s: load[s])
+            stream = WakeWordStream(self, next(self._ids), slot, name)
+            self._streams[stream.stream_id] = stream
+        return stream
+
+    def _release(self, stream):
+        with self._lock:
+            self._streams.pop(stream.stream_id, None)
+        self._send(stream.slot, ("close", stream.stream_id))
+
+    def _submit(self, stream, frame):
+        with self._lock:
+            if stream.in_flight >= MAX_IN_FLIGHT:
+                stream.dropped += 1
+                return
+            stream.in_flight += 1
+        stream.sequence += 1
+        self._frames.put((stream, stream.sequence, frame))
+
+    def _dispatch(self):
+        while True:
+            item = self._frames.get()
+            if item is None:
+                return
+            per_stream = defaultdict(deque)
+            per_stream[item[0]].append(item)
+            while True:
+                try:
+                    item = self._frames.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    return
+                per_stream[item[0]].append(item)
+            # Round-robin across streams within the batch, keeping each stream's frames in order.
+            per_slot = defaultdict(list)
+            while per_stream:
+                for stream in list(per_stream):
+                    _stream, sequence, frame = per_stream[stream].popleft()
+                    per_slot[stream.slot].append((stream.stream_id, sequence, frame))
+                    if not per_stream[stream]:
+                        del per_stream[stream]
+            for slot, frames in per_slot.items():
+                if not self._send(slot, ("frames", frames)):
+                    self._settle(Counter(stream_id for stream_id, _, _ in frames))
+            self.batches += 1
+
+    def _settle(self, counts, processed=False):
+        with self._lock:
+            if processed:
+                self.frames_processed += sum(counts.values())
+            for stream_id, count in counts.items():
+                stream = self._streams.get(stream_id)
+                if stream is not None:
+                    stream.in_flight = max(0, stream.in_flight - count)
+
+    def _collect(self, slot, conn):
+        while True:
+            try:
+                kind, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "info":
+                self._info.put(payload)
+            elif kind == "detections":
+                counts, detections = payload
+                self._settle(counts, processed=True)
+                for stream_id, sequence, index in detections:
+                    stream = self._streams.get(stream_id)
+                    if stream is not None:
+                        stream.detections.append((sequence, index))
+        if self._closing or self._workers[slot][1] is not conn:
+            return
+        print(f"Wake-word worker {slot} exited, restarting it")
+        with self._lock:
+            for stream in self._streams.values():
+                if stream.slot == slot:
+                    stream.in_flight = 0
+        self._spawn(slot)
+
+    def close(self):
+        self._closing = True
+        self._frames.put(None)
+        for slot, (process, conn, _lock) in enumerate(self._workers):
+            self._send(slot, None)
+        for process, conn, _lock in self._workers:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+
+if __name__ == "__main__":
+    # Capacity check: feed N streams of noise through the pool as fast as it will
+    # take them and report how many real-time streams that corresponds to,
+    # against a single Porcupine handle in this process.
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the wake-word pool")
+    parser.add_argument("--streams", type=int, default=12)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=WAKEWORD_WORKERS)
+    args = parser.parse_args()
+
+    single = create_porcupine()
+    rng = np.random.default_rng(0)
+    frames_per_stream = int(args.seconds * single.sample_rate / single.frame_length)
+    frame = rng.normal(0, 500, single.frame_length).astype(np.int16)
+    start = time.perf_counter()
+    for _ in range(frames_per_stream):
+        single.process(frame)
+    per_frame = (time.perf_counter() - start) / frames_per_stream
+    frame_seconds = single.frame_length / single.sample_rate
+    print(f"one handle in-process: {per_frame * 1e6:.0f} us/frame, ~{frame_seconds / per_frame:.0f} streams in real time")
+    single.delete()
+
+    pool = WakeWordPool(workers=args.workers)
+    streams = [pool.stream() for _ in range(args.streams)]
+    start = time.perf_counter()
+    for _ in range(frames_per_stream):
+        for stream in streams:
+            while stream.in_flight >= MAX_IN_FLIGHT:
+                time.sleep(0.001)
+            stream.process(frame)
+    while pool.frames_processed < frames_per_stream * len(streams):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    total = frames_per_stream * len(streams)
+    print(f"pool, {len(pool._workers)} workers, {args.streams} streams: {total / elapsed:.0f} frames/s in "
+          f"{pool.batches} batches, ~{total / elapsed * frame_seconds:.0f} streams in real time")
+    pool.close()
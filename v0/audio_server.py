@@ -1,9 +1,18 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+import mimetypes
+from urllib.parse import unquote
 import os
+import re
+import queue
 import threading
 import pyaudio
 import socket
 from utilities.network import get_local_ip
+from config import BASE_DIR
+from audio.broker import StreamBroker
+from audio.protocol import to_mono_int16
 from enum import Enum
 import time
 
@@ -12,6 +21,139 @@ class AudioMode(Enum):
     STREAM = "stream"
     BOTH = "both"
 
+class AudioFileHandler(BaseHTTPRequestHandler):
+    """
+    Static file handler for the audio cache.
+    Speaks HTTP/1.1 with keep-alive, answers single-range requests (Sonos
+    players seek and re-request ranges), supports ETag/Last-Modified
+    conditional requests, and sends file bodies with socket.sendfile so the
+    kernel copies them straight from the page cache.
+    """
+    protocol_version = "HTTP/1.1"
+    MIME_TYPES = {
+        ".mp3": "audio/mpeg",
+        ".wav": "audio/wav",
+        ".flac": "audio/flac",
+        ".ogg": "audio/ogg",
+        ".opus": "audio/ogg",
+        ".m4a": "audio/mp4",
+    }
+    RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+    def __init__(self, *args, directory=None, url_prefix="/", **kwargs):
+        self.directory = os.path.realpath(directory or os.getcwd())
+        self.url_prefix = url_prefix
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _resolve(self):
+        url_path = unquote(self.path.split("?", 1)[0].split("#", 1)[0])
+        if not url_path.startswith(self.url_prefix):
+            return None
+        path = os.path.realpath(os.path.join(self.directory, url_path[len(self.url_prefix):]))
+        # Never serve anything outside the served directory.
+        if os.path.commonpath([path, self.directory]) != self.directory or not os.path.isfile(path):
+            return None
+        return path
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _parse_range(self, size, etag, last_modified):
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range not in (etag, last_modified):
+            return None  # The client's copy is stale; send the whole file.
+        match = self.RANGE_RE.match(range_header.strip())
+        if not match:
+            return None  # Multiple or malformed ranges: fall back to a full response.
+        start, end = match.groups()
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        elif end:
+            start = max(size - int(end), 0)  # Suffix range: the last N bytes.
+            end = size - 1
+        else:
+            return None
+        if start >= size or start > end:
+            return (None, None)
+        return start, end
+
+    def _serve(self, send_body):
+        path = self._resolve()
+        if not path:
+            self.send_error(404, "File not found")
+            return
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        content_type = self.MIME_TYPES.get(os.path.splitext(path)[1].lower()) \
+            or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        if self._not_modified(etag, stat.st_mtime):
+            self.send_response(304)
+            self._send_cache_headers(path, etag, last_modified)
+            self.end_headers()
+            return
+
+        byte_range = self._parse_range(size, etag, last_modified)
+        if byte_range == (None, None):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if byte_range:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+        length = end - start + 1 if size else 0
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self._send_cache_headers(path, etag, last_modified)
+        self.end_headers()
+        if not send_body or not length:
+            return
+        with open(path, "rb") as f:
+            try:
+                self.wfile.flush()
+                self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                # Players routinely drop the connection once they have buffered enough.
+                self.close_connection = True
+
+    def _send_cache_headers(self, path, etag, last_modified):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        # Content-addressed TTS files never change under the same name.
+        if os.path.basename(path).startswith("tts-"):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        else:
+            self.send_header("Cache-Control", "no-cache")
+
 class AudioServer:
     def __init__(self, mode=AudioMode.BOTH, file_port=8009, stream_port=12345):
         self.mode = mode
@@ -19,7 +161,7 @@ class AudioServer:
         self.stream_port = stream_port
         
         # File mode settings
-        self.audio_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "v0/audio_cache")
+        self.audio_dir = os.path.join(BASE_DIR, "audio_cache")
         os.makedirs(self.audio_dir, exist_ok=True)
         
         # Stream mode settings
@@ -37,9 +179,9 @@ class AudioServer:
         self.stream_server = None
         self.threads = []
         
-        self.publishers = []
-        self.subscribers = []
-        
+        self.broker = None
+        self.playback_queue = queue.Queue(maxsize=32)
+
     def start(self):
         if self.mode in [AudioMode.FILE, AudioMode.BOTH]:
             self._start_file_server()
@@ -48,9 +190,10 @@ class AudioServer:
             
     def _start_file_server(self):
         local_ip = get_local_ip()
-        handler = SimpleHTTPRequestHandler
-        handler.directory = self.audio_dir
-        self.file_server = HTTPServer((local_ip, self.file_port), handler)
+        # Files are requested as /audio_cache/<name>; nothing outside the cache is served.
+        handler = partial(AudioFileHandler, directory=self.audio_dir, url_prefix="/audio_cache/")
+        self.file_server = ThreadingHTTPServer((local_ip, self.file_port), handler)
+        self.file_server.daemon_threads = True
         file_thread = threading.Thread(target=self.file_server.serve_forever)
         file_thread.daemon = True
         file_thread.start()
@@ -69,6 +212,7 @@ class AudioServer:
         
         print(f"Streaming audio server running on {local_ip}:{self.stream_port}")
         print("Press 'p' to toggle audio playback")
+        print("Press 's' to show stream stats")
         print("Press 'q' to quit")
         
         # Start keyboard input thread
@@ -77,80 +221,70 @@ class AudioServer:
         input_thread.start()
         self.threads.append(input_thread)
         
-        # Start client handling thread
-        stream_thread = threading.Thread(target=self._handle_stream_connections)
+        # One broker thread serves every publisher and subscriber.
+        self.broker = StreamBroker(
+            self.stream_server,
+            chunk_size=self.CHUNK,
+            bytes_per_second=self.RATE * self.CHANNELS * 2,
+            on_publish=self._play_locally
+        )
+        stream_thread = threading.Thread(target=self.broker.serve_forever)
         stream_thread.daemon = True
         stream_thread.start()
         self.threads.append(stream_thread)
+
+        playback_thread = threading.Thread(target=self._playback_loop)
+        playback_thread.daemon = True
+        playback_thread.start()
+        self.threads.append(playback_thread)
         
-    def _handle_stream_connections(self):
-        try:
-            while True:
-                client_socket, address = self.stream_server.accept()
-                # Read role marker (3 bytes)
-                role = client_socket.recv(3)
-                if role == b"PUB":
-                    print(f"Publisher connected from {address}")
-                    self.publishers.append(client_socket)
-                    threading.Thread(target=self._handle_publisher, args=(client_socket, address), daemon=True).start()
-                elif role == b"SUB":
-                    print(f"Subscriber connected from {address}")
-                    self.subscribers.append(client_socket)
-                    threading.Thread(target=self._handle_subscriber, args=(client_socket, address), daemon=True).start()
-                else:
-                    print(f"Unknown role from {address}, closing connection")
-                    client_socket.close()
-        except Exception as e:
-            print(f"Server error: {str(e)}")
-            
-    def _handle_publisher(self, client_socket, address):
-        try:
-            while True:
-                data = client_socket.recv(self.CHUNK * 2)
-                if not data:
-                    break
-                # Write to local audio output if playback is enabled
-                if self.play_audio and self.output_stream:
-                    try:
-                        self.output_stream.write(data)
-                    except Exception as e:
-                        print(f"Error playing audio: {e}")
-                # Broadcast to all subscribers
-                for sub in self.subscribers[:]:
-                    try:
-                        sub.sendall(data)
-                    except BrokenPipeError:
-                        # Subscriber disconnected; remove silently.
-                        self.subscribers.remove(sub)
-                    except Exception as e:
-                        # Log other errors.
-                        print(f"Error sending to subscriber: {e}")
-            print(f"Publisher disconnected {address}")
-        except Exception as e:
-            print(f"Error handling publisher {address}: {e}")
-        finally:
-            if client_socket in self.publishers:
-                self.publishers.remove(client_socket)
-            client_socket.close()
-            
-    def _handle_subscriber(self, client_socket, address):
-        try:
-            while True:
-                # Just keep the connection alive so broadcasts can be sent.
-                time.sleep(1)
-        except Exception as e:
-            print(f"Error in subscriber {address}: {e}")
-        finally:
-            if client_socket in self.subscribers:
-                self.subscribers.remove(client_socket)
-            client_socket.close()
-            print(f"Subscriber {address} disconnected")
-            
+    def _play_locally(self, data, fmt):
+        # Called from the broker thread; hand off so a blocking write never stalls fan-out.
+        if self.play_audio:
+            try:
+                self.playback_queue.put_nowait((data, fmt))
+            except queue.Full:
+                pass
+
+    def _playback_loop(self):
+        while True:
+            data, fmt = self.playback_queue.get()
+            # Local playback is always mono 16-bit; stereo and float32 streams are converted.
+            data = to_mono_int16(data, fmt)
+            if fmt.rate != self.RATE:
+                # A framed publisher announced a different rate; reopen the output to match.
+                print(f"Local playback rate is now {fmt.rate} Hz")
+                self.RATE = fmt.rate
+                if self.output_stream:
+                    self.output_stream.stop_stream()
+                    self.output_stream.close()
+                    self.output_stream = self._open_output_stream()
+            # Write to local audio output if playback is enabled
+            if self.play_audio and self.output_stream:
+                try:
+                    self.output_stream.write(data)
+                except Exception as e:
+                    print(f"Error playing audio: {e}")
+
+    def print_stream_stats(self):
+        if not self.broker:
+            return
+        stats = self.broker.stats()
+        for pub in stats["publishers"]:
+            level = f", level {pub['level_db']:.1f} dBFS, peak {pub['peak_db']:.1f} dBFS" if pub["level_db"] is not None else ""
+            print(f"Publisher {pub['address']}: {pub['bytes_received']} bytes received, {pub['format']}{level}")
+        for sub in stats["subscribers"]:
+            print(f"Subscriber {sub['address']}{' (framed)' if sub['framed'] else ''}: lag {sub['lag_seconds']:.2f}s, "
+                  f"sent {sub['bytes_sent']} bytes, dropped {sub['bytes_dropped']} bytes "
+                  f"({sub['chunks_dropped']} chunks)")
+
     def _handle_keyboard_input(self):
         while True:
             cmd = input().lower()
             if cmd == 'p':
                 self.toggle_playback()
+            elif cmd == 's':
+                self.print_stream_stats()
             elif cmd == 'q':
                 self.stop()
                 break
@@ -160,23 +294,28 @@ class AudioServer:
         print(f"Audio playback {'enabled' if self.play_audio else 'disabled'}")
         
         if self.play_audio and not self.output_stream:
-            self.output_stream = self.audio.open(
-                format=self.FORMAT,
-                channels=self.CHANNELS,
-                rate=self.RATE,
-                output=True,
-                frames_per_buffer=self.CHUNK
-            )
+            self.output_stream = self._open_output_stream()
         elif not self.play_audio and self.output_stream:
             self.output_stream.stop_stream()
             self.output_stream.close()
             self.output_stream = None
             
+    def _open_output_stream(self):
+        return self.audio.open(
+            format=self.FORMAT,
+            channels=self.CHANNELS,
+            rate=self.RATE,
+            output=True,
+            frames_per_buffer=self.CHUNK
+        )
+
     def stop(self):
         if self.file_server:
             self.file_server.shutdown()
             self.file_server.server_close()
             
+        if self.broker:
+            self.broker.stop()
         if self.stream_server:
             self.stream_server.close()
             
@@ -189,7 +328,8 @@ class AudioServer:
     def get_url_for_file(self, filename):
         if self.mode == AudioMode.STREAM:
             raise RuntimeError("get_url_for_file() is only available in FILE or BOTH modes")
-        return f"http://localhost:{self.file_port}/{filename}"
+        # Same address the file server binds to, so Sonos players on the LAN can fetch it.
+        return f"http://{get_local_ip()}:{self.file_port}/audio_cache/{filename}"
 
 if __name__ == "__main__":
     import sys
@@ -3,13 +3,14 @@
 import argparse
 import os
 from dotenv import load_dotenv
-from llm.chat import chat_with_jarvis_session, chat_with_jarvis_function_call
+from llm.chat import chat_with_jarvis_session, chat_with_jarvis_session_stream, chat_with_jarvis_function_call
 from tts.elevenlabs_tts import synthesize_speech_elevenlabs
 from sonos import play_on_sonos
 from playsound import playsound
 from utilities import logger
 from jarvis_voice import voice_mode
-from tts.speaker import cli_speak, cli_speak_local
+from llm.speculative import SPECULATE
+from tts.speaker import cli_speak, cli_speak_local, cli_speak_stream, cli_speak_local_stream
 from config import BASE_DIR
 
 load_dotenv()
@@ -21,27 +22,52 @@ def main():
     # CLI mode: speak
     speak_parser = subparsers.add_parser("speak", help="Make Jarvis speak a text")
     speak_parser.add_argument("text", type=str, help="Text for Jarvis to speak")
-    speak_parser.add_argument("--speaker", type=str, help="Target speaker room name", default=None)
+    speak_parser.add_argument("--speaker", type=str, help="Target speaker room name, a comma-separated list of rooms, or 'all'", default=None)
     speak_parser.add_argument("--filename", type=str, help="Name of the output audio file", default=None)
+    speak_parser.add_argument("--stream", action="store_true", help="Synthesize and play sentence by sentence")
     
     # CLI mode: ask
     ask_parser = subparsers.add_parser("ask", help="Ask Jarvis a question and get a response")
     ask_parser.add_argument("question", type=str, help="The question to ask Jarvis")
     ask_parser.add_argument("--speaker", type=str, help="Target speaker room name for TTS output", default=None)
     ask_parser.add_argument("--local", action="store_true", help="Play through local audio system instead of Sonos")
+    ask_parser.add_argument("--stream", action="store_true", help="Synthesize and play sentence by sentence")
     
     # CLI mode: voice
     voice_parser = subparsers.add_parser("voice", help="Activate voice mode")
     voice_parser.add_argument("--speaker", type=str, default=None, help="Target Sonos speaker room name")
+    voice_parser.add_argument("--async", dest="use_async", action="store_true", help="Use the asyncio pipeline (overlapped stages, barge-in, latency tracing)")
+    voice_parser.add_argument("--speculate", action="store_true", help="Start the LLM on the partial transcript before you finish speaking (JARVIS_SPECULATE=1)")
+    voice_parser.add_argument("--rooms", type=str, default=None, help="JSON file of rooms to listen in from one process (see voice_rooms.py)")
+    voice_parser.add_argument("--wakeword-workers", type=int, default=None, help="With --rooms, wake-word worker processes (0 runs Porcupine in each room's thread; JARVIS_WAKEWORD_WORKERS)")
 
     args = parser.parse_args()
 
     if args.mode == "speak":
-        if args.speaker:
+        if args.stream:
+            if args.speaker:
+                cli_speak_stream(args.text, args.speaker)
+            else:
+                cli_speak_local_stream(args.text)
+        elif args.speaker:
             cli_speak(args.text, args.speaker, args.filename)
         else:
             cli_speak_local(args.text, args.filename)
     elif args.mode == "ask":
+        if args.stream:
+            # Speak the reply as the LLM writes it; the first sentence plays before the rest exists.
+            def reply_tokens():
+                for token in chat_with_jarvis_session_stream("cli_user", args.question):
+                    print(token, end="", flush=True)
+                    yield token
+                print()
+            print("Jarvis: ", end="", flush=True)
+            if args.speaker:
+                response_text = cli_speak_stream(reply_tokens(), args.speaker)
+            else:
+                response_text = cli_speak_local_stream(reply_tokens())
+            logger.info(f"CLI ask: Question: '{args.question}' answered with: '{response_text}' on speaker: '{args.speaker}' (local: {args.local})")
+            return
         response_text = chat_with_jarvis_session("cli_user", args.question)
         print("Jarvis:", response_text)
         logger.info(f"CLI ask: Question: '{args.question}' answered with: '{response_text}' on speaker: '{args.speaker}' (local: {args.local})")
@@ -50,8 +76,14 @@ def main():
         else:
             cli_speak_local(response_text)
     elif args.mode == "voice":
+        if args.rooms:
+            from voice_rooms import VoiceSupervisor, load_rooms, WAKEWORD_WORKERS
+            wakeword_workers = WAKEWORD_WORKERS if args.wakeword_workers is None else args.wakeword_workers
+            VoiceSupervisor(load_rooms(args.rooms), use_async=args.use_async, wakeword_workers=wakeword_workers,
+                            speculate=args.speculate or SPECULATE).run()
+            return
         use_sonos = bool(args.speaker)  # Set use_sonos to True if a speaker is specified
-        voice_mode(use_sonos=use_sonos, speaker=args.speaker)
+        voice_mode(use_sonos=use_sonos, speaker=args.speaker, use_async=args.use_async, speculate=args.speculate or SPECULATE)
 
 if __name__ == "__main__":
     main()
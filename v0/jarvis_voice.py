@@ -1,222 +1,408 @@
 import os
 import time
 import traceback
-import pyaudio
-import pvporcupine
-from playsound import playsound
-from tts.speaker import cli_speak_local, cli_speak
-from llm.chat import chat_with_jarvis_session, chat_with_jarvis_function_call
+from tts.speaker import cli_speak_local_stream, cli_speak_stream, play_local_audio, LocalPlayer
+from tts.streaming import SentenceChunker, TTS_CONCURRENCY
+from tts.elevenlabs_tts import ELEVENLABS_VOICE_ID, VOICE_SETTINGS
+from tts.cache import cache_key, get_cached_audio, store_cached_audio
+from llm.chat import chat_with_jarvis_function_call_stream, aiter_stream
+from llm.speculative import SpeculativeReply, SpeculationStats, SPECULATE, SPECULATE_AFTER_MS
 from dotenv import load_dotenv
 import numpy as np
 import argparse
-import random
-import openai
-import wave
+import builtins
+import functools
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor
-import uuid
 import aiohttp
 import asyncio
+import concurrent.futures
 from config import BASE_DIR
 import platform
-import subprocess
-import socket
-import scipy.signal
-from collections import deque
+from audio.protocol import connect_subscriber, StreamFormat
+from audio.resample import StreamingResampler
+from audio.capture import MicrophoneCapture
+from audio.vad import Endpointer, get_vad, VAD_END_MS
+from audio.encode import encode_for_upload
+from audio.echo import EchoSuppressor, load_reference
+from audio.wakeword import create_porcupine, KEYWORD_FILE
+from audio.chimes import ActivationChimes
+from stt import get_stt_backend, WhisperAPIBackend
+from utilities import logger
+
+# Audio kept from just before the recorder notices speech, so the first syllable isn't clipped.
+PREROLL_SECONDS = float(os.getenv("JARVIS_PREROLL_SECONDS", "0.3"))
+# Connection pool shared by every HTTP call the async pipeline makes (Whisper, ElevenLabs).
+HTTP_POOL_SIZE = int(os.getenv("JARVIS_HTTP_POOL_SIZE", "16"))
+HTTP_KEEPALIVE = float(os.getenv("JARVIS_HTTP_KEEPALIVE", "60"))
+WHISPER_ENDPOINT = "https://api.openai.com/v1/audio/transcriptions"
+# Speech heard over Jarvis's own voice for this long interrupts the reply.
+BARGE_IN_MS = float(os.getenv("JARVIS_BARGE_IN_MS", "100"))
 
 load_dotenv()
 
-def voice_mode(use_sonos=False, speaker=None, device_index=None, stream_addr=None):
+def voice_mode(use_sonos=False, speaker=None, device_index=None, stream_addr=None, use_async=False,
+               session_id="voice_session", room=None, stt_backend=None, pipeline=None, stop_event=None,
+               wake_word=None, chimes=None, speculate=SPECULATE):
     """
     Unified voice mode.
     • If stream_addr is provided (format "ip:port"), then network (stream) mode is used.
     • Otherwise the local microphone is used.
+    • use_async runs each turn through the asyncio pipeline (shared HTTP session,
+      overlapped stages, barge-in) instead of the blocking path.
+    • When several rooms run in one process (see voice_rooms.py) each passes its
+      own session_id and room name, shares stt_backend and pipeline, and stops
+      when stop_event is set. wake_word replaces the in-process Porcupine
+      handle, e.g. with a stream on a shared WakeWordPool, and chimes shares
+      one set of decoded activation clips.
+    • speculate asks the LLM for a reply as soon as the user seems to have
+      finished (a stable partial transcript after SPECULATE_AFTER_MS of
+      silence) and keeps it if the final transcript agrees. It needs a
+      speech-to-text backend that produces partials.
     """
-    # Initialize Porcupine
-    keyword_file = "v0/Jarvis_en_mac_v3_0_0.ppn"
-    print(f"Keyword file exists: {os.path.exists(keyword_file)}")
-    keyword_paths = [keyword_file]
-    access_key = os.getenv("PORCUPINE_ACCESS_KEY")
-    if not access_key:
-        print("PORCUPINE_ACCESS_KEY not set")
-        return
+    # Several rooms can share one process; tag this loop's output with its room.
+    print = functools.partial(builtins.print, f"[{room}]") if room else builtins.print
+
+    # Initialize Porcupine, unless detection runs elsewhere (a WakeWordPool stream).
+    if wake_word is None:
+        print(f"Keyword file exists: {os.path.exists(KEYWORD_FILE)}")
+        try:
+            porcupine = create_porcupine()
+        except Exception as e:
+            print("Error initializing Porcupine:", e)
+            return
+    else:
+        porcupine = wake_word
+    # Pooled detection reports a frame or two late; drop detections left over from earlier audio.
+    clear_detections = getattr(porcupine, "clear", lambda: None)
+
     try:
-        porcupine = pvporcupine.create(access_key=access_key, keyword_paths=keyword_paths)
+        stt_backend = stt_backend or get_stt_backend()
     except Exception as e:
-        print("Error initializing Porcupine:", e)
+        print("Error initializing speech-to-text backend:", e)
+        porcupine.delete()
         return
 
+    # Activation clips are decoded once and played without holding up the recording.
+    owns_chimes = chimes is None
+    if owns_chimes:
+        chimes = ActivationChimes()
+    if speaker:
+        chimes.stage()
+
+    # Sonos buffers a second or more, and a stream publisher adds network latency, so
+    # the echo suppressor has to look further back for Jarvis's own voice.
+    echo_delay_ms = float(os.getenv("JARVIS_ECHO_MAX_DELAY_MS") or (2500 if use_sonos or stream_addr else 400))
+
     # Determine mode: "stream" vs "mic"
     if stream_addr:
         mode = "stream"
-        publisher_rate = 44100  # stream audio is assumed to be at 44100 Hz
-        record_rate = publisher_rate
-        # For hotword detection, calculate the number of samples to read so that after downsampling we obtain porcupine.frame_length samples.
-        num_samples_needed = int(round(porcupine.frame_length * (publisher_rate / porcupine.sample_rate)))
-        hotword_frame_bytes = num_samples_needed * 2  # 2 bytes per 16-bit sample
-        # Connect to the stream server and indicate subscriber role.
-        ip, port_str = stream_addr.split(":")
-        port = int(port_str)
-        audio_source = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Connect as a framed subscriber; the stream header tells us the publisher's rate,
+        # so a publisher sending 16 kHz needs no resampling at all.
         try:
-            audio_source.connect((ip, port))
-            audio_source.sendall(b"SUB")
+            audio_source, stream_reader = connect_subscriber(stream_addr, StreamFormat(rate=porcupine.sample_rate))
         except Exception as e:
             print("Failed to connect to stream server:", e)
             porcupine.delete()
             return
-        is_socket = True
     else:
         mode = "mic"
         record_rate = porcupine.sample_rate
-        hotword_frame_bytes = porcupine.frame_length * 2
-        pa = pyaudio.PyAudio()
+        # One capture stream stays open for the whole session; hotword detection and
+        # recording read it through their own cursors into the shared ring buffer.
         try:
-            audio_source = pa.open(
+            audio_source = MicrophoneCapture(
                 rate=porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
                 frames_per_buffer=porcupine.frame_length,
-                input_device_index=device_index
-            )
+                device_index=device_index
+            ).start()
         except Exception as e:
             print("Error opening audio stream:", e)
             porcupine.delete()
-            pa.terminate()
             return
-        is_socket = False
-
-    # Helper to read an exact number of bytes from the audio source.
-    def read_exact(source, n):
-        data = b""
-        while len(data) < n:
-            if is_socket:
-                chunk = source.recv(n - len(data))
-            else:
-                chunk = source.read(n - len(data))
-            if not chunk:
-                break
-            data += chunk
-        return data
+        ring = audio_source.ring
+        cursor = audio_source.reader()
+        vad = get_vad(record_rate)
+        hotword_frame = np.empty(porcupine.frame_length, dtype=np.int16)
+        echo = EchoSuppressor(record_rate, porcupine.frame_length, max_delay_ms=echo_delay_ms)
 
-    # Generic conversation recording; operates on the same source, using smart silence detection.
-    def record_conversation_generic(max_duration=30, silence_duration=1.0, silence_threshold=20, silence_ratio=0.4, min_input_duration=0.5):
-        if mode == "mic":
-            try:
-                rec_stream = pa.open(
-                    rate=record_rate,
-                    channels=1,
-                    format=pyaudio.paInt16,
-                    input=True,
-                    frames_per_buffer=porcupine.frame_length,
-                    input_device_index=device_index
-                )
-            except Exception as e:
-                print("Error opening recording stream:", e)
-                return ""
-        else:
-            # In stream mode we keep using the socket.
-            rec_stream = None
+    def apply_stream_format():
+        # Frame sizes depend on the publisher's rate, which can change mid-stream.
+        nonlocal publisher_rate, record_rate, hotword_frame, ring, cursor, resampler, resampled, vad, echo
+        publisher_rate = stream_reader.format.rate
+        record_rate = publisher_rate
+        ring = stream_reader.ring
+        cursor = stream_reader.reader()
+        # For hotword detection, read about one porcupine frame's worth of stream audio per iteration.
+        num_samples_needed = int(round(porcupine.frame_length * (publisher_rate / porcupine.sample_rate)))
+        hotword_frame = np.empty(num_samples_needed, dtype=np.int16)
+        resampler = StreamingResampler(publisher_rate, porcupine.sample_rate)
+        vad = get_vad(record_rate)
+        echo = EchoSuppressor(record_rate, num_samples_needed, max_delay_ms=echo_delay_ms)
+        resampled = np.empty(0, dtype=np.int16)
+        stream_reader.format_changed = False
+        print(f"Stream format: {stream_reader.format}")
+
+    if mode == "stream":
+        publisher_rate = record_rate = hotword_frame = ring = cursor = resampler = resampled = vad = echo = None
+        apply_stream_format()
 
+    # Generic conversation recording; operates on the same source, ending the utterance
+    # when the voice activity detector has heard end_ms of non-speech after the user spoke.
+    # After a barge-in, start_position is where the user started talking over the reply.
+    # Returns the transcription session and the speculative reply started on its partial, if any.
+    def record_conversation_generic(max_duration=30, end_ms=VAD_END_MS, min_input_duration=0.5, start_position=None):
         print("Recording conversation...")
-        frames = []
         start_time = time.time()
-        frame_interval = porcupine.frame_length / porcupine.sample_rate
         conv_samples = int(round(porcupine.frame_length * (record_rate / porcupine.sample_rate)))
-        conv_frame_bytes = conv_samples * 2
-
-        if mode == "stream":
-            adjusted_threshold = silence_threshold * (record_rate / porcupine.sample_rate)
-        else:
-            adjusted_threshold = silence_threshold
-
-        speech_started = False
-        speech_start_time = None
-        max_amp = 0.0
-        window_size = int(silence_duration / frame_interval) or 1
-        rms_window = deque(maxlen=window_size)
+        conv_frame = np.empty(conv_samples, dtype=np.int16)
+        preroll_bytes = int(PREROLL_SECONDS * record_rate) * 2
+        # Frames are read into one reused array. From a little before speech starts, audio
+        # goes to the speech-to-text session as it arrives, so local engines can decode
+        # while the user is still talking.
+        session = stt_backend.stream(record_rate, on_partial=lambda text: print(f"... {text}"))
+        # What the recognizer gets: each frame with any playback (the activation chime,
+        # the end of a reply) taken out by the echo suppressor.
+        heard = bytearray()
+        recorder = audio_source.reader() if mode == "mic" else stream_reader.reader()
+        if start_position is not None:
+            recorder.position = max(ring.oldest, start_position)
+        recorder.rewind(preroll_bytes)
+        recording_start = recorder.position
+        speech_position = None
+        if vad.needs_calibration:
+            # First recording: learn the room's background level from the last second of audio.
+            calibration = ring.get(recording_start - record_rate * 2, recording_start)
+            vad.calibrate(np.frombuffer(calibration, dtype=np.int16), conv_samples)
+        endpointer = Endpointer(conv_samples / record_rate, end_ms=end_ms, min_speech_ms=min_input_duration * 1000)
+        # Speculation: once the user has been quiet for likely_end frames and the partial
+        # transcript covers all of their speech, start the reply on that partial.
+        speculation = None
+        likely_end = max(1, int(round(SPECULATE_AFTER_MS / 1000.0 * record_rate / conv_samples)))
+        feed_start = speech_end = None
 
         while True:
             if time.time() - start_time > max_duration:
                 print("Reached maximum recording duration.")
                 break
-            if mode == "mic":
-                try:
-                    data = rec_stream.read(porcupine.frame_length, exception_on_overflow=False)
-                except Exception as e:
-                    print("Error during conversation recording:", e)
-                    break
-            else:
-                data = read_exact(audio_source, conv_frame_bytes)
-                if len(data) != conv_frame_bytes:
-                    print("Incomplete conversation frame, ending recording.")
-                    break
-            frames.append(data)
-            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
-            current_rms = np.sqrt(np.mean(samples ** 2)) if samples.size > 0 else 0.0
-
-            if not speech_started and current_rms >= adjusted_threshold:
-                speech_started = True
-                speech_start_time = time.time()
-                max_amp = current_rms
-
-            if speech_started:
-                max_amp = max(max_amp, current_rms)
-                if time.time() - speech_start_time >= min_input_duration:
-                    rms_window.append(current_rms)
-                    if len(rms_window) == window_size:
-                        if np.mean(rms_window) < max_amp * silence_ratio:
-                            print("Silence detected. Ending recording.")
-                            break
+            frame_position = recorder.position
+            try:
+                count = recorder.read_into(conv_frame, timeout=1.0)
+            except Exception as e:
+                print("Error during conversation recording:", e)
+                break
+            if count == 0 and not ring.closed:
+                continue
+            if count != conv_frame.nbytes:
+                print("Incomplete conversation frame, ending recording.")
+                break
+            if mode == "stream" and stream_reader.format_changed:
+                print("Stream format changed mid-recording, ending recording.")
+                break
+
+            # Audio overlapping Jarvis's playback only counts if it isn't just the echo.
+            speech = vad.is_speech(conv_frame)
+            event = endpointer.update(echo.near_end(conv_frame, frame_position) and speech)
+            clean = echo.suppress(conv_frame, frame_position).tobytes()
+            heard += clean
+            if event == "start":
+                # Speech began with the first of the frames that confirmed it.
+                speech_position = frame_position - (endpointer.start_frames - 1) * conv_frame.nbytes
+                feed_start = max(recording_start, speech_position - preroll_bytes)
+                session.feed(bytes(heard[feed_start - recording_start:]))
+            elif speech_position is not None:
+                session.feed(clean)
+            if speculate and speech_position is not None:
+                if endpointer.silence_run == 0:
+                    speech_end = recorder.position
+                    if speculation:
+                        print("Still talking, dropping the speculative reply.")
+                        speculation.cancel()
+                        speculation = None
+                elif endpointer.silence_run >= likely_end and speculation is None and event != "end":
+                    session.refresh_partial()
+                    if session.partial and session.partial_bytes >= speech_end - feed_start:
+                        print(f"Speculating on: {session.partial}")
+                        speculation = SpeculativeReply(session_id, session.partial)
+            if event == "end":
+                print("Silence detected. Ending recording.")
+                break
 
-        if mode == "mic":
-            rec_stream.stop_stream()
-            rec_stream.close()
         print("Finished conversation recording.")
-        audio_data = b"".join(frames)
-        tmp_filename = "conversation.wav"
-        wf = wave.open(tmp_filename, 'wb')
-        wf.setnchannels(1)
-        if mode == "mic":
-            wf.setsampwidth(pa.get_sample_size(pyaudio.paInt16))
-        else:
-            wf.setsampwidth(2)
-        wf.setframerate(record_rate)
-        wf.writeframes(audio_data)
-        wf.close()
+        if speech_position is None:
+            # Nothing crossed the threshold; let the recognizer judge the whole recording.
+            session.feed(bytes(heard))
+        return session, speculation
+
+    def transcribe_recording(session):
         try:
-            print("Transcribing conversation audio via OpenAI Whisper API...")
-            with open(tmp_filename, "rb") as audio_file:
-                transcript = openai.Audio.transcribe("whisper-1", audio_file)
-            os.remove(tmp_filename)
-            return transcript.get("text", "")
+            print(f"Transcribing conversation audio via {type(stt_backend).__name__}...")
+            if pipeline:
+                return pipeline.run(transcribe(pipeline.http, session))
+            return session.finish()
         except Exception as e:
             print("Transcription error:", e)
-            os.remove(tmp_filename)
             return ""
 
-    # Add a helper to flush residual microphone input.
-    def flush_mic(duration=1.0):
-        try:
-            flush_stream = pa.open(
-                rate=porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                frames_per_buffer=porcupine.frame_length,
-                input_device_index=device_index
-            )
-            end_time = time.time() + duration
-            # Read and discard audio for 'duration' seconds.
-            while time.time() < end_time:
-                flush_stream.read(porcupine.frame_length, exception_on_overflow=False)
-            flush_stream.stop_stream()
-            flush_stream.close()
-        except Exception as e:
-            print("Error flushing microphone:", e)
+    def next_hotword_pcm(timeout=None, process=None):
+        """
+        The next porcupine-sized frame of 16 kHz audio, or None if a whole frame
+        isn't ready yet. process(frame, position), if given, sees each raw frame
+        at the source rate and returns the audio to use for the wake word.
+        Raises EOFError once the source has ended.
+        """
+        nonlocal resampled
+        position = cursor.position
+        if cursor.read_into(hotword_frame, timeout=timeout) != hotword_frame.nbytes:
+            if ring.closed:
+                raise EOFError
+            return None
+        if mode == "stream" and stream_reader.format_changed:
+            apply_stream_format()
+            return None
+        raw = process(hotword_frame, position) if process else hotword_frame
+        if mode == "mic":
+            return raw
+        # Downsample from publisher_rate to porcupine.sample_rate, carrying filter state
+        # across reads; the output comes in whole resampling periods, so buffer whole frames.
+        resampled = np.concatenate((resampled, resampler.process(raw)))
+        if len(resampled) < porcupine.frame_length:
+            return None
+        pcm = resampled[:porcupine.frame_length]
+        resampled = resampled[porcupine.frame_length:]
+        return pcm
+
+    def settle_speculation(speculation, user_text, trace):
+        """Keep the speculative reply if it answered what the user actually said; returns it or None."""
+        if speculation is None:
+            return None
+        hit = speculation.matches(user_text)
+        if hit:
+            speculation.confirm()
+        else:
+            speculation.cancel()
+        speculation_stats.record(speculation, hit)
+        outcome = f"hit, saved {speculation.saved_ms:.0f} ms" if hit else f"miss (guessed '{speculation.text}')"
+        trace.note(f"speculation {outcome}")
+        print(f"Speculative reply: {outcome}; {speculation_stats.summary()}")
+        return speculation if hit else None
+
+    def register_playback(path, trace):
+        """Hand each file to the echo suppressor as it starts playing."""
+        trace.mark("playback_start")
+        echo.add_reference(load_reference(path, record_rate), ring.written)
+
+    def listen_while_speaking(finished, interrupt):
+        """
+        Full duplex: while a reply plays, keep the wake word and the VAD running
+        on echo-suppressed audio and interrupt() the reply as soon as the user
+        talks over it. Returns (barged_in, position) where position is the ring
+        position their speech started at (None for the wake word, which needs
+        no transcribing).
+        """
+        cursor.skip_to_end()
+        clear_detections()
+        endpointer = Endpointer(hotword_frame.size / record_rate, start_ms=BARGE_IN_MS)
+        onset = None
+
+        def check(frame, position):
+            nonlocal onset
+            speech = vad.is_speech(frame)
+            if endpointer.update(echo.near_end(frame, position) and speech) == "start":
+                onset = position - (endpointer.start_frames - 1) * frame.nbytes
+            return echo.suppress(frame, position)
+
+        while not finished():
+            try:
+                pcm = next_hotword_pcm(timeout=0.05, process=check)
+            except EOFError:
+                break
+            if onset is not None:
+                print("User started talking, stopping the reply.")
+            elif pcm is not None and porcupine.process(pcm) >= 0:
+                print("Wake word heard while speaking, stopping the reply.")
+            else:
+                continue
+            interrupt()
+            echo.stop(ring.written)
+            return True, onset
+        echo.stop(ring.written)
+        return False, None
+
+    def speak_reply(user_text, trace, speculation=None):
+        """
+        Play the reply on the blocking path from a worker thread while this one
+        listens for barge-in. Returns (text spoken, barged_in, speech position).
+        A confirmed speculation supplies the reply tokens already under way.
+        As on the asyncio path, a barge-in closes the reply stream, so the
+        interrupted turn is not saved.
+        """
+        stop = threading.Event()
+        # This reply's own local playback, so stopping it leaves any other room's alone.
+        player = LocalPlayer()
+        result = {"answer": ""}
+
+        # Stream the reply straight into TTS so speech starts with the first sentence.
+        def reply_tokens():
+            stream = speculation.tokens() if speculation else chat_with_jarvis_function_call_stream(session_id, user_text)
+            try:
+                for token in stream:
+                    trace.mark("llm_first_token")
+                    yield token
+            except Exception as process_err:
+                print("Error processing query:", process_err)
+                yield "Sorry, an error occurred processing your request."
+            finally:
+                stream.close()
+
+        def run():
+            on_play = lambda path: register_playback(path, trace)
+            try:
+                if use_sonos:
+                    result["answer"] = cli_speak_stream(reply_tokens(), speaker, on_play=on_play, stop=stop)
+                else:
+                    result["answer"] = cli_speak_local_stream(reply_tokens(), on_play=on_play, stop=stop, player=player)
+            except Exception as e:
+                print("Error speaking reply:", e)
+
+        def interrupt():
+            stop.set()
+            try:
+                if use_sonos:
+                    from sonos import get_sonos_speaker
+                    get_sonos_speaker(speaker).stop()
+                else:
+                    player.stop()
+            except Exception as e:
+                print("Error stopping playback:", e)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        barged_in, position = listen_while_speaking(lambda: not worker.is_alive(), interrupt)
+        # After a barge-in the worker may still be waiting on the next sentence; don't hold up the recording for it.
+        worker.join(timeout=0.5)
+        trace.mark("done")
+        trace.report("barge-in" if barged_in else "complete")
+        return result["answer"], barged_in, position
+
+    def speak_reply_async(user_text, trace, speculation=None):
+        """Same as speak_reply, on the asyncio pipeline; cancelling the reply stops its playback."""
+        spoken = []
+        player = pipeline.player(use_sonos, speaker, on_play=lambda path: register_playback(path, trace))
+        stream = speculation.tokens() if speculation else None
+        future = pipeline.submit(respond(pipeline.http, session_id, user_text, trace, player=player, spoken=spoken,
+                                         stream=stream))
+        barged_in, position = listen_while_speaking(future.done, future.cancel)
+        if not barged_in:
+            try:
+                future.result()
+            except concurrent.futures.CancelledError:
+                pass
+            except Exception as e:
+                print("Error in voice pipeline:", e)
+        trace.report("barge-in" if barged_in else "complete")
+        return " ".join(spoken), barged_in, position
 
-    # Add this helper near flush_mic (e.g. just before the "Voice mode activated" print)
     def remove_echo(transcript, last_tts):
         if not last_tts:
             return transcript
@@ -227,51 +413,11 @@ def voice_mode(use_sonos=False, speaker=None, device_index=None, stream_addr=Non
                 transcript = transcript.replace(part, "")
         return transcript.strip()
 
-    def flush_until_silence(silence_threshold=20, silence_required=1.0, max_flush=5.0):
+    def flush_stream_socket():
         try:
-            flush_stream = pa.open(
-                rate=porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                frames_per_buffer=porcupine.frame_length,
-                input_device_index=device_index
-            )
-            start_time = time.time()
-            silent_time = 0.0
-            while time.time() - start_time < max_flush:
-                data = flush_stream.read(porcupine.frame_length, exception_on_overflow=False)
-                samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
-                current_rms = np.sqrt(np.mean(samples ** 2)) if samples.size > 0 else 0.0
-                if current_rms < silence_threshold:
-                    silent_time += porcupine.frame_length / porcupine.sample_rate
-                    if silent_time >= silence_required:
-                        break
-                else:
-                    silent_time = 0.0
-            flush_stream.stop_stream()
-            flush_stream.close()
-        except Exception as e:
-            print("Error flushing microphone until silence:", e)
-
-    def flush_stream_socket(duration=2.0):
-        try:
-            # For stream mode, read and discard data from the socket for a fixed duration.
-            orig_timeout = audio_source.gettimeout() if hasattr(audio_source, "gettimeout") else None
-            audio_source.settimeout(0.1)
-            end_time = time.time() + duration
-            while time.time() < end_time:
-                try:
-                    _ = audio_source.recv(1024)
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    print("Error flushing stream socket:", e)
-                    break
-            if orig_timeout is not None:
-                audio_source.settimeout(orig_timeout)
-            else:
-                audio_source.settimeout(None)
+            # For stream mode, take in what the server sent while we were busy, then skip past it.
+            stream_reader.drain()
+            cursor.skip_to_end()
         except Exception as e:
             print("Error flushing stream socket:", e)
 
@@ -285,228 +431,382 @@ def voice_mode(use_sonos=False, speaker=None, device_index=None, stream_addr=Non
         ratio = len(common) / len(user_words)
         return ratio >= threshold
 
+    owns_pipeline = use_async and pipeline is None
+    if owns_pipeline:
+        pipeline = AsyncVoicePipeline()
+    if speculate and not getattr(stt_backend, "streaming", False):
+        print(f"{type(stt_backend).__name__} gives no partial transcripts; speculative replies are off.")
+        speculate = False
+    speculation_stats = SpeculationStats()
     print(f"Voice mode activated ({mode} mode). Say the hotword to interact with Jarvis...")
-    executor = ThreadPoolExecutor()
-    session_id = "voice_session"
     last_tts = ""
 
     try:
-        while True:
+        while not (stop_event and stop_event.is_set()):
             # For hotword detection, read a full frame.
-            if mode == "mic":
+            try:
+                pcm = next_hotword_pcm(timeout=1.0)
+            except EOFError:
+                if mode == "mic":
+                    print("Microphone capture ended.")
+                    break
+                print("Incomplete frame received, reconnecting...")
+                try:
+                    audio_source.close()
+                except Exception:
+                    pass
                 try:
-                    pcm_data = audio_source.read(porcupine.frame_length, exception_on_overflow=False)
+                    audio_source, stream_reader = connect_subscriber(stream_addr, StreamFormat(rate=porcupine.sample_rate))
+                    apply_stream_format()
                 except Exception as e:
-                    print("Error reading from microphone:", e)
-                    continue
-                pcm = np.frombuffer(pcm_data, dtype=np.int16)
-            else:
-                data = read_exact(audio_source, hotword_frame_bytes)
-                if len(data) != hotword_frame_bytes:
-                    print("Incomplete frame received, reconnecting...")
-                    try:
-                        audio_source.close()
-                    except Exception:
-                        pass
-                    try:
-                        audio_source = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        ip, port_str = stream_addr.split(":")
-                        port = int(port_str)
-                        audio_source.connect((ip, port))
-                        audio_source.sendall(b"SUB")
-                    except Exception as e:
-                        print("Reconnection failed:", e)
-                        break
-                    continue
-                raw_pcm = np.frombuffer(data, dtype=np.int16)
-                # Downsample from publisher_rate to porcupine.sample_rate.
-                pcm = scipy.signal.resample(raw_pcm, porcupine.frame_length).astype(np.int16)
+                    print("Reconnection failed:", e)
+                    break
+                continue
+            if pcm is None:
+                continue
             keyword_index = porcupine.process(pcm)
             if keyword_index >= 0:
+                # Recording starts while the chime plays; the echo suppressor knows the
+                # clip, so it neither opens the utterance nor reaches the recognizer.
+                selected_asset = chimes.choose()
+                last_activation_text = chimes.text(selected_asset)
                 try:
-                    assets = ["welcome-back.mp3", "goodday.mp3", "greetings.mp3", "listening.mp3", "right-here.mp3", "yes-sir.mp3"]
-                    activation_texts = {
-                        "welcome-back.mp3": "Welcome back, sir.",
-                        "goodday.mp3": "Good day, sir.",
-                        "greetings.mp3": "Greetings, sir.",
-                        "listening.mp3": "Listening, sir.",
-                        "right-here.mp3": "Right here, sir.",
-                        "yes-sir.mp3": "Yes, sir."
-                    }
-                    selected_asset = random.choice(assets)
-                    last_activation_text = activation_texts.get(selected_asset, "")
-                    if speaker:
-                        import shutil
-                        from sonos import play_on_sonos
-                        assets_dir = os.path.join(BASE_DIR, "v0", "assets", "voice", "activate")
-                        audio_cache_dir = os.path.join(BASE_DIR, "audio_cache")
-                        os.makedirs(audio_cache_dir, exist_ok=True)
-                        asset_path = os.path.join(assets_dir, selected_asset)
-                        cache_path = os.path.join(audio_cache_dir, selected_asset)
-                        if not os.path.exists(cache_path):
-                            shutil.copy(asset_path, cache_path)
-                        play_on_sonos(selected_asset, room_name=speaker)
-                    else:
-                        sound_filepath = os.path.join(BASE_DIR, "v0", "assets", "voice", "activate", selected_asset)
-                        if platform.system() == "Darwin":
-                            subprocess.call(["afplay", sound_filepath])
-                        else:
-                            playsound(sound_filepath)
+                    chime_position = ring.written
+                    reference = chimes.play(selected_asset, speaker=speaker, rate=record_rate) if selected_asset else None
+                    if reference is not None:
+                        echo.add_reference(reference, chime_position)
                 except Exception as play_err:
                     print("Error playing confirmation sound:", play_err)
                 print("Hotword detected! Listening for your questions...")
-                if mode == "mic":
-                    audio_source.stop_stream()
-                    audio_source.close()
                 interaction_count = 0
-                while interaction_count < 10:
-                    if mode == "mic":
-                        flush_until_silence(silence_threshold=20, silence_required=0.5, max_flush=2.0)
-                    else:
-                        flush_stream_socket(duration=1.0)
-                    user_text = record_conversation_generic(
-                        max_duration=30,
-                        silence_duration=1.0,
-                        silence_threshold=20,
-                        silence_ratio=0.4,
-                        min_input_duration=0.5
-                    )
+                barged_in, barge_in_position = False, None
+                while interaction_count < 10 and not (stop_event and stop_event.is_set()):
+                    # Each recording starts its own cursor at the live end of the buffer, so
+                    # the mic needs no flushing; the stream socket is drained so we skip what
+                    # the server buffered while we were transcribing. Right after the chime
+                    # nothing is stale, and after a barge-in the recording picks up from
+                    # where the user started talking over the reply.
+                    if mode == "stream" and interaction_count and not barged_in:
+                        flush_stream_socket()
+                    recording, speculation = record_conversation_generic(max_duration=30, min_input_duration=0.5,
+                                                                         start_position=barge_in_position)
+                    # Turn latency is measured from the moment the user stopped talking.
+                    trace = LatencyTrace(room)
+                    user_text = transcribe_recording(recording)
+                    trace.mark("stt")
                     user_text = remove_echo(user_text, last_tts)
+                    ignore = None
                     # Ignore if the recording exactly matches the activation phrase.
                     if last_activation_text and user_text.strip().lower() == last_activation_text.lower():
-                        print("Detected activation phrase, ignoring input.")
-                        break
+                        ignore = "Detected activation phrase, ignoring input."
                     # Also ignore if the input echoes the assistant's prior reply.
-                    if last_tts and is_echo(user_text, last_tts):
-                        print("Detected echo of assistant output, ignoring input.")
-                        break
-                    if len(''.join(filter(str.isalnum, user_text))) < 3:
-                        print("Insufficient speech detected, ending conversation mode.")
+                    elif last_tts and is_echo(user_text, last_tts):
+                        ignore = "Detected echo of assistant output, ignoring input."
+                    elif len(''.join(filter(str.isalnum, user_text))) < 3:
+                        ignore = "Insufficient speech detected, ending conversation mode."
+                    if ignore:
+                        print(ignore)
+                        if speculation:
+                            speculation.cancel()
                         break
                     print("You said:", user_text)
-                    future = executor.submit(chat_with_jarvis_function_call, session_id, user_text)
-                    try:
-                        answer = future.result(timeout=30)
-                    except Exception as process_err:
-                        print("Error processing query:", process_err)
-                        answer = "Sorry, an error occurred processing your request."
+                    speculation = settle_speculation(speculation, user_text, trace)
+                    if pipeline:
+                        answer, barged_in, barge_in_position = speak_reply_async(user_text, trace, speculation)
+                    else:
+                        answer, barged_in, barge_in_position = speak_reply(user_text, trace, speculation)
                     print("Jarvis:", answer)
                     last_tts = answer
-                    if use_sonos:
-                        cli_speak(answer, speaker)
-                    else:
-                        cli_speak_local(answer)
                     interaction_count += 1
-                if mode == "mic":
-                    try:
-                        audio_source = pa.open(
-                            rate=porcupine.sample_rate,
-                            channels=1,
-                            format=pyaudio.paInt16,
-                            input=True,
-                            frames_per_buffer=porcupine.frame_length,
-                            input_device_index=device_index
-                        )
-                    except Exception as stream_e:
-                        print("Error reopening audio stream:", stream_e)
-                        break
+                cursor.skip_to_end()
+                clear_detections()
                 print("Resuming hotword listening...")
     except KeyboardInterrupt:
         print("Voice mode terminating...")
     finally:
         try:
             if mode == "mic":
-                audio_source.stop_stream()
-                audio_source.close()
-                pa.terminate()
+                audio_source.stop()
         except Exception:
             pass
         porcupine.delete()
-        executor.shutdown(wait=False)
+        if owns_chimes:
+            chimes.close()
+        if owns_pipeline:
+            pipeline.close()
         if mode == "stream":
             try:
                 audio_source.close()
             except Exception:
                 pass
 
-async def transcribe(audio_filepath: str) -> str:
-    # Read audio file (assuming Whisper API supports async calls)
-    with open(audio_filepath, "rb") as f:
-        audio_data = f.read()
-    endpoint = "https://api.openai.com/v1/audio/transcribe"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
-    }
-    async with aiohttp.ClientSession() as session:
-        # You might need to adjust how the file is sent (multipart/form-data, etc.)
-        data = {"file": audio_data, "model": "whisper-1"}
-        async with session.post(endpoint, headers=headers, data=data) as resp:
-            result = await resp.json()
-            return result.get("text", "")
-
-async def query_llm(user_text: str) -> str:
-    endpoint = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-        "Content-Type": "application/json"
-    }
-    json_data = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {"role": "system", "content": ("You are Jarvis, a witty, calm, and helpful AI assistant. "
-                                            "Respond in one or two concise sentences.")},
-            {"role": "user", "content": user_text}
-        ]
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(endpoint, json=json_data, headers=headers) as resp:
-            result = await resp.json()
-            return result['choices'][0]['message']['content'].strip()
+class LatencyTrace:
+    """
+    Per-stage latency of one voice turn, in milliseconds from the moment the
+    user stopped talking: final transcript, first LLM token, first complete
+    sentence, first synthesized audio, start of playback, and the end of the
+    reply. Each stage is stamped the first time it is reached.
+    """
+    STAGES = ("stt", "llm_first_token", "first_sentence", "tts_first_audio", "playback_start", "done")
+
+    def __init__(self, label=None):
+        self.label = label
+        self.start = time.perf_counter()
+        self.marks = {}
+        self.notes = []
+
+    def mark(self, stage):
+        self.marks.setdefault(stage, (time.perf_counter() - self.start) * 1000)
 
-async def synthesize_tts(text: str) -> str:
-    endpoint = "https://api.elevenlabs.io/v1/text-to-speech/ulWtRlgyOsbPRpjVAuGP"
+    def note(self, text):
+        """Something about this turn worth reporting alongside its timings."""
+        self.notes.append(text)
+
+    def summary(self):
+        return ", ".join([f"{stage} {self.marks[stage]:.0f} ms" for stage in self.STAGES if stage in self.marks] + self.notes)
+
+    def report(self, outcome="complete"):
+        line = f"Turn latency ({outcome}): {self.summary()}"
+        if self.label:
+            line = f"[{self.label}] {line}"
+        print(line)
+        logger.info(line)
+
+async def transcribe(http, stt_session):
+    """
+    Final transcript of a finished recording. Whisper API uploads go through
+    the shared HTTP session; local engines finish on a worker thread.
+    """
+    if not isinstance(stt_session.backend, WhisperAPIBackend):
+        return await asyncio.get_running_loop().run_in_executor(None, stt_session.finish)
+    if not stt_session.pcm:
+        return ""
+    audio_file = await asyncio.get_running_loop().run_in_executor(
+        None, encode_for_upload, bytes(stt_session.pcm), stt_session.rate
+    )
+    form = aiohttp.FormData()
+    form.add_field("model", "whisper-1")
+    form.add_field("file", audio_file.getvalue(), filename=audio_file.name)
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+    async with http.post(WHISPER_ENDPOINT, headers=headers, data=form) as resp:
+        if resp.status != 200:
+            raise Exception(f"Whisper transcription failed with status code {resp.status}: {await resp.text()}")
+        result = await resp.json()
+        return result.get("text", "")
+
+async def query_llm(session_id, user_text, stream=None):
+    """
+    Jarvis's reply token by token, with the same memory and function calls as
+    the blocking path; stream is a reply already under way (a confirmed
+    speculation) to use instead of a new request.
+    """
+    try:
+        async for token in aiter_stream(stream or chat_with_jarvis_function_call_stream(session_id, user_text)):
+            yield token
+    except Exception as e:
+        print("Error processing query:", e)
+        yield "Sorry, an error occurred processing your request."
+
+async def synthesize_tts(http, text):
+    """Synthesize one sentence with ElevenLabs (through the TTS cache); returns the audio_cache filename."""
+    key = cache_key(text, ELEVENLABS_VOICE_ID, VOICE_SETTINGS)
+    cached_filename = get_cached_audio(key)
+    if cached_filename:
+        return cached_filename
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
     headers = {
         "xi-api-key": os.getenv("ELEVENLABS_API_KEY"),
         "Content-Type": "application/json"
     }
     payload = {
         "text": text,
-        "voice_settings": {
-            "stability": 0.3,
-            "similarity_boost": 0.8
-        }
+        "voice_settings": VOICE_SETTINGS
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(endpoint, json=payload, headers=headers) as resp:
-            if resp.status == 200:
-                audio_content = await resp.read()
-                filename = f"{uuid.uuid4()}.mp3"
-                audio_dir = os.path.join(BASE_DIR, "audio_cache")
-                os.makedirs(audio_dir, exist_ok=True)
-                filepath = os.path.join(audio_dir, filename)
-                with open(filepath, "wb") as f:
-                    f.write(audio_content)
-                return filename
-            else:
-                raise Exception(f"TTS failed with status code {resp.status}")
+    async with http.post(url, json=payload, headers=headers) as resp:
+        if resp.status != 200:
+            raise Exception(f"ElevenLabs TTS failed with status code {resp.status}: {await resp.text()}")
+        audio_content = await resp.read()
+    return store_cached_audio(key, audio_content, text)
+
+class LocalPlayback:
+    """
+    Plays sentences on this machine one after another; on macOS a cancelled
+    play() kills afplay at once. on_play(path) is called as each file starts.
+    """
+    def __init__(self, on_play=None):
+        self.on_play = on_play
+
+    async def play(self, filename):
+        path = os.path.join(BASE_DIR, "audio_cache", filename)
+        if self.on_play:
+            self.on_play(path)
+        if platform.system() != "Darwin":
+            await asyncio.get_running_loop().run_in_executor(None, play_local_audio, path)
+            return
+        process = await asyncio.create_subprocess_exec("afplay", path)
+        try:
+            await process.wait()
+        except asyncio.CancelledError:
+            process.terminate()
+            raise
+
+    async def finish(self):
+        pass
+
+    def stop(self):
+        pass
+
+class SonosPlayback:
+    """
+    Queues sentences on a Sonos speaker through play_sequence_on_sonos, which
+    runs on a worker thread and snapshots/restores the speaker around the reply.
+    stop() ends the queue and stops the speaker, so the restore happens at once.
+    on_play(path) is called as each file is queued.
+    """
+    def __init__(self, speaker=None, on_play=None):
+        self.speaker = speaker
+        self.on_play = on_play
+        self.files = queue.Queue()
+        self.task = None
+
+    def _filenames(self):
+        while True:
+            filename = self.files.get()
+            if filename is None:
+                return
+            yield filename
+
+    async def play(self, filename):
+        from sonos import play_sequence_on_sonos
+        if self.on_play:
+            self.on_play(os.path.join(BASE_DIR, "audio_cache", filename))
+        self.files.put(filename)
+        if self.task is None:
+            self.task = asyncio.get_running_loop().run_in_executor(
+                None, play_sequence_on_sonos, self._filenames(), self.speaker
+            )
+
+    async def finish(self):
+        self.files.put(None)
+        if self.task is not None:
+            await self.task
+
+    def stop(self):
+        from sonos import get_sonos_speaker
+        self.files.put(None)
+        if self.task is not None:
+            try:
+                get_sonos_speaker(self.speaker).stop()
+            except Exception as e:
+                print("Error stopping Sonos playback:", e)
 
-async def process_pipeline(audio_filepath: str):
-    transcribed_text = await transcribe(audio_filepath)
-    response_text = await query_llm(transcribed_text)
-    audio_filename = await synthesize_tts(response_text)
-    return response_text, audio_filename
+async def respond(http, session_id, user_text, trace, player, spoken=None, concurrency=TTS_CONCURRENCY, stream=None):
+    """
+    Speak Jarvis's reply with every stage overlapped: sentences are cut from the
+    LLM stream as it arrives, synthesized up to `concurrency` at a time, and
+    played strictly in order while later ones are still being generated.
+    Cancelling the task stops playback and abandons the rest of the reply.
+    stream, if given, supplies the reply tokens (see query_llm).
+    Returns the text that was spoken (also appended to `spoken` as it plays).
+    """
+    spoken = [] if spoken is None else spoken
+    limit = asyncio.Semaphore(concurrency)
+    sentences = asyncio.Queue()
+    done = object()
+
+    async def synthesize(sentence):
+        async with limit:
+            filename = await synthesize_tts(http, sentence)
+        trace.mark("tts_first_audio")
+        return filename
+
+    def enqueue(sentence):
+        trace.mark("first_sentence")
+        sentences.put_nowait((sentence, asyncio.ensure_future(synthesize(sentence))))
+
+    async def produce():
+        chunker = SentenceChunker()
+        try:
+            async for token in query_llm(session_id, user_text, stream):
+                trace.mark("llm_first_token")
+                for sentence in chunker.feed(token):
+                    enqueue(sentence)
+            for sentence in chunker.flush():
+                enqueue(sentence)
+        finally:
+            sentences.put_nowait(done)
 
-async def main():
-    audio_filepath = "input.wav"  # Replace with your recorded file
-    response_text, tts_file = await process_pipeline(audio_filepath)
-    print("Response text:", response_text)
-    print("Generated TTS file:", tts_file)
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await sentences.get()
+            if item is done:
+                break
+            sentence, synthesis = item
+            try:
+                filename = await synthesis
+            except Exception as e:
+                print(f"Error synthesizing '{sentence[:40]}': {e}")
+                continue
+            trace.mark("playback_start")
+            spoken.append(sentence)
+            await player.play(filename)
+        await player.finish()
+        trace.mark("done")
+    except asyncio.CancelledError:
+        player.stop()
+        raise
+    finally:
+        producer.cancel()
+        while not sentences.empty():
+            item = sentences.get_nowait()
+            if item is not done:
+                item[1].cancel()
+    text = " ".join(spoken)
+    logger.info(f"Async voice reply: '{text}'")
+    return text
+
+class AsyncVoicePipeline:
+    """
+    An asyncio event loop on a background thread for voice loops to hand
+    turns to, with one pooled aiohttp session that every stage shares, so
+    Whisper and ElevenLabs requests reuse warm keep-alive connections. It
+    holds no per-room state, so several rooms' loops can share one.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="voice-pipeline", daemon=True)
+        self._thread.start()
+        self.http = self.run(self._open_session())
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+
+    def player(self, use_sonos=False, speaker=None, on_play=None):
+        return SonosPlayback(speaker, on_play) if use_sonos else LocalPlayback(on_play)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    def close(self):
+        try:
+            self.run(self.http.close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=2)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Jarvis Voice Mode")
     parser.add_argument("--sonos", action="store_true", help="Output audio on Sonos speaker instead of local speakers")
     parser.add_argument("--speaker", type=str, default=None, help="Target Sonos speaker room name")
     parser.add_argument("--stream", type=str, default=None, help="Address of audio stream server (format ip:port)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use the asyncio pipeline with barge-in")
+    parser.add_argument("--speculate", action="store_true", default=SPECULATE,
+                        help="Start the LLM on the partial transcript before the user has finished")
     args = parser.parse_args()
 
     use_sonos = args.sonos or bool(args.speaker)
@@ -514,7 +814,8 @@ if __name__ == "__main__":
         ip, port_str = args.stream.split(":")
         port = int(port_str)
         from jarvis_voice import voice_mode
-        voice_mode(use_sonos=use_sonos, speaker=args.speaker, stream_addr=f"{ip}:{port}")
+        voice_mode(use_sonos=use_sonos, speaker=args.speaker, stream_addr=f"{ip}:{port}", use_async=args.use_async,
+                   speculate=args.speculate)
     else:
         from jarvis_voice import voice_mode
-        voice_mode(use_sonos=use_sonos, speaker=args.speaker)
+        voice_mode(use_sonos=use_sonos, speaker=args.speaker, use_async=args.use_async, speculate=args.speculate)
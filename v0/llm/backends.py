@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import openai
+
+class AttrDict(dict):
+    """Dict with attribute access, shaped like the objects returned by openai 0.28."""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return AttrDict({k: _wrap(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+class OpenAIBackend:
+    def create(self, **kwargs):
+        return openai.ChatCompletion.create(**kwargs)
+
+class FakeLLMBackend:
+    """
+    Offline stand-in for openai.ChatCompletion.
+    Replies come from a scripted list (strings, or {"function_call": {...}} dicts);
+    once the script runs out it answers with a canned echo of the last user message.
+    Streaming splits replies into word-sized deltas and function-call arguments
+    into several fragments, like the real API does.
+    """
+    def __init__(self, responses=None, token_delay=0.0):
+        self.responses = list(responses or [])
+        self.token_delay = token_delay
+        self.calls = []
+
+    def _next_message(self, messages, functions):
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, dict):
+                function_call = dict(response["function_call"])
+                if not isinstance(function_call.get("arguments", ""), str):
+                    function_call["arguments"] = json.dumps(function_call["arguments"])
+                return {"role": "assistant", "content": None, "function_call": function_call}
+            return {"role": "assistant", "content": response}
+        last_user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        return {"role": "assistant", "content": f"Certainly, sir. You said: {last_user}"}
+
+    def create(self, model=None, messages=None, functions=None, function_call=None, stream=False, **kwargs):
+        self.calls.append({"model": model, "messages": list(messages or []), "functions": functions, "stream": stream})
+        message = self._next_message(messages or [], functions)
+        if stream:
+            return self._stream(message)
+        finish_reason = "function_call" if message.get("function_call") else "stop"
+        return _wrap({"choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]})
+
+    def _stream(self, message):
+        yield _wrap({"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
+        if message.get("function_call"):
+            name = message["function_call"]["name"]
+            arguments = message["function_call"].get("arguments", "")
+            yield _wrap({"choices": [{"index": 0, "delta": {"function_call": {"name": name, "arguments": ""}}, "finish_reason": None}]})
+            for i in range(0, len(arguments), 8):
+                time.sleep(self.token_delay)
+                yield _wrap({"choices": [{"index": 0, "delta": {"function_call": {"arguments": arguments[i:i + 8]}}, "finish_reason": None}]})
+            yield _wrap({"choices": [{"index": 0, "delta": {}, "finish_reason": "function_call"}]})
+            return
+        words = message["content"].split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.token_delay)
+            token = word if i == 0 else " " + word
+            yield _wrap({"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        yield _wrap({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+
+def get_llm_backend():
+    if os.getenv("JARVIS_LLM_BACKEND", "openai").lower() == "fake":
+        return FakeLLMBackend(token_delay=0.02)
+    return OpenAIBackend()
@@ -1,15 +1,17 @@
 import os
-import time
 import json
+import asyncio
+import threading
 import openai
 from dotenv import load_dotenv
+from llm.backends import get_llm_backend
+from llm.sessions import ConversationStore
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Global in-memory conversation store keyed by user/session id
-conversation_sessions = {}
-CONVERSATION_TTL = 10 * 60  # 10 minutes
+# Swap in the offline fake with JARVIS_LLM_BACKEND=fake.
+llm_backend = get_llm_backend()
 
 def load_style_examples():
     try:
@@ -22,145 +24,323 @@ def load_style_examples():
 
 STYLED_EXAMPLES = load_style_examples()
 
+SYSTEM_PROMPT = (
+    "You are Jarvis, a helpful AI assistant with a dry British accent, "
+    "inspired by the AI in the Iron Man movies. He's sometimes a little sarcastic and a little witty."
+    "He's also a little bit of a smartass, but generally is brief and to the point with his responses."
+    "Examples of how you speak:\n" + STYLED_EXAMPLES + "\n"
+)
+
+FUNCTION_CALL_SYSTEM_PROMPT = SYSTEM_PROMPT + (
+    "If the user's request is to perform an action (like opening the garage door), "
+    "call the corresponding function instead of replying with plain text."
+)
+
+FUNCTIONS = [
+    {
+        "name": "open_garage_door",
+        "description": "Opens the garage door.",
+        "parameters": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "get_tasks",
+        "description": "Retrieve a list of tasks or todos.",
+        "parameters": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "create_task",
+        "description": "Create a new task or todo with the provided description.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "task": {
+                    "type": "string",
+                    "description": "The description of the new task"
+                }
+            },
+            "required": ["task"]
+        },
+    },
+    {
+        "name": "mark_task_done",
+        "description": "Mark a task as done using a snippet of its description.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "task": {
+                    "type": "string",
+                    "description": "A snippet of the task description to mark as done."
+                }
+            },
+            "required": ["task"]
+        },
+    },
+]
+
+def summarize_history(previous_summary, messages):
+    """Fold trimmed turns into a short running summary of the conversation."""
+    transcript = "\n".join(
+        f"{m['role']}: {m.get('content')}" for m in messages if m.get("role") in ("user", "assistant", "function")
+    )
+    prompt = (
+        "Summarize this conversation between a user and Jarvis in at most three sentences, "
+        "keeping any facts, names, tasks or decisions the assistant may need later.\n"
+    )
+    if previous_summary:
+        prompt += f"Earlier summary: {previous_summary}\n"
+    response = llm_backend.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt + transcript}]
+    )
+    return response.choices[0].message.content.strip()
+
+# Bounded, thread-safe store keyed by user/session id. Set JARVIS_HISTORY_SUMMARIZE=1
+# to summarize trimmed turns instead of dropping them.
+conversation_store = ConversationStore(
+    summarizer=summarize_history if os.getenv("JARVIS_HISTORY_SUMMARIZE") == "1" else None
+)
+
+class TurnAbandoned(Exception):
+    """Raised inside a reply stream whose confirm() hook declined the turn; nothing was saved or run."""
+
+def _record_function_result(conversation, function_call):
+    from actions import dispatch_function_call
+    result = dispatch_function_call(function_call)
+    conversation.append({
+        "role": "function",
+        "name": function_call["name"],
+        "content": result
+    })
+    # Insert a hidden system update that instructs Jarvis to acknowledge the result.
+    conversation.append({
+        "role": "system",
+        "content": f"The action '{function_call['name']}' was executed successfully with result: {result}. Please ensure your final response reflects this."
+    })
+    return result
+
+def _fast_reply(conversation, user_text, confirm=None):
+    """
+    Run a command the local intent router is sure of and answer it from the
+    intent's template, with no LLM calls. Returns the reply (already added to
+    the conversation) or None to ask the LLM.
+    """
+    try:
+        from actions.intents import route_intent
+    except Exception:
+        # Without the actions (e.g. no database client) there is nothing to dispatch locally.
+        return None
+    routed = route_intent(user_text)
+    if routed is None:
+        return None
+    intent, function_call = routed
+    if confirm and not confirm():
+        raise TurnAbandoned(user_text)
+    print(f"[LOG] Fast path: {function_call}")
+    reply = intent.reply(_record_function_result(conversation, function_call))
+    conversation.append({"role": "assistant", "content": reply})
+    return reply
+
+def _stream_content(response):
+    """Yield content deltas from a streamed completion."""
+    for chunk in response:
+        content = chunk.choices[0].delta.get("content")
+        if content:
+            yield content
+
 def chat_with_jarvis_session(user_id: str, user_text: str) -> str:
     """
     Chat with Jarvis using OpenAI's GPT model.
     Returns the assistant's response as a string.
     """
-    system_prompt = (
-        "You are Jarvis, a helpful AI assistant with a dry British accent, "
-        "inspired by the AI in the Iron Man movies. He's sometimes a little sarcastic and a little witty."
-        "He's also a little bit of a smartass, but generally is brief and to the point with his responses."
-        "Examples of how you speak:\n" + STYLED_EXAMPLES + "\n"
-    )
-    
-    now = time.time()
-    session = conversation_sessions.get(user_id)
-    
-    if session and now - session["last_activity"] < CONVERSATION_TTL:
-        conversation = session["messages"]
-    else:
-        conversation = [{"role": "system", "content": system_prompt}]
-    
-    conversation.append({"role": "user", "content": user_text})
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=conversation
-    )
-    assistant_reply = response.choices[0].message.content.strip()
-    print(f"[LOG] Assistant Response: {assistant_reply}; No function call occurred.")
-    
-    conversation.append({"role": "assistant", "content": assistant_reply})
-    conversation_sessions[user_id] = {"messages": conversation, "last_activity": now}
-    
+    with conversation_store.session(user_id, SYSTEM_PROMPT) as conversation:
+        conversation.append({"role": "user", "content": user_text})
+
+        response = llm_backend.create(
+            model="gpt-4o-mini",
+            messages=conversation
+        )
+        assistant_reply = response.choices[0].message.content.strip()
+        print(f"[LOG] Assistant Response: {assistant_reply}; No function call occurred.")
+
+        conversation.append({"role": "assistant", "content": assistant_reply})
+
     return assistant_reply
 
+def chat_with_jarvis_session_stream(user_id: str, user_text: str):
+    """
+    Streaming variant of chat_with_jarvis_session.
+    Yields the reply as text deltas; the full reply is stored in the session once the stream ends.
+    """
+    with conversation_store.session(user_id, SYSTEM_PROMPT) as conversation:
+        conversation.append({"role": "user", "content": user_text})
+
+        response = llm_backend.create(
+            model="gpt-4o-mini",
+            messages=conversation,
+            stream=True
+        )
+        parts = []
+        for token in _stream_content(response):
+            parts.append(token)
+            yield token
+        assistant_reply = "".join(parts).strip()
+        print(f"[LOG] Assistant Response (streamed): {assistant_reply}; No function call occurred.")
+
+        conversation.append({"role": "assistant", "content": assistant_reply})
+
 def chat_with_jarvis_function_call(user_id: str, user_text: str) -> str:
     """
     Chat with Jarvis using GPT-4 function calling to execute commands.
+    Commands the local intent router recognises (see actions/intents.py) are
+    run and answered without calling the model.
     """
-    system_prompt = (
-        "You are Jarvis, a helpful AI assistant with a dry British accent, "
-        "inspired by the AI in the Iron Man movies. He's sometimes a little sarcastic and a little witty."
-        "He's also a little bit of a smartass, but generally is brief and to the point with his responses."
-        "Examples of how you speak:\n" + STYLED_EXAMPLES + "\n"
-        "If the user's request is to perform an action (like opening the garage door), "
-        "call the corresponding function instead of replying with plain text."
-    )
-    
-    now = time.time()
-    session = conversation_sessions.get(user_id)
-    if session and now - session["last_activity"] < CONVERSATION_TTL:
-        conversation = session["messages"]
-    else:
-        conversation = [{"role": "system", "content": system_prompt}]
-    
-    conversation.append({"role": "user", "content": user_text})
-    
-    functions = [
-        {
-            "name": "open_garage_door",
-            "description": "Opens the garage door.",
-            "parameters": {"type": "object", "properties": {}},
-        },
-        {
-            "name": "get_tasks",
-            "description": "Retrieve a list of tasks or todos.",
-            "parameters": {"type": "object", "properties": {}},
-        },
-        {
-            "name": "create_task",
-            "description": "Create a new task or todo with the provided description.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "task": {
-                        "type": "string",
-                        "description": "The description of the new task"
-                    }
-                },
-                "required": ["task"]
-            },
-        },
-        {
-            "name": "mark_task_done",
-            "description": "Mark a task as done using a snippet of its description.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "task": {
-                        "type": "string",
-                        "description": "A snippet of the task description to mark as done."
-                    }
-                },
-                "required": ["task"]
-            },
-        },
-    ]
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=conversation,
-        functions=functions,
-        function_call="auto"
-    )
-    
-    message = response.choices[0].message
-    
-    if message.get("function_call"):
-        print(f"[LOG] Function call requested: {message['function_call']}")
-        from actions import dispatch_function_call
-        result = dispatch_function_call(message["function_call"])
-        conversation.append({
-            "role": "function",
-            "name": message["function_call"]["name"],
-            "content": result
-        })
-        # Insert a hidden system update that instructs Jarvis to acknowledge the result.
-        conversation.append({
-            "role": "system",
-            "content": f"The action '{message['function_call']['name']}' was executed successfully with result: {result}. Please ensure your final response reflects this."
-        })
-        second_response = openai.ChatCompletion.create(
+    with conversation_store.session(user_id, FUNCTION_CALL_SYSTEM_PROMPT) as conversation:
+        conversation.append({"role": "user", "content": user_text})
+        fast_reply = _fast_reply(conversation, user_text)
+        if fast_reply is not None:
+            return fast_reply
+
+        response = llm_backend.create(
             model="gpt-4o-mini",
-            messages=conversation
+            messages=conversation,
+            functions=FUNCTIONS,
+            function_call="auto"
         )
-        final_message = second_response.choices[0].message.content.strip()
-        conversation.append({"role": "assistant", "content": final_message})
-        print(f"[LOG] Final Response after function call: {final_message}")
-    else:
-        final_message = message.content.strip()
-        conversation.append({"role": "assistant", "content": final_message})
-        print(f"[LOG] Assistant Response (plain text): {final_message}")
-    
-    conversation_sessions[user_id] = {"messages": conversation, "last_activity": now}
+
+        message = response.choices[0].message
+
+        if message.get("function_call"):
+            print(f"[LOG] Function call requested: {message['function_call']}")
+            _record_function_result(conversation, message["function_call"])
+            second_response = llm_backend.create(
+                model="gpt-4o-mini",
+                messages=conversation
+            )
+            final_message = second_response.choices[0].message.content.strip()
+            conversation.append({"role": "assistant", "content": final_message})
+            print(f"[LOG] Final Response after function call: {final_message}")
+        else:
+            final_message = message.content.strip()
+            conversation.append({"role": "assistant", "content": final_message})
+            print(f"[LOG] Assistant Response (plain text): {final_message}")
+
     return final_message
 
+def chat_with_jarvis_function_call_stream(user_id: str, user_text: str, confirm=None):
+    """
+    Streaming variant of chat_with_jarvis_function_call.
+    Plain replies are yielded token by token. If the model calls a function, its
+    name and argument fragments are accumulated until the stream finishes, the
+    function is dispatched, and the follow-up reply is streamed instead.
+    confirm(), if given, is called before the turn has any effect (before a
+    function is dispatched and before the reply is saved); if it returns False
+    the turn is dropped and TurnAbandoned raised.
+    """
+    with conversation_store.session(user_id, FUNCTION_CALL_SYSTEM_PROMPT) as conversation:
+        conversation.append({"role": "user", "content": user_text})
+        fast_reply = _fast_reply(conversation, user_text, confirm)
+        if fast_reply is not None:
+            yield fast_reply
+            return
+
+        response = llm_backend.create(
+            model="gpt-4o-mini",
+            messages=conversation,
+            functions=FUNCTIONS,
+            function_call="auto",
+            stream=True
+        )
+        function_call = None
+        parts = []
+        for chunk in response:
+            delta = chunk.choices[0].delta
+            if delta.get("function_call"):
+                if function_call is None:
+                    function_call = {"name": "", "arguments": ""}
+                function_call["name"] += delta["function_call"].get("name") or ""
+                function_call["arguments"] += delta["function_call"].get("arguments") or ""
+            elif delta.get("content"):
+                parts.append(delta["content"])
+                yield delta["content"]
+
+        if function_call:
+            print(f"[LOG] Function call requested: {function_call}")
+            if confirm and not confirm():
+                raise TurnAbandoned(user_text)
+            _record_function_result(conversation, function_call)
+            second_response = llm_backend.create(
+                model="gpt-4o-mini",
+                messages=conversation,
+                stream=True
+            )
+            parts = []
+            for token in _stream_content(second_response):
+                parts.append(token)
+                yield token
+            final_message = "".join(parts).strip()
+            print(f"[LOG] Final Response after function call (streamed): {final_message}")
+        else:
+            final_message = "".join(parts).strip()
+            print(f"[LOG] Assistant Response (streamed): {final_message}")
+        if confirm and not confirm():
+            raise TurnAbandoned(user_text)
+        conversation.append({"role": "assistant", "content": final_message})
+
+async def aiter_stream(stream):
+    """
+    Adapt one of the blocking token generators above into an async iterator.
+    Each stream is driven by its own thread, so any number of rooms can wait
+    on the LLM (or a session lock) at once without the event loop blocking.
+    If the consumer stops early (or is cancelled) the generator is closed as
+    soon as any in-flight next() returns, which releases the conversation
+    lock without saving the abandoned turn.
+    """
+    loop = asyncio.get_running_loop()
+    tokens = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(tokens.put_nowait, item)
+        except RuntimeError:
+            # The loop closed under us; nobody is listening any more.
+            stopped.set()
+
+    def pump():
+        iterator = iter(stream)
+        try:
+            for token in iterator:
+                if stopped.is_set():
+                    break
+                put((token, None))
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=pump, name="llm-stream", daemon=True).start()
+    try:
+        while True:
+            token, error = await tokens.get()
+            if error is not None:
+                raise error
+            if token is done:
+                break
+            yield token
+    finally:
+        stopped.set()
+
 if __name__ == "__main__":
     user_id = "default_user"
     test_prompt = "Hello Jarvis, how are you today?"
     response_text = chat_with_jarvis_session(user_id, test_prompt)
     print(f"User: {test_prompt}")
     print(f"Jarvis: {response_text}")
-
+    print("Jarvis (streamed): ", end="", flush=True)
+    for token in chat_with_jarvis_session_stream(user_id, "And what's on the agenda?"):
+        print(token, end="", flush=True)
+    print()
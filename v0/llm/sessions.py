@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+CONVERSATION_TTL = 10 * 60  # 10 minutes
+MAX_SESSIONS = int(os.getenv("JARVIS_MAX_SESSIONS", "100"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("JARVIS_HISTORY_TOKEN_BUDGET", "4000"))
+SWEEP_INTERVAL = 60
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+def estimate_tokens(message: dict) -> int:
+    content = str(message.get("content") or "")
+    # Roughly 4 characters per token when tiktoken isn't installed, plus per-message overhead.
+    count = len(_encoding.encode(content)) if _encoding else len(content) // 4 + 1
+    return count + 4
+
+def _split_turns(messages):
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+class ConversationStore:
+    """
+    Thread-safe, bounded conversation store.
+    Sessions expire after ttl seconds of inactivity, the least recently used
+    sessions are dropped beyond max_sessions, and each session's history is
+    trimmed to a token budget so prompt size stays flat over long conversations.
+    If a summarizer is given, trimmed turns are folded into a running summary
+    instead of being forgotten.
+    """
+    SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+    def __init__(self, ttl=CONVERSATION_TTL, max_sessions=MAX_SESSIONS,
+                 token_budget=HISTORY_TOKEN_BUDGET, summarizer=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self._sessions = OrderedDict()
+        # user_id -> [lock, number of callers holding or waiting for it]
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    @contextmanager
+    def _user_lock(self, user_id):
+        """
+        Serialize one user's exchanges. The lock is reference counted under the
+        store lock and only forgotten once nobody holds or waits for it, so a
+        user can never end up with two locks at once.
+        """
+        with self._lock:
+            entry = self._user_locks.setdefault(user_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and user_id not in self._sessions:
+                    self._user_locks.pop(user_id, None)
+
+    def _drop(self, user_id):
+        # Called with self._lock held.
+        self._sessions.pop(user_id, None)
+        entry = self._user_locks.get(user_id)
+        if entry and entry[1] == 0:
+            del self._user_locks[user_id]
+
+    def sweep(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            for user_id, session in list(self._sessions.items()):
+                if now - session["last_activity"] >= self.ttl:
+                    self._drop(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+            self._last_sweep = now
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep(now)
+
+    def load(self, user_id, system_prompt, now=None):
+        """Return a copy of the live conversation, or a fresh one seeded with system_prompt."""
+        now = now or time.time()
+        self._maybe_sweep(now)
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session and now - session["last_activity"] < self.ttl:
+                return list(session["messages"])
+        return [{"role": "system", "content": system_prompt}]
+
+    def save(self, user_id, messages, now=None):
+        now = now or time.time()
+        messages = self.compact(messages)
+        with self._lock:
+            self._sessions[user_id] = {"messages": messages, "last_activity": now}
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+
+    @contextmanager
+    def session(self, user_id, system_prompt):
+        """
+        Hold a user's conversation for the duration of one exchange.
+        Concurrent requests for the same user are serialized; the history is
+        written back (and compacted) only if the block completes without error.
+        """
+        with self._user_lock(user_id):
+            now = time.time()
+            messages = self.load(user_id, system_prompt, now)
+            yield messages
+            self.save(user_id, messages, now)
+
+    def get_messages(self, user_id):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            return list(session["messages"]) if session else []
+
+    def clear(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def compact(self, messages):
+        """
+        Trim the oldest turns until the history fits the token budget.
+        Trimming goes down to three quarters of the budget so it (and any
+        summarization call) happens once every few turns rather than on each one.
+        """
+        if sum(estimate_tokens(m) for m in messages) <= self.token_budget:
+            return messages
+        head = [messages[0]] if messages and messages[0].get("role") == "system" else []
+        rest = messages[len(head):]
+        summary = None
+        if rest and rest[0].get("role") == "system" and str(rest[0].get("content", "")).startswith(self.SUMMARY_PREFIX):
+            summary = rest[0]["content"][len(self.SUMMARY_PREFIX):]
+            rest = rest[1:]
+        turns = _split_turns(rest)
+        target = self.token_budget * 3 // 4
+        fixed = sum(estimate_tokens(m) for m in head) + (estimate_tokens({"content": summary}) if summary else 0)
+        dropped = []
+        # Always keep the latest turn, even if it alone exceeds the budget.
+        while len(turns) > 1 and fixed + sum(estimate_tokens(m) for turn in turns for m in turn) > target:
+            dropped.extend(turns.pop(0))
+        if dropped and self.summarizer:
+            try:
+                summary = self.summarizer(summary, dropped)
+            except Exception as e:
+                print("Error summarizing conversation history:", e)
+        compacted = list(head)
+        if summary:
+            compacted.append({"role": "system", "content": self.SUMMARY_PREFIX + summary})
+        for turn in turns:
+            compacted.extend(turn)
+        return compacted
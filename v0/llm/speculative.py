@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import threading
+from llm.chat import chat_with_jarvis_function_call_stream, TurnAbandoned
+
+# Opt in to starting the LLM on the partial transcript before the user has finished.
+SPECULATE = os.getenv("JARVIS_SPECULATE", "0") == "1"
+# Non-speech after which the end of the utterance is likely enough to guess at (VAD_END_MS closes it).
+SPECULATE_AFTER_MS = float(os.getenv("JARVIS_SPECULATE_AFTER_MS", "150"))
+
+def normalize(text):
+    """Lowercase words only, so punctuation and casing differences between decodes don't count."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+class SpeculativeReply:
+    """
+    Jarvis's reply to a guess at what the user said, requested before the
+    final transcript is in. The LLM stream runs on its own thread into a
+    buffer. Nothing takes effect until confirm(): a function the model asks
+    for waits for it, and so does saving the turn to the conversation. If
+    the guess turns out wrong, cancel() drops the turn without running or
+    saving anything, releasing the conversation for the real request.
+    """
+    def __init__(self, session_id, text, stream=chat_with_jarvis_function_call_stream):
+        self.session_id = session_id
+        self.text = text
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.confirmed_at = None
+        self._tokens = []
+        self._finished = False
+        self._error = None
+        self._confirmed = False
+        self._abandoned = False
+        self._cond = threading.Condition()
+        self._stream = stream
+        self._thread = threading.Thread(target=self._run, name="llm-speculative", daemon=True)
+        self._thread.start()
+
+    def _gate(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._confirmed or self._abandoned)
+            return not self._abandoned
+
+    def _run(self):
+        stream = self._stream(self.session_id, self.text, confirm=self._gate)
+        try:
+            for token in stream:
+                with self._cond:
+                    if self._abandoned:
+                        break
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                    self._tokens.append(token)
+                    self._cond.notify_all()
+        except TurnAbandoned:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            # Closing mid-stream drops the turn without saving it.
+            stream.close()
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def matches(self, text):
+        return bool(normalize(text)) and normalize(text) == normalize(self.text)
+
+    def confirm(self):
+        """The final transcript matched: let the turn take effect."""
+        with self._cond:
+            self._confirmed = True
+            self.confirmed_at = time.perf_counter()
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self._abandoned = True
+            self._cond.notify_all()
+
+    @property
+    def saved_ms(self):
+        """
+        Time to first token saved by starting early: the head start, or the
+        whole time to first token if that arrived before confirm().
+        """
+        if self.confirmed_at is None:
+            return 0.0
+        head_start = self.confirmed_at - self.started
+        if self.first_token_at is not None:
+            head_start = min(head_start, self.first_token_at - self.started)
+        return head_start * 1000
+
+    def tokens(self):
+        """The reply token by token, buffered ones first; closing this early abandons the turn."""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: index < len(self._tokens) or self._finished)
+                    if index < len(self._tokens):
+                        token = self._tokens[index]
+                    elif self._error:
+                        raise self._error
+                    else:
+                        return
+                index += 1
+                yield token
+        finally:
+            if not self._finished:
+                self.cancel()
+
+class SpeculationStats:
+    """Running hit rate and time saved for one voice loop's speculative replies."""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def record(self, speculation, hit):
+        if hit:
+            self.hits += 1
+            self.saved_ms += speculation.saved_ms
+        else:
+            self.misses += 1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return (f"hit rate {self.hits}/{self.hits + self.misses} ({self.hit_rate:.0%}), "
+                f"{self.saved_ms:.0f} ms saved in total")
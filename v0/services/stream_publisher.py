@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import sys
+import os
+import argparse
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pyaudio
+from audio.protocol import StreamFormat, connect_publisher, encode_frame
+
+def publish_microphone(addr, rate=16000, frames_per_buffer=512, device_index=None):
+    """
+    Capture the local microphone and publish it to the stream server using the
+    framed protocol. Publishing at 16 kHz lets voice_mode subscribers feed the
+    wake-word engine without resampling.
+    """
+    fmt = StreamFormat(rate=rate)
+    pa = pyaudio.PyAudio()
+    mic = pa.open(
+        rate=rate,
+        channels=fmt.channels,
+        format=pyaudio.paInt16,
+        input=True,
+        frames_per_buffer=frames_per_buffer,
+        input_device_index=device_index
+    )
+    sock = connect_publisher(addr)
+    print(f"Publishing microphone to {addr} as {fmt}")
+    sequence = 0
+    try:
+        while True:
+            data = mic.read(frames_per_buffer, exception_on_overflow=False)
+            sock.sendall(encode_frame(fmt, sequence, data))
+            sequence += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        mic.stop_stream()
+        mic.close()
+        pa.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish the microphone to the Jarvis stream server")
+    parser.add_argument("addr", help="Address of audio stream server (format ip:port)")
+    parser.add_argument("--rate", type=int, default=16000, help="Sample rate to capture and publish")
+    parser.add_argument("--device", type=int, default=None, help="Input device index")
+    args = parser.parse_args()
+    publish_microphone(args.addr, rate=args.rate, device_index=args.device)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Score the voice activity detector against labelled recordings.
+
+Each clip.wav needs a clip.txt next to it in Audacity's label format
+(one "start<TAB>end<TAB>label" line per stretch of speech, in seconds).
+For every clip this reports frame-level precision/recall and, per labelled
+utterance, how long after the speech really ended the endpointer closed it
+(negative means it cut the speaker off), next to the old RMS-threshold rule
+voice_mode used before. --synthetic runs on a generated noisy clip instead.
+
+    python services/vad_harness.py recordings/*.wav --engine energy --end-ms 300
+"""
+import sys
+import os
+import argparse
+import wave
+from collections import deque
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from audio.vad import Endpointer, get_vad
+
+FRAME_SECONDS = 0.032
+
+def load_clip(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV is supported")
+        rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        if wf.getnchannels() > 1:
+            samples = samples.reshape(-1, wf.getnchannels())[:, 0].copy()
+    labels = []
+    label_path = os.path.splitext(path)[0] + ".txt"
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split("\t")
+            if len(parts) >= 2:
+                labels.append((float(parts[0]), float(parts[1])))
+    return samples, rate, sorted(labels)
+
+def synthetic_clip(rate=16000, seconds=20, seed=1):
+    """Fan-like noise with voiced, syllable-modulated bursts standing in for speech."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(rate * seconds) / rate
+    noise = np.convolve(rng.normal(0, 1, len(t)), np.ones(8) / 8, mode="same") * 300
+    signal = noise.copy()
+    labels = [(2.0, 4.1), (6.5, 7.3), (10.0, 13.2), (16.0, 17.5)]
+    for start, end in labels:
+        mask = (t >= start) & (t < end)
+        tt = t[mask] - start
+        pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * tt)
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4.0 * tt) ** 2
+        signal[mask] += 3000 * voiced * syllables
+    return np.clip(signal, -32768, 32767).astype(np.int16), rate, labels
+
+class LegacyEndpointer:
+    """The RMS rule voice_mode used before the VAD: fixed threshold, then 1 s window below 40% of peak."""
+    def __init__(self, rate, frame_duration, silence_threshold=20, silence_ratio=0.4, silence_duration=1.0, min_input_duration=0.5):
+        self.threshold = silence_threshold * (rate / 16000)
+        self.ratio = silence_ratio
+        self.window = deque(maxlen=int(silence_duration / frame_duration) or 1)
+        self.min_frames = int(min_input_duration / frame_duration)
+        self.started = False
+        self.frames = 0
+        self.max_amp = 0.0
+
+    def update(self, frame):
+        rms = np.sqrt(np.mean(frame.astype(np.float32) ** 2))
+        if not self.started:
+            if rms >= self.threshold:
+                self.started, self.max_amp = True, rms
+                return "start"
+            return None
+        self.frames += 1
+        self.max_amp = max(self.max_amp, rms)
+        if self.frames >= self.min_frames:
+            self.window.append(rms)
+            if len(self.window) == self.window.maxlen and np.mean(self.window) < self.max_amp * self.ratio:
+                return "end"
+        return None
+
+def run_endpointer(frames, frame_duration, make_endpointer, decide):
+    """Run an endpointer over the whole clip, restarting after each end; returns [(start, end)] in seconds."""
+    utterances, endpointer, start = [], make_endpointer(), None
+    for i, frame in enumerate(frames):
+        event = endpointer.update(decide(frame))
+        if event == "start":
+            start = i * frame_duration
+        elif event == "end":
+            utterances.append((start, (i + 1) * frame_duration))
+            endpointer, start = make_endpointer(), None
+    if start is not None:
+        utterances.append((start, len(frames) * frame_duration))
+    return utterances
+
+def end_latencies(labels, utterances):
+    """For each labelled utterance, detected end minus true end (None if never closed on it)."""
+    latencies = []
+    for label_start, label_end in labels:
+        ends = [end for start, end in utterances if start is not None and start < label_end and end > label_start]
+        latencies.append(ends[-1] - label_end if ends else None)
+    return latencies
+
+def score_clip(name, samples, rate, labels, engine, end_ms):
+    frame_length = int(round(FRAME_SECONDS * rate))
+    frame_duration = frame_length / rate
+    frames = [samples[i:i + frame_length] for i in range(0, len(samples) - frame_length + 1, frame_length)]
+    truth = np.zeros(len(frames), dtype=bool)
+    for start, end in labels:
+        truth[int(start / frame_duration):int(np.ceil(end / frame_duration))] = True
+
+    vad = get_vad(rate, engine)
+    decisions = np.array([vad.is_speech(frame) for frame in frames])
+    true_positive = np.sum(decisions & truth)
+    precision = true_positive / max(1, decisions.sum())
+    recall = true_positive / max(1, truth.sum())
+
+    vad = get_vad(rate, engine)
+    vad_utterances = run_endpointer(frames, frame_duration, lambda: Endpointer(frame_duration, end_ms=end_ms), vad.is_speech)
+    legacy_utterances = run_endpointer(frames, frame_duration, lambda: LegacyEndpointer(rate, frame_duration), lambda frame: frame)
+
+    print(f"{name}: {len(labels)} utterances, frame precision {precision:.2f}, recall {recall:.2f}")
+    for (start, end), new, old in zip(labels, end_latencies(labels, vad_utterances), end_latencies(labels, legacy_utterances)):
+        fmt = lambda value: "missed" if value is None else f"{value * 1000:+6.0f} ms"
+        print(f"  {start:6.2f}-{end:6.2f}s  end latency: VAD {fmt(new)}   legacy RMS {fmt(old)}")
+    return [value for value in end_latencies(labels, vad_utterances) if value is not None]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the VAD against labelled WAV files")
+    parser.add_argument("clips", nargs="*", help="16-bit WAV files with Audacity label files alongside")
+    parser.add_argument("--engine", default=None, help="VAD engine (energy or webrtc); defaults to JARVIS_VAD")
+    parser.add_argument("--end-ms", type=float, default=300, help="Trailing silence that closes an utterance")
+    parser.add_argument("--synthetic", action="store_true", help="Score a generated noisy clip")
+    args = parser.parse_args()
+
+    latencies = []
+    if args.synthetic or not args.clips:
+        latencies += score_clip("synthetic", *synthetic_clip(), args.engine, args.end_ms)
+    for path in args.clips:
+        latencies += score_clip(os.path.basename(path), *load_clip(path), args.engine, args.end_ms)
+    if latencies:
+        latencies = np.array(latencies) * 1000
+        print(f"VAD end latency: median {np.median(latencies):.0f} ms, worst {latencies.max():.0f} ms, "
+              f"early cut-offs {np.sum(latencies < 0)}")
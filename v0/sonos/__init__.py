@@ -1,2 +1,4 @@
-from .speakers import find_sonos_speakers, play_on_sonos
-from .cache import load_sonos_cache, save_sonos_cache
\ No newline at end of file
+from .speakers import find_sonos_speakers, play_on_sonos, play_sequence_on_sonos
+from .cache import load_sonos_cache, save_sonos_cache
+from .registry import speaker_registry
+from .broadcast import broadcast_on_sonos, broadcast_sequence_on_sonos, resolve_rooms
\ No newline at end of file
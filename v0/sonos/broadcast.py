@@ -0,0 +1,173 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from .registry import speaker_registry
+from .speakers import (
+    audio_url, _audio_ready, _snapshot_speaker, _restore_speaker, _play_on_speaker, _play_sequence_on_speaker,
+    _wait_until_stopped, _audio_duration, speakers_locked,
+)
+
+def resolve_rooms(rooms):
+    """
+    Turn "all", a comma-separated string or a list of room names into a list of
+    room names with one entry per physical speaker (sonos_cache.json has aliases
+    such as "Zoey" and "Zoey's room" pointing at the same IP).
+    """
+    known = speaker_registry.rooms()
+    if rooms is None or rooms == "all":
+        names = list(known)
+    elif isinstance(rooms, str):
+        names = [room.strip() for room in rooms.split(",") if room.strip()]
+    else:
+        names = list(rooms)
+    resolved, seen_ips = [], set()
+    for name in names:
+        ip = known.get(name)
+        if not ip:
+            print(f"Skipping unknown room: {name}")
+            continue
+        if ip not in seen_ips:
+            seen_ips.add(ip)
+            resolved.append(name)
+    return resolved
+
+def _coordinator_for(room):
+    speaker = speaker_registry.get(room)
+    try:
+        return room, speaker, speaker.group.coordinator
+    except Exception as e:
+        print(f"Could not read group for {room}, using it directly: {e}")
+        return room, speaker, speaker
+
+def broadcast_on_sonos(audio_file_path: str, rooms="all", group=False):
+    """
+    Announce one audio file in several rooms at once.
+    By default each target (collapsed to its current group coordinator, since
+    only coordinators accept queue commands) runs its own snapshot/play/restore
+    cycle concurrently. With group=True the rooms are temporarily joined into
+    one group so playback is sample-synchronized, then unjoined and restored.
+    Returns a dict of room -> "ok" or the error message.
+    """
+    room_names = resolve_rooms(rooms)
+    if not room_names:
+        raise Exception(f"No Sonos speakers found for rooms: {rooms}")
+
+    if not _audio_ready(audio_file_path):
+        return {}
+    sonos_url = audio_url(audio_file_path)
+    duration = _audio_duration([audio_file_path])
+
+    with ThreadPoolExecutor(max_workers=len(room_names)) as pool:
+        targets = list(pool.map(_coordinator_for, room_names))
+        if group:
+            return _broadcast_grouped(pool, targets, sonos_url, duration)
+
+        # One playback per group coordinator; rooms already grouped together hear it once.
+        by_coordinator = {}
+        for room, speaker, coordinator in targets:
+            by_coordinator.setdefault(coordinator.ip_address, (room, coordinator))
+        print(f"Broadcasting to {', '.join(room for room, _ in by_coordinator.values())}")
+        futures = {
+            room: pool.submit(_play_on_speaker, coordinator, sonos_url, duration, room)
+            for room, coordinator in by_coordinator.values()
+        }
+        results = {}
+        for room, future in futures.items():
+            try:
+                future.result()
+                results[room] = "ok"
+            except Exception as e:
+                results[room] = str(e)
+    return results
+
+def broadcast_sequence_on_sonos(audio_files, rooms="all"):
+    """
+    play_sequence_on_sonos for several rooms at once. Each group coordinator
+    runs its own snapshot/play/restore on a worker thread and is handed every
+    file as audio_files yields it, so a streamed reply starts in every room
+    with its first sentence. Returns a dict of room -> "ok" or the error message.
+    """
+    room_names = resolve_rooms(rooms)
+    if not room_names:
+        raise Exception(f"No Sonos speakers found for rooms: {rooms}")
+    files = iter(audio_files)
+    first_file = next(files, None)
+    if first_file is None or not _audio_ready(first_file):
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(room_names)) as pool:
+        by_coordinator = {}
+        for room, speaker, coordinator in pool.map(_coordinator_for, room_names):
+            by_coordinator.setdefault(coordinator.ip_address, (room, coordinator))
+        print(f"Streaming to {', '.join(room for room, _ in by_coordinator.values())}")
+        queues = {room: queue.Queue() for room, _ in by_coordinator.values()}
+        futures = {
+            room: pool.submit(_play_sequence_on_speaker, coordinator, first_file, _queued(queues[room]), room)
+            for room, coordinator in by_coordinator.values()
+        }
+        try:
+            for filename in files:
+                for files_queue in queues.values():
+                    files_queue.put(filename)
+        finally:
+            for files_queue in queues.values():
+                files_queue.put(None)
+        results = {}
+        for room, future in futures.items():
+            try:
+                future.result()
+                results[room] = "ok"
+            except Exception as e:
+                results[room] = str(e)
+    return results
+
+def _queued(files_queue):
+    while True:
+        filename = files_queue.get()
+        if filename is None:
+            return
+        yield filename
+
+def _broadcast_grouped(pool, targets, sonos_url, duration):
+    speakers = [speaker for _, speaker, _ in targets]
+    original_coordinators = {speaker.ip_address: coordinator for _, speaker, coordinator in targets}
+    leader = speakers[0]
+    members = speakers[1:]
+    with speakers_locked(*speakers):
+        saved_states = list(pool.map(_snapshot_speaker, speakers))
+        results = {}
+        try:
+            if original_coordinators[leader.ip_address].ip_address != leader.ip_address:
+                leader.unjoin()
+            list(pool.map(lambda member: member.join(leader), members))
+            volume = os.getenv("JARVIS_VOLUME")
+            list(pool.map(lambda speaker: setattr(speaker, "volume", volume), speakers))
+            print(f"Broadcasting to group led by {targets[0][0]}")
+            queue_index = leader.add_uri_to_queue(sonos_url)
+            leader.play_from_queue(queue_index - 1)
+            _wait_until_stopped(leader, duration)
+            results = {room: "ok" for room, _, _ in targets}
+        except Exception as e:
+            print(f"Error broadcasting on Sonos: {e}")
+            results = {room: str(e) for room, _, _ in targets}
+        finally:
+            list(pool.map(_unjoin, members))
+            list(pool.map(
+                lambda item: _restore_speaker(item[0], *item[1], clear_queue=item[0] is leader),
+                zip(speakers, saved_states)
+            ))
+            # Put speakers back into the groups they were in before the announcement.
+            for speaker in speakers:
+                coordinator = original_coordinators[speaker.ip_address]
+                if coordinator.ip_address != speaker.ip_address:
+                    try:
+                        speaker.join(coordinator)
+                    except Exception as e:
+                        print(f"Error rejoining {speaker.ip_address} to its group: {e}")
+    return results
+
+def _unjoin(speaker):
+    try:
+        speaker.unjoin()
+    except Exception as e:
+        print(f"Error unjoining {speaker.ip_address}: {e}")
@@ -0,0 +1,118 @@
+import os
+import threading
+import soco
+from .cache import load_sonos_cache, save_sonos_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+DEFAULT_SONOS_SPEAKER_IP = os.getenv("SONOS_SPEAKER_IP")
+HEALTH_CHECK_INTERVAL = float(os.getenv("JARVIS_SONOS_HEALTH_INTERVAL", "60"))
+
+class SpeakerRegistry:
+    """
+    Long-lived map of room name -> warm SoCo object.
+    sonos_cache.json is read once at startup and written back only when the
+    room list changes. A background thread probes each speaker periodically,
+    so playback can use the speaker straight away instead of paying a
+    player_name round trip on every call.
+    """
+    def __init__(self, health_interval=HEALTH_CHECK_INTERVAL):
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._rooms = None  # room name -> ip
+        self._speakers = {}  # ip -> SoCo
+        self._healthy = {}  # ip -> bool
+        self._health_thread = None
+        self._stop = threading.Event()
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._rooms is None:
+                self._rooms = dict(load_sonos_cache())
+                for ip in set(self._rooms.values()):
+                    self._speakers[ip] = soco.SoCo(ip)
+                    self._healthy[ip] = True
+        self.start_health_checks()
+
+    def _probe(self, ip):
+        try:
+            _ = self._speakers[ip].player_name  # Verify connectivity
+            self._healthy[ip] = True
+        except Exception as e:
+            print(f"Sonos speaker at {ip} is not responding: {e}")
+            self._healthy[ip] = False
+        return self._healthy[ip]
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            with self._lock:
+                ips = list(self._speakers)
+            for ip in ips:
+                self._probe(ip)
+
+    def start_health_checks(self):
+        if self._health_thread is None and self.health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def add(self, room_name, ip):
+        """Register a speaker and write the change back to sonos_cache.json."""
+        self._ensure_loaded()
+        with self._lock:
+            changed = self._rooms.get(room_name) != ip
+            self._rooms[room_name] = ip
+            if ip not in self._speakers:
+                self._speakers[ip] = soco.SoCo(ip)
+            self._healthy[ip] = True
+            if changed:
+                save_sonos_cache(self._rooms)
+
+    def rooms(self):
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._rooms)
+
+    def get(self, room_name=None):
+        self._ensure_loaded()
+        if room_name:
+            ip = self._rooms.get(room_name)
+            if not ip:
+                raise ValueError(f"No IP found for room: {room_name}")
+            # Only pay for a probe if the background check saw the speaker go away.
+            if not self._healthy.get(ip) and not self._probe(ip):
+                raise Exception(f"Failed to connect to Sonos speaker {room_name} at {ip}")
+            return self._speakers[ip]
+        # If no room_name provided, use the first healthy speaker.
+        for ip in self.rooms().values():
+            if self._healthy.get(ip) or self._probe(ip):
+                return self._speakers[ip]
+        # Attempt discovery
+        discovered = self.refresh()
+        if discovered:
+            return discovered[0]
+        # Fallback to default IP
+        if DEFAULT_SONOS_SPEAKER_IP:
+            try:
+                speaker = soco.SoCo(DEFAULT_SONOS_SPEAKER_IP)
+                self.add(speaker.player_name, DEFAULT_SONOS_SPEAKER_IP)
+                return self._speakers[DEFAULT_SONOS_SPEAKER_IP]
+            except Exception as e:
+                print(f"Failed to connect to default Sonos speaker at {DEFAULT_SONOS_SPEAKER_IP}: {e}")
+        raise Exception("No Sonos speakers available.")
+
+    def refresh(self, timeout=10):
+        """Run discovery, register every speaker found and return them."""
+        found = []
+        for speaker in soco.discover(timeout=timeout) or []:
+            try:
+                print(f"Discovered Speaker: {speaker.player_name}, IP: {speaker.ip_address}")
+                self.add(speaker.player_name, speaker.ip_address)
+                found.append(self._speakers[speaker.ip_address])
+            except Exception as e:
+                print(f"Failed to process discovered speaker at {speaker.ip_address}: {e}")
+        return found
+
+speaker_registry = SpeakerRegistry()
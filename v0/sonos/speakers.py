@@ -1,144 +1,254 @@
 import os
 import json
 import time
+import queue
+import threading
+from contextlib import ExitStack, contextmanager
 import soco
 from soco.snapshot import Snapshot
 
 import requests
-from .cache import load_sonos_cache, save_sonos_cache
+from .registry import speaker_registry
 from utilities import get_local_ip  # Changed from relative import
-from dotenv import load_dotenv
+from utilities.audio import estimate_audio_duration
+from config import BASE_DIR
 
-load_dotenv()
-DEFAULT_SONOS_SPEAKER_IP = os.getenv("SONOS_SPEAKER_IP")
+AUDIO_SERVER_PORT = 8009
+# How long a successful audio server check is trusted before asking again.
+SERVER_CHECK_INTERVAL = 30.0
+
+# Pooled connections for talking to the local audio server.
+_http = requests.Session()
+_server_checked_at = 0.0
+
+# Used when a clip's length can't be read from the file.
+DEFAULT_CLIP_DURATION = 10.0
+EVENT_TIMEOUT_MARGIN = 2.0
+MAX_POLL_TIME = 60.0
+
+# One lock per speaker IP, held from snapshot to restore, so two playbacks on the same
+# speaker (an activation chime and the reply after it) never interleave.
+_speaker_locks = {}
+_speaker_locks_guard = threading.Lock()
 
 def get_sonos_speaker(room_name=None):
-    cache = load_sonos_cache()
-    if room_name:
-        ip = cache.get(room_name)
-        if not ip:
-            raise ValueError(f"No IP found for room: {room_name}")
+    return speaker_registry.get(room_name)
+
+@contextmanager
+def speakers_locked(*speakers):
+    """Hold the playback lock of every given speaker, taken in IP order so callers can't deadlock."""
+    with _speaker_locks_guard:
+        locks = [_speaker_locks.setdefault(ip, threading.Lock())
+                 for ip in sorted({speaker.ip_address for speaker in speakers})]
+    with ExitStack() as stack:
+        for lock in locks:
+            stack.enter_context(lock)
+        yield
+
+def _snapshot_speaker(speaker):
+    # Capture current volume and speaker state.
+    orig_volume = speaker.volume
+    orig_state = speaker.get_current_transport_info()['current_transport_state']
+    snap = Snapshot(speaker)
+    snap.snapshot()
+    return snap, orig_volume, orig_state
+
+def _restore_speaker(speaker, snap, orig_volume, orig_state, clear_queue=True):
+    if clear_queue:
         try:
-            speaker = soco.SoCo(ip)
-            _ = speaker.player_name  # Verify connectivity
-            return speaker
+            print("Clearing TTS message from queue")
+            speaker.clear_queue()
         except Exception as e:
-            print(f"Failed to connect to Sonos speaker {room_name} at {ip}: {e}")
-            # Optionally, remove from cache
-            del cache[room_name]
-            save_sonos_cache(cache)
-            raise
-    else:
-        # If no room_name provided, connect to default or first available speaker
-        if cache:
-            room_name, ip = next(iter(cache.items()))
-            try:
-                speaker = soco.SoCo(ip)
-                _ = speaker.player_name
-                return speaker
-            except Exception as e:
-                print(f"Failed to connect to Sonos speaker {room_name} at {ip}: {e}")
-                del cache[room_name]
-                save_sonos_cache(cache)
-        # Attempt discovery
-        discovery = soco.discover(timeout=10)
-        if discovery:
-            for speaker in discovery:
+            print("Error clearing queue:", e)
+    try:
+        print("Restoring original volume")
+        speaker.volume = orig_volume
+    except Exception as e:
+        print("Error restoring volume:", e)
+    try:
+        print("Restoring previous speaker state")
+        snap.restore(fade=True)
+        if orig_state == 'PLAYING':
+            print("Resuming playback")
+            speaker.play()
+    except Exception as e:
+        print("Error restoring snapshot:", e)
+
+def _audio_duration(filenames):
+    total = 0.0
+    for filename in filenames:
+        duration = estimate_audio_duration(os.path.join(BASE_DIR, "audio_cache", filename))
+        total += duration if duration is not None else DEFAULT_CLIP_DURATION
+    return total
+
+def _subscribe_transport(speaker):
+    try:
+        return speaker.avTransport.subscribe()
+    except Exception as e:
+        print("Could not subscribe to Sonos transport events, falling back to polling:", e)
+        return None
+
+def _unsubscribe(subscription):
+    try:
+        subscription.unsubscribe()
+    except Exception:
+        pass
+
+def _wait_until_stopped(speaker, duration=None):
+    """
+    Block until the speaker stops playing.
+    Waits on AVTransport events so the restore can fire as soon as playback
+    ends. If events never arrive (e.g. NOTIFY callbacks blocked by a firewall),
+    gives up on them after the clip's duration plus a margin and polls instead.
+    """
+    deadline = time.time() + (duration or DEFAULT_CLIP_DURATION) + EVENT_TIMEOUT_MARGIN
+    subscription = _subscribe_transport(speaker)
+    if subscription:
+        try:
+            # The first event after subscribing carries the current state, so a
+            # clip that already finished is seen straight away.
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
                 try:
-                    print(f"Discovered Speaker: {speaker.player_name}, IP: {speaker.ip_address}")
-                    cache[speaker.player_name] = speaker.ip_address
-                    save_sonos_cache(cache)
-                    return speaker
-                except Exception as e:
-                    print(f"Failed to process discovered speaker at {speaker.ip_address}: {e}")
-        # Fallback to default IP
-        if DEFAULT_SONOS_SPEAKER_IP:
-            try:
-                speaker = soco.SoCo(DEFAULT_SONOS_SPEAKER_IP)
-                _ = speaker.player_name
-                cache[speaker.player_name] = DEFAULT_SONOS_SPEAKER_IP
-                save_sonos_cache(cache)
-                return speaker
-            except Exception as e:
-                print(f"Failed to connect to default Sonos speaker at {DEFAULT_SONOS_SPEAKER_IP}: {e}")
-        raise Exception("No Sonos speakers available.")
+                    event = subscription.events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event.variables.get("transport_state") == "STOPPED":
+                    return
+        finally:
+            # Unsubscribing is a network round trip; keep it off the restore path.
+            threading.Thread(target=_unsubscribe, args=(subscription,), daemon=True).start()
+        print("No transport events received from Sonos, polling for playback end")
+    else:
+        time.sleep(max(0.0, deadline - EVENT_TIMEOUT_MARGIN - time.time()))
+    poll_deadline = time.time() + MAX_POLL_TIME
+    while time.time() < poll_deadline:
+        state = speaker.get_current_transport_info()['current_transport_state']
+        if state == 'STOPPED':
+            return
+        time.sleep(0.5)
+    print("Timed out waiting for Sonos playback to stop")
+
+def audio_url(filename):
+    return f"http://{get_local_ip()}:{AUDIO_SERVER_PORT}/audio_cache/{filename}"
+
+def _audio_ready(filename):
+    """
+    Check that Sonos will be able to fetch a file before asking it to play.
+    The file itself is checked on local disk (that's where the audio server
+    serves it from); the server is checked with a HEAD request, at most once
+    every SERVER_CHECK_INTERVAL seconds. Nothing is downloaded.
+    """
+    global _server_checked_at
+    if not os.path.exists(os.path.join(BASE_DIR, "audio_cache", filename)):
+        print(f"Error playing on Sonos: audio file not found: {filename}")
+        return False
+    if time.time() - _server_checked_at < SERVER_CHECK_INTERVAL:
+        return True
+    try:
+        response = _http.head(audio_url(filename), timeout=2)
+        response.raise_for_status()  # ensure proper HTTP response
+    except requests.exceptions.RequestException:
+        print("Error playing on Sonos: Audio server isn't running")
+        print(filename)
+        return False
+    _server_checked_at = time.time()
+    return True
 
 def play_on_sonos(audio_file_path: str, room_name: str = None):
-    from soco.exceptions import SoCoUPnPException
     try:
         speaker = get_sonos_speaker(room_name)
     except Exception as e:
         print(f"Could not find speaker: {e}")
         raise
 
-    print(f"Selected speaker: {speaker.player_name} ({speaker.ip_address})")
-
-    local_ip = get_local_ip()
-    sonos_url = f"http://{local_ip}:8009/audio_cache/{audio_file_path}"
+    print(f"Selected speaker: {room_name or 'default'} ({speaker.ip_address})")
 
-    try:
-        response = requests.get(sonos_url)
-        response.raise_for_status()  # ensure proper HTTP response
-    except requests.exceptions.RequestException as err:
-        print("Error playing on Sonos: Audio server isn't running")
-        print(audio_file_path)
+    if not _audio_ready(audio_file_path):
         return
+    sonos_url = audio_url(audio_file_path)
     print(f"Using audio URL: {sonos_url}")
 
-    try:
-        test_response = requests.get(sonos_url)
-        print(f"URL test status: {test_response.status_code}")
-        if test_response.status_code != 200:
-            raise Exception(f"Audio URL not accessible: {sonos_url}")
-
-        # Capture current volume and speaker state.
-        orig_volume = speaker.volume
-        orig_state = speaker.get_current_transport_info()['current_transport_state']
-        
-        snap = Snapshot(speaker)
-        snap.snapshot()
-
-        # Optional: Pre-amplify your TTS file here so it sounds louder than the ducked background.
-        print(f"Sending TTS to Sonos {speaker.player_name}")
-
-        speaker.volume = os.getenv("JARVIS_VOLUME")
-        speaker.add_uri_to_queue(sonos_url, 0)
-        speaker.play_from_queue(0)
-
-        while True:
-            state = speaker.get_current_transport_info()['current_transport_state']
-            if state == 'STOPPED':
-                break
-            time.sleep(0.5)
+    _play_on_speaker(speaker, sonos_url, _audio_duration([audio_file_path]), room_name or speaker.ip_address)
 
+def _play_on_speaker(speaker, sonos_url, duration, label):
+    """Snapshot a speaker, play one URL on it, wait for it to finish and restore the previous state."""
+    from soco.exceptions import SoCoUPnPException
+    with speakers_locked(speaker):
+        saved_state = None
         try:
-            print("Clearing TTS message from queue")
-            speaker.clear_queue()
+            saved_state = _snapshot_speaker(speaker)
+
+            # Optional: Pre-amplify your TTS file here so it sounds louder than the ducked background.
+            print(f"Sending TTS to Sonos {label}")
+
+            speaker.volume = os.getenv("JARVIS_VOLUME")
+            queue_index = speaker.add_uri_to_queue(sonos_url)
+            speaker.play_from_queue(queue_index - 1)
+
+            _wait_until_stopped(speaker, duration)
+
+        except SoCoUPnPException as e:
+            print(f"UPnP error: {e}")
+            raise
         except Exception as e:
-            print("Error clearing queue:", e)
+            print(f"Error playing on Sonos: {e}")
+            raise
+        finally:
+            if saved_state:
+                _restore_speaker(speaker, *saved_state)
 
-    except SoCoUPnPException as e:
-        print(f"UPnP error: {e}")
-        raise
-    except Exception as e:
-        print(f"Error playing on Sonos: {e}")
-        raise
-    finally:
-        if 'orig_volume' in locals():
-            try:
-                print("Restoring original volume")
-                speaker.volume = orig_volume
-            except Exception as e:
-                print("Error restoring volume:", e)
-        if 'snap' in locals():
-            try:
-                print("Restoring previous speaker state")
-                snap.restore(fade=True)
-                if orig_state == 'PLAYING':
-                    print("Resuming playback")
-                    speaker.play()
-            except Exception as e:
-                print("Error restoring snapshot:", e)
+def play_sequence_on_sonos(audio_files, room_name: str = None):
+    """
+    Play several audio files back to back on one speaker with a single snapshot/restore.
+    audio_files may be a generator that is still synthesizing later files; playback
+    starts as soon as the first filename is yielded and later files are appended to
+    the queue as they arrive.
+    """
+    files = iter(audio_files)
+    first_file = next(files, None)
+    if first_file is None:
+        return
+
+    speaker = get_sonos_speaker(room_name)
+    print(f"Selected speaker: {room_name or 'default'} ({speaker.ip_address})")
+    if not _audio_ready(first_file):
+        return
+    _play_sequence_on_speaker(speaker, first_file, files, room_name or speaker.ip_address)
+
+def _play_sequence_on_speaker(speaker, first_file, files, label):
+    """Snapshot a speaker, play first_file and then each of files as it arrives, and restore it."""
+    from soco.exceptions import SoCoUPnPException
+    with speakers_locked(speaker):
+        saved_state = None
+        try:
+            saved_state = _snapshot_speaker(speaker)
+            speaker.volume = os.getenv("JARVIS_VOLUME")
+            print(f"Streaming TTS to Sonos {label}")
+            queue_index = speaker.add_uri_to_queue(audio_url(first_file))
+            speaker.play_from_queue(queue_index - 1)
+            play_started = time.time()
+            queued = [first_file]
+            for filename in files:
+                queued.append(filename)
+                queue_index = speaker.add_uri_to_queue(audio_url(filename))
+                # If the previous chunk finished before this one was synthesized, restart from it.
+                state = speaker.get_current_transport_info()['current_transport_state']
+                if state == 'STOPPED':
+                    speaker.play_from_queue(queue_index - 1)
+            remaining = _audio_duration(queued) - (time.time() - play_started)
+            _wait_until_stopped(speaker, max(0.5, remaining))
+        except SoCoUPnPException as e:
+            print(f"UPnP error: {e}")
+            raise
+        except Exception as e:
+            print(f"Error playing on Sonos: {e}")
+            raise
+        finally:
+            if saved_state:
+                _restore_speaker(speaker, *saved_state)
 
 def find_sonos_speakers():
     discovery = soco.discover(timeout=10)
@@ -0,0 +1,3 @@
+from .backends import (
+    get_stt_backend, TranscriptionSession, WhisperAPIBackend, FasterWhisperBackend, VoskBackend, MockSTTBackend,
+)
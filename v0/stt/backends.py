@@ -0,0 +1,208 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import openai
+from audio.encode import encode_for_upload, to_rate
+
+STT_BACKEND = os.getenv("JARVIS_STT_BACKEND", "openai").lower()
+STT_MODEL = os.getenv("JARVIS_STT_MODEL", "base.en")
+STT_LANGUAGE = os.getenv("JARVIS_STT_LANGUAGE", "en")
+# How much new audio a local engine waits for before re-decoding a partial transcript.
+PARTIAL_INTERVAL = float(os.getenv("JARVIS_STT_PARTIAL_INTERVAL", "0.8"))
+
+class TranscriptionSession:
+    """
+    One utterance being transcribed. The recorder feed()s 16-bit mono PCM as
+    it arrives and calls finish() once the speaker stops. Backends that can
+    decode incrementally update `partial` (and call on_partial) while audio
+    is still coming in, with `partial_bytes` saying how much of the fed audio
+    it covers; the rest just buffer and transcribe in finish().
+    """
+    def __init__(self, backend, rate, on_partial=None):
+        self.backend = backend
+        self.rate = rate
+        self.on_partial = on_partial
+        self.pcm = bytearray()
+        self.partial = ""
+        self.partial_bytes = 0
+
+    @property
+    def duration(self):
+        return len(self.pcm) / 2 / self.rate
+
+    def feed(self, pcm):
+        self.pcm += pcm
+
+    def refresh_partial(self):
+        """Bring the partial up to date with everything fed so far, if the backend decodes in batches."""
+
+    def _set_partial(self, text, covered=None):
+        self.partial_bytes = len(self.pcm) if covered is None else covered
+        if text and text != self.partial:
+            self.partial = text
+            if self.on_partial:
+                self.on_partial(text)
+
+    def finish(self):
+        if not self.pcm:
+            return ""
+        return self.backend.transcribe(bytes(self.pcm), self.rate)
+
+class WhisperAPIBackend:
+    """OpenAI's hosted Whisper; uploads the whole utterance once it ends."""
+    streaming = False
+
+    def transcribe(self, pcm, rate):
+        audio_file = encode_for_upload(pcm, rate)
+        transcript = openai.Audio.transcribe("whisper-1", audio_file)
+        return transcript.get("text", "")
+
+    def stream(self, rate, on_partial=None):
+        return TranscriptionSession(self, rate, on_partial)
+
+class _RedecodingSession(TranscriptionSession):
+    """Re-transcribes the audio so far on the backend's worker every PARTIAL_INTERVAL seconds of new audio."""
+    def __init__(self, backend, rate, on_partial=None):
+        super().__init__(backend, rate, on_partial)
+        self._decoded_bytes = 0
+        self._pending = None
+
+    def feed(self, pcm):
+        super().feed(pcm)
+        if len(self.pcm) - self._decoded_bytes >= PARTIAL_INTERVAL * self.rate * 2:
+            self.refresh_partial()
+
+    def refresh_partial(self):
+        busy = self._pending is not None and not self._pending.done()
+        if not busy and len(self.pcm) > self._decoded_bytes:
+            self._decoded_bytes = len(self.pcm)
+            snapshot = bytes(self.pcm)
+            self._pending = self.backend.executor.submit(self._decode_partial, snapshot)
+
+    def _decode_partial(self, snapshot):
+        try:
+            self._set_partial(self.backend.transcribe(snapshot, self.rate), len(snapshot))
+        except Exception as e:
+            print("Partial transcription error:", e)
+
+    def finish(self):
+        if self._pending:
+            self._pending.result()
+        if not self.pcm:
+            return ""
+        return self.backend.executor.submit(self.backend.transcribe, bytes(self.pcm), self.rate).result()
+
+class FasterWhisperBackend:
+    """
+    Local CPU Whisper via faster-whisper (CTranslate2, int8).
+    The model is loaded once and shared; decoding runs on a single worker
+    thread because a model instance isn't safe to use from several at once.
+    """
+    streaming = True
+
+    def __init__(self, model_size=STT_MODEL, language=STT_LANGUAGE, compute_type="int8"):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type)
+        self.language = language
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def transcribe(self, pcm, rate):
+        audio = np.frombuffer(to_rate(pcm, rate, 16000), dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _info = self.model.transcribe(audio, language=self.language, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def stream(self, rate, on_partial=None):
+        return _RedecodingSession(self, rate, on_partial)
+
+class _VoskSession(TranscriptionSession):
+    def __init__(self, backend, rate, on_partial=None):
+        super().__init__(backend, rate, on_partial)
+        from vosk import KaldiRecognizer
+        self.recognizer = KaldiRecognizer(backend.model, rate)
+        self.final_parts = []
+
+    def feed(self, pcm):
+        super().feed(pcm)
+        if self.recognizer.AcceptWaveform(bytes(pcm)):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.final_parts.append(text)
+            self._set_partial(" ".join(self.final_parts))
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            self._set_partial(" ".join(self.final_parts + ([partial] if partial else [])))
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return " ".join(self.final_parts + ([text] if text else []))
+
+class VoskBackend:
+    """Local Kaldi recognizer; truly streaming, lighter but less accurate than Whisper."""
+    streaming = True
+
+    def __init__(self, model_path=None):
+        from vosk import Model
+        model_path = model_path or os.getenv("JARVIS_VOSK_MODEL")
+        self.model = Model(model_path) if model_path else Model(lang=STT_LANGUAGE)
+
+    def transcribe(self, pcm, rate):
+        session = self.stream(rate)
+        session.feed(pcm)
+        return session.finish()
+
+    def stream(self, rate, on_partial=None):
+        return _VoskSession(self, rate, on_partial)
+
+class MockSTTBackend:
+    """
+    Offline stand-in for testing the voice pipeline without a network or models.
+    Returns scripted transcripts in order (then repeats the last one); while
+    audio is fed, partials reveal the transcript a word per half second.
+    """
+    streaming = True
+
+    def __init__(self, transcripts=None):
+        self.transcripts = list(transcripts or [os.getenv("JARVIS_STT_MOCK_TEXT", "What time is it?")])
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            return self.transcripts.pop(0) if len(self.transcripts) > 1 else self.transcripts[0]
+
+    def transcribe(self, pcm, rate):
+        self.calls.append(len(pcm) / 2 / rate)
+        return self._next()
+
+    def stream(self, rate, on_partial=None):
+        return _MockSession(self, rate, on_partial)
+
+class _MockSession(TranscriptionSession):
+    def __init__(self, backend, rate, on_partial=None):
+        super().__init__(backend, rate, on_partial)
+        self.text = backend._next()
+
+    def feed(self, pcm):
+        super().feed(pcm)
+        words = self.text.split()
+        self._set_partial(" ".join(words[:int(self.duration / 0.5)]))
+
+    def finish(self):
+        self.backend.calls.append(self.duration)
+        return self.text if self.pcm else ""
+
+_BACKENDS = {
+    "openai": WhisperAPIBackend,
+    "faster-whisper": FasterWhisperBackend,
+    "vosk": VoskBackend,
+    "mock": MockSTTBackend,
+}
+
+def get_stt_backend(name=None):
+    """Build the speech-to-text backend named by JARVIS_STT_BACKEND (openai, faster-whisper, vosk or mock)."""
+    name = (name or STT_BACKEND).lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown speech-to-text backend: {name}")
+    return _BACKENDS[name]()
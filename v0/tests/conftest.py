@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other as top-level packages (llm, audio, tts...), as they do when run from v0/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+import threading
+import http.client
+from functools import partial
+from http.server import ThreadingHTTPServer
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("netifaces")
+import audio_server
+from audio_server import AudioFileHandler, AudioServer
+
+BODY = bytes(range(256)) * 4
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "clip.mp3").write_bytes(BODY)
+    handler = partial(AudioFileHandler, directory=str(tmp_path), url_prefix="/audio_cache/")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+def get(port, path="/audio_cache/clip.mp3", headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+def test_full_response(server):
+    response, body = get(server)
+    assert response.status == 200
+    assert response.getheader("Accept-Ranges") == "bytes"
+    assert response.getheader("Content-Type") == "audio/mpeg"
+    assert body == BODY
+
+def test_range_is_partial_content(server):
+    response, body = get(server, headers={"Range": "bytes=10-19"})
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes 10-19/{len(BODY)}"
+    assert body == BODY[10:20]
+
+def test_open_and_suffix_ranges(server):
+    response, body = get(server, headers={"Range": "bytes=1000-"})
+    assert response.status == 206
+    assert body == BODY[1000:]
+    response, body = get(server, headers={"Range": "bytes=-24"})
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes 1000-1023/{len(BODY)}"
+    assert body == BODY[-24:]
+
+def test_range_past_the_end_is_unsatisfiable(server):
+    response, body = get(server, headers={"Range": f"bytes={len(BODY)}-"})
+    assert response.status == 416
+    assert response.getheader("Content-Range") == f"bytes */{len(BODY)}"
+    assert body == b""
+
+def test_stale_if_range_sends_the_whole_file(server):
+    response, body = get(server, headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status == 200
+    assert body == BODY
+
+def test_nothing_outside_the_cache(server):
+    response, _body = get(server, path="/audio_cache/../clip.mp3")
+    assert response.status == 404
+    response, _body = get(server, path="/clip.mp3")
+    assert response.status == 404
+
+def test_url_for_file_is_reachable_from_the_lan(monkeypatch, tmp_path):
+    monkeypatch.setattr(audio_server, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(audio_server, "get_local_ip", lambda: "192.168.1.20")
+    server = AudioServer(mode=audio_server.AudioMode.FILE, file_port=8009)
+    assert server.get_url_for_file("tts-abc.mp3") == "http://192.168.1.20:8009/audio_cache/tts-abc.mp3"
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("pyaudio")
+from audio.capture import MicrophoneCapture
+
+class FlakyStream:
+    """Plays back a script of frames (bytes) and read errors (exceptions)."""
+    def __init__(self, script):
+        self.script = list(script)
+
+    def read(self, frames, exception_on_overflow=True):
+        step = self.script.pop(0) if self.script else IOError("device gone")
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+def run(script, max_read_errors=3):
+    capture = MicrophoneCapture(buffer_seconds=1)
+    capture.max_read_errors = max_read_errors
+    capture.stream = FlakyStream(script)
+    capture._running = True
+    capture._capture_loop()
+    return capture
+
+def test_isolated_errors_are_skipped():
+    frame = b"\x01\x00" * 4
+    capture = run([frame, IOError("overflow"), IOError("overflow"), frame, IOError("overflow"), frame])
+    assert capture.overflows == 6  # Three from the script, then three from the dead device at its end.
+    assert capture.ring.written == 3 * len(frame)
+
+def test_gives_up_and_closes_the_ring():
+    capture = run([b"\x00\x00" * 4])
+    assert not capture._running
+    assert capture.overflows == 3
+    assert capture.ring.closed
+    reader = capture.ring.reader(position=0)
+    assert reader.read(16, timeout=1) == b"\x00\x00" * 4
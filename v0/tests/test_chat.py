@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import time
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+from llm.chat import aiter_stream
+
+def slow_tokens(count, closed, delay=0.2):
+    try:
+        for i in range(count):
+            time.sleep(delay)
+            yield i
+    finally:
+        closed.set()
+
+def test_many_streams_wait_on_the_llm_at_once():
+    async def consume():
+        return [token async for token in aiter_stream(slow_tokens(2, threading.Event()))]
+
+    async def main():
+        return await asyncio.gather(*[consume() for _ in range(10)])
+
+    started = time.monotonic()
+    assert asyncio.run(main()) == [[0, 1]] * 10
+    # Ten rooms at two slow tokens each: together, not in batches.
+    assert time.monotonic() - started < 1.0
+
+def test_stopping_early_closes_the_stream():
+    closed = threading.Event()
+
+    async def main():
+        async for _ in aiter_stream(slow_tokens(100, closed, delay=0.01)):
+            break
+
+    asyncio.run(main())
+    assert closed.wait(timeout=1)
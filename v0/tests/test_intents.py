@@ -0,0 +1,61 @@
+import os
+import json
+import importlib.util
+import pytest
+
+# Load intents.py on its own: the actions package imports the command registry
+# and its Sonos and Supabase clients, and the router needs neither.
+_spec = importlib.util.spec_from_file_location(
+    "intents", os.path.join(os.path.dirname(__file__), "..", "actions", "intents.py"))
+intents = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(intents)
+
+router = intents.IntentRouter(functions={intent.name: None for intent in intents.INTENTS})
+
+def route(text):
+    found = router.match(text)
+    if found is None:
+        return None
+    call = found[1]
+    return call["name"], json.loads(call["arguments"]) if call["arguments"] else {}
+
+@pytest.mark.parametrize("text,expected", [
+    ("Jarvis, open the garage door please.", ("open_garage_door", {})),
+    ("Open the garage", ("open_garage_door", {})),
+    ("What are my tasks?", ("get_tasks", {})),
+    ("Show me my todo list", ("get_tasks", {})),
+    ("Add a task to buy milk", ("create_task", {"task": "buy milk"})),
+    ("Create a new todo called renew passport", ("create_task", {"task": "renew passport"})),
+    ("Put call mum on my to do list", ("create_task", {"task": "call mum"})),
+    ("Remind me to call the plumber tomorrow.", ("create_task", {"task": "call the plumber tomorrow"})),
+    ("Mark buy milk as done", ("mark_task_done", {"task": "buy milk"})),
+    ("Mark the task buy milk as complete, thanks", ("mark_task_done", {"task": "buy milk"})),
+    ("Tick off renew passport", ("mark_task_done", {"task": "renew passport"})),
+    ("Check off buy milk from my list", ("mark_task_done", {"task": "buy milk"})),
+    ("Complete the task renew passport", ("mark_task_done", {"task": "renew passport"})),
+    ("I've finished the task renew passport", ("mark_task_done", {"task": "renew passport"})),
+])
+def test_commands(text, expected):
+    assert route(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "I've finished my homework, what should I do next?",
+    "Complete this sentence: the quick brown fox",
+    "I have done nothing today",
+    "Create a todo list for my trip",
+    "Make a todo app in python",
+    "Mark it as done",
+    "Remind me to buy milk?",
+    "Remind me to call mum and book the dentist",
+    "Add a task to work out how to file my taxes",
+    "Remind me to look into whether the new kitchen tiles would suit the hallway as well",
+    "Is the garage door open?",
+    "Could you tell me a joke?",
+])
+def test_chat_goes_to_the_llm(text):
+    assert route(text) is None
+
+def test_unregistered_intents_are_left_out():
+    tasks_only = intents.IntentRouter(functions={"get_tasks": None})
+    assert tasks_only.match("Open the garage door") is None
+    assert tasks_only.match("What are my tasks?")[0].name == "get_tasks"
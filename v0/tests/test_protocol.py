@@ -0,0 +1,77 @@
+import socket
+import time
+import numpy as np
+import pytest
+from audio.protocol import (
+    SAMPLE_FLOAT32, SAMPLE_INT16, FramedStreamReader, ProtocolError, StreamFormat,
+    decode_header, encode_frame, to_mono_int16,
+)
+
+def test_mono_int16_passes_through():
+    payload = np.array([1, -2, 3], dtype=np.int16).tobytes()
+    assert to_mono_int16(payload, StreamFormat(16000)) is payload
+
+def test_stereo_is_averaged():
+    stereo = np.array([100, 300, -50, -150], dtype=np.int16).tobytes()
+    mono = to_mono_int16(stereo, StreamFormat(16000, channels=2))
+    assert np.frombuffer(mono, dtype=np.int16).tolist() == [200, -100]
+
+def test_float32_is_scaled_and_clipped():
+    samples = np.array([0.5, -0.25, 2.0, -2.0], dtype=np.float32).tobytes()
+    mono = to_mono_int16(samples, StreamFormat(16000, sample_format=SAMPLE_FLOAT32))
+    assert np.frombuffer(mono, dtype=np.int16).tolist() == [16384, -8192, 32767, -32768]
+
+def test_zero_channels_is_rejected():
+    frame = encode_frame(StreamFormat(16000, channels=0), 1, b"")
+    with pytest.raises(ProtocolError):
+        decode_header(frame)
+
+def test_reader_stores_mono_int16():
+    left, right = socket.socketpair()
+    try:
+        reader = FramedStreamReader(left, buffer_bytes=1024)
+        stereo_float = np.array([[0.5, 0.0], [-0.5, -0.5]], dtype=np.float32).tobytes()
+        right.sendall(encode_frame(StreamFormat(48000, channels=2, sample_format=SAMPLE_FLOAT32), 1, stereo_float))
+        while reader.ring.written < 4:
+            assert reader.fill(timeout=1)
+    finally:
+        left.close()
+        right.close()
+    assert reader.format == StreamFormat(48000, channels=1, sample_format=SAMPLE_INT16)
+    assert reader.source_format.channels == 2
+    assert np.frombuffer(reader.ring.get(0, reader.ring.written), dtype=np.int16).tolist() == [8192, -16384]
+
+def test_reader_receives_mono_int16_into_the_ring():
+    left, right = socket.socketpair()
+    fmt = StreamFormat(16000)
+    try:
+        # A small ring, so payloads also wrap around its end.
+        reader = FramedStreamReader(left, buffer_bytes=1000)
+        payloads = [np.arange(i * 150, (i + 1) * 150, dtype=np.int16).tobytes() for i in range(5)]
+        right.sendall(encode_frame(fmt, 0, b""))
+        for sequence, payload in zip([1, 2, 4, 5, 6], payloads):
+            right.sendall(encode_frame(fmt, sequence, payload))
+        assert reader.wait_for_format() == fmt
+        while reader.ring.written < 1500:
+            assert reader.fill(timeout=1)
+        assert reader.fill(timeout=0.05) is False
+    finally:
+        left.close()
+        right.close()
+    assert reader.ring.get(500, 1500) == b"".join(payloads)[500:]
+    assert (reader.gaps, reader.frames_lost) == (1, 1)
+
+def test_drain_takes_only_what_is_already_buffered():
+    left, right = socket.socketpair()
+    fmt = StreamFormat(16000)
+    try:
+        reader = FramedStreamReader(left, buffer_bytes=4096)
+        for sequence in range(1, 4):
+            right.sendall(encode_frame(fmt, sequence, bytes(320)))
+        start = time.monotonic()
+        reader.drain()
+        assert time.monotonic() - start < 0.1
+    finally:
+        left.close()
+        right.close()
+    assert reader.ring.written == 960
@@ -0,0 +1,92 @@
+import socket
+import threading
+from audio.ringbuffer import AudioRingBuffer
+
+def test_write_wraps_around():
+    ring = AudioRingBuffer(10)
+    ring.write(b"abcdef")
+    ring.write(b"ghijkl")
+    assert ring.written == 12
+    assert ring.oldest == 2
+    assert ring.get(0, 12) == b"cdefghijkl"
+    assert ring.get(8, 12) == b"ijkl"
+
+def test_oversized_write_keeps_the_tail():
+    ring = AudioRingBuffer(8)
+    ring.write(b"0123456789ab")
+    assert ring.get(0, ring.written) == b"456789ab"
+
+def test_reader_crosses_the_wrap_point():
+    ring = AudioRingBuffer(8)
+    reader = ring.reader(position=0)
+    ring.write(b"012345")
+    assert reader.read(4) == b"0123"
+    ring.write(b"6789")
+    assert reader.read(6) == b"456789"
+    assert reader.lost == 0
+
+def test_lapped_reader_skips_ahead_and_counts_the_loss():
+    ring = AudioRingBuffer(8)
+    reader = ring.reader(position=0)
+    ring.write(b"012345")
+    ring.write(b"6789ab")
+    assert reader.read(4) == b"4567"
+    assert reader.lost == 4
+
+def test_rewind_stops_at_the_oldest_byte():
+    ring = AudioRingBuffer(8)
+    ring.write(b"01234")
+    ring.write(b"56789")
+    reader = ring.reader()
+    reader.rewind(100)
+    assert reader.position == ring.oldest == 2
+    assert reader.read(8) == b"23456789"
+
+def test_close_ends_a_short_read():
+    ring = AudioRingBuffer(8)
+    reader = ring.reader()
+    ring.write(b"ab")
+    ring.close()
+    assert reader.read(4, timeout=1) == b"ab"
+
+def test_recv_into_wraps_around():
+    ring = AudioRingBuffer(8)
+    ring.write(b"012345")
+    left, right = socket.socketpair()
+    try:
+        right.sendall(b"6789")
+        assert ring.recv_into(left) == 2  # Stops at the end of the buffer.
+        assert ring.recv_into(left) == 2
+    finally:
+        left.close()
+        right.close()
+    assert ring.get(0, ring.written) == b"23456789"
+
+def test_readers_never_see_torn_frames():
+    # The byte at absolute position p is always (p // frame) % 256, so any byte
+    # the writer overwrote in the middle of a read shows up as a wrong value.
+    # The capacity is not a whole number of frames, so reads also straddle the wrap point.
+    frame = 256
+    ring = AudioRingBuffer(frame * 3 + frame // 2)
+    stop = threading.Event()
+
+    def writer():
+        value = 0
+        while not stop.is_set():
+            ring.write(bytes([value]) * frame)
+            value = (value + 1) % 256
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    reader = ring.reader(position=0)
+    out = bytearray(frame)
+    try:
+        for _ in range(20000):
+            # Read the oldest bytes still held, the ones the writer is about to overwrite.
+            reader.position = ring.oldest
+            n = reader.read_into(out, timeout=1)
+            start = reader.position - n
+            assert list(out[:n]) == [(p // frame) % 256 for p in range(start, start + n)]
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,81 @@
+import threading
+import time
+from llm.sessions import ConversationStore
+
+def test_session_round_trip():
+    store = ConversationStore()
+    with store.session("u", "system") as messages:
+        messages.append({"role": "user", "content": "hi"})
+    assert [m["role"] for m in store.get_messages("u")] == ["system", "user"]
+
+def test_failed_exchange_is_not_saved():
+    store = ConversationStore()
+    try:
+        with store.session("u", "system") as messages:
+            messages.append({"role": "user", "content": "hi"})
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert store.get_messages("u") == []
+
+def test_expired_sessions_are_swept():
+    store = ConversationStore(ttl=10)
+    with store.session("u", "system"):
+        pass
+    store.sweep(now=time.time() + 11)
+    assert len(store) == 0
+
+def test_lru_bound():
+    store = ConversationStore(max_sessions=2)
+    for user in ("a", "b", "c"):
+        with store.session(user, "system"):
+            pass
+    assert store.get_messages("a") == [] and len(store) == 2
+
+def test_compact_keeps_latest_turn_within_budget():
+    store = ConversationStore(token_budget=40)
+    messages = [{"role": "system", "content": "s"}]
+    for i in range(10):
+        messages += [{"role": "user", "content": "x" * 40}, {"role": "assistant", "content": "y" * 40}]
+    compacted = store.compact(messages)
+    assert compacted[0]["role"] == "system"
+    assert compacted[-2:] == messages[-2:]
+    assert len(compacted) < len(messages)
+
+def test_drop_while_held_keeps_one_lock_per_user():
+    # A session dropped (swept, evicted) while an exchange holds its lock must not
+    # let a second exchange for the same user in with a fresh lock.
+    store = ConversationStore()
+    with store.session("u", "system"):
+        pass
+    inside = threading.Event()
+    release = threading.Event()
+    overlapped = []
+
+    def first():
+        with store.session("u", "system"):
+            inside.set()
+            release.wait(2)
+
+    def second():
+        with store.session("u", "system"):
+            overlapped.append(not release.is_set())
+
+    one = threading.Thread(target=first)
+    one.start()
+    inside.wait(2)
+    store.clear("u")
+    two = threading.Thread(target=second)
+    two.start()
+    time.sleep(0.1)
+    release.set()
+    one.join(2)
+    two.join(2)
+    assert overlapped == [False]
+
+def test_locks_forgotten_once_idle():
+    store = ConversationStore()
+    with store.session("u", "system"):
+        pass
+    store.clear("u")
+    assert "u" not in store._user_locks
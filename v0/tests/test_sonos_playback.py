@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("soco")
+pytest.importorskip("netifaces")
+from sonos import speakers
+
+class FakeSpeaker:
+    """Records snapshot and restore calls; playing takes a little while."""
+    def __init__(self, ip, log):
+        self.ip_address = ip
+        self.log = log
+        self.volume = 20
+
+    def get_current_transport_info(self):
+        return {"current_transport_state": "PLAYING"}
+
+    def add_uri_to_queue(self, url):
+        self.log.append((self.ip_address, "play", url))
+        return 1
+
+    def play_from_queue(self, index):
+        pass
+
+@pytest.fixture
+def log(monkeypatch):
+    log = []
+    lock = threading.Lock()
+
+    def snapshot(speaker):
+        with lock:
+            log.append((speaker.ip_address, "snapshot"))
+        return ("snap", speaker.volume, "PLAYING")
+
+    def restore(speaker, *state, clear_queue=True):
+        with lock:
+            log.append((speaker.ip_address, "restore"))
+
+    monkeypatch.setattr(speakers, "_snapshot_speaker", snapshot)
+    monkeypatch.setattr(speakers, "_restore_speaker", restore)
+    monkeypatch.setattr(speakers, "_wait_until_stopped", lambda speaker, duration=None: time.sleep(0.05))
+    monkeypatch.setattr(speakers, "_audio_ready", lambda filename: True)
+    monkeypatch.setattr(speakers, "_audio_duration", lambda filenames: 0.05)
+    monkeypatch.setattr(speakers, "audio_url", lambda filename: filename)
+    return log
+
+def test_chime_and_reply_on_one_speaker_take_turns(log, monkeypatch):
+    speaker = FakeSpeaker("10.0.0.5", log)
+    monkeypatch.setattr(speakers, "get_sonos_speaker", lambda room_name=None: speaker)
+    chime = threading.Thread(target=speakers.play_on_sonos, args=("yes-sir.mp3", "Office"))
+    chime.start()
+    time.sleep(0.01)
+    speakers.play_sequence_on_sonos(["reply-1.mp3", "reply-2.mp3"], room_name="Office")
+    chime.join()
+    steps = [entry[1] for entry in log]
+    assert steps == ["snapshot", "play", "restore", "snapshot", "play", "play", "restore"]
+
+def test_different_speakers_play_at_once(log, monkeypatch):
+    rooms = {"Office": FakeSpeaker("10.0.0.5", log), "Kitchen": FakeSpeaker("10.0.0.6", log)}
+    monkeypatch.setattr(speakers, "get_sonos_speaker", lambda room_name=None: rooms[room_name])
+    threads = [threading.Thread(target=speakers.play_on_sonos, args=("a.mp3", room)) for room in rooms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    steps = [entry[1] for entry in log]
+    # Both snapshots happen before either restore: neither speaker waited for the other.
+    assert steps.index("restore") > max(i for i, step in enumerate(steps) if step == "snapshot")
+
+def test_streamed_reply_plays_in_every_room(log, monkeypatch):
+    from sonos import broadcast
+    rooms = {"Office": FakeSpeaker("10.0.0.5", log), "Kitchen": FakeSpeaker("10.0.0.6", log)}
+    for speaker in rooms.values():
+        speaker.group = type("Group", (), {"coordinator": speaker})()
+    monkeypatch.setattr(broadcast, "resolve_rooms", lambda rooms_arg: list(rooms))
+    monkeypatch.setattr(broadcast.speaker_registry, "get", lambda room: rooms[room])
+    monkeypatch.setattr(broadcast, "_audio_ready", lambda filename: True)
+    results = broadcast.broadcast_sequence_on_sonos(iter(["one.mp3", "two.mp3"]), "Office,Kitchen")
+    assert results == {"Office": "ok", "Kitchen": "ok"}
+    for speaker in rooms.values():
+        played = [entry[2] for entry in log if entry[0] == speaker.ip_address and entry[1] == "play"]
+        assert played == ["one.mp3", "two.mp3"]
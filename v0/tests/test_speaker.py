@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("playsound")
+pytest.importorskip("soco")
+from tts import speaker
+
+class FakeProcess:
+    def __init__(self, args):
+        self.args = args
+        self.terminated = False
+
+    def poll(self):
+        return 0 if self.terminated else None
+
+    def terminate(self):
+        self.terminated = True
+
+@pytest.fixture(autouse=True)
+def afplay(monkeypatch):
+    monkeypatch.setattr(speaker.subprocess, "Popen", FakeProcess)
+
+def test_stop_only_cuts_off_its_own_player():
+    kitchen, office = speaker.LocalPlayer(), speaker.LocalPlayer()
+    kitchen_process = kitchen.start("kitchen.mp3")
+    office_process = office.start("office.mp3")
+    kitchen.stop()
+    assert kitchen_process.terminated
+    assert not office_process.terminated
+
+def test_stopped_player_starts_nothing_more():
+    player = speaker.LocalPlayer()
+    player.stop()
+    assert player.start("late.mp3") is None
+
+def test_play_local_audio_skips_a_stopped_player(tmp_path, monkeypatch):
+    monkeypatch.setattr(speaker.platform, "system", lambda: "Darwin")
+    path = tmp_path / "reply.mp3"
+    path.write_bytes(b"mp3")
+    played = []
+    player = speaker.LocalPlayer()
+    player.stop()
+    speaker.play_local_audio(str(path), on_play=played.append, player=player)
+    assert played == []
@@ -0,0 +1,43 @@
+import threading
+from tts import streaming
+
+def test_stopping_early_closes_the_text_stream(monkeypatch, capsys):
+    monkeypatch.setattr(streaming, "synthesize_speech_elevenlabs", lambda sentence: sentence + ".mp3")
+    read, closed, listener_gone = [], threading.Event(), threading.Event()
+
+    def tokens():
+        try:
+            for i in range(1000):
+                if i:
+                    # A slow LLM: the rest of the reply arrives after the listener stopped.
+                    listener_gone.wait()
+                read.append(i)
+                yield f"Sentence number {i} is here. "
+        finally:
+            closed.set()
+
+    sentences = streaming.synthesize_streaming(tokens())
+    assert next(sentences) == ("Sentence number 0 is here.", "Sentence number 0 is here..mp3")
+    sentences.close()
+    listener_gone.set()
+    assert closed.wait(timeout=1)
+    assert read == [0, 1]
+    # Nothing was submitted to the executor after it shut down.
+    assert "Error" not in capsys.readouterr().out
+
+def test_stop_event_stops_reading(monkeypatch):
+    monkeypatch.setattr(streaming, "synthesize_speech_elevenlabs", lambda sentence: sentence + ".mp3")
+    stop, closed = threading.Event(), threading.Event()
+
+    def tokens():
+        try:
+            yield "First sentence, spoken. "
+            stop.set()
+            while True:
+                yield "More that nobody hears. "
+        finally:
+            closed.set()
+
+    spoken = [sentence for sentence, _ in streaming.synthesize_streaming(tokens(), stop=stop)]
+    assert closed.is_set()
+    assert spoken == ["First sentence, spoken."]
@@ -0,0 +1,71 @@
+import os
+import time
+import pytest
+from tts import cache
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "AUDIO_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "INDEX_FILE", str(tmp_path / "tts_index.json"))
+    monkeypatch.setattr(cache, "_index", None)
+    monkeypatch.setattr(cache, "_index_mtime", None)
+    monkeypatch.setattr(cache, "_pending_access", {})
+    return tmp_path
+
+def test_key_depends_on_text_voice_and_settings():
+    key = cache.cache_key("Hello", "voice", {"stability": 0.5})
+    assert key == cache.cache_key("Hello", "voice", {"stability": 0.5})
+    assert key != cache.cache_key("Hello.", "voice", {"stability": 0.5})
+    assert key != cache.cache_key("Hello", "other", {"stability": 0.5})
+    assert key != cache.cache_key("Hello", "voice", {"stability": 0.6})
+
+def test_store_then_hit(store):
+    key = cache.cache_key("Good day, sir.", "voice", {})
+    assert cache.get_cached_audio(key) is None
+    filename = cache.store_cached_audio(key, b"mp3 bytes", "Good day, sir.")
+    assert (store / filename).read_bytes() == b"mp3 bytes"
+    assert cache.get_cached_audio(key) == filename
+
+def test_missing_file_is_a_miss(store):
+    key = cache.cache_key("Gone", "voice", {})
+    filename = cache.store_cached_audio(key, b"x")
+    os.remove(store / filename)
+    assert cache.get_cached_audio(key) is None
+
+def test_least_recently_used_evicted_over_budget(store, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_CACHE_BYTES", 10)
+    old = cache.cache_key("old", "voice", {})
+    new = cache.cache_key("new", "voice", {})
+    cache.store_cached_audio(old, b"123456")
+    time.sleep(0.01)
+    cache.store_cached_audio(new, b"789012")
+    assert cache.get_cached_audio(old) is None
+    assert cache.get_cached_audio(new) is not None
+
+def test_hits_do_not_rewrite_the_index_every_time(store, monkeypatch):
+    key = cache.cache_key("Very good, sir.", "voice", {})
+    cache.store_cached_audio(key, b"mp3")
+    writes = []
+    save_index = cache._save_index
+    monkeypatch.setattr(cache, "_save_index", lambda: (writes.append(1), save_index()))
+    for _ in range(5):
+        assert cache.get_cached_audio(key) is not None
+    assert writes == []
+    cache.flush_cache_index()
+    assert len(writes) == 1
+    cache._index = None
+    assert cache._load_index()[key]["hits"] == 5
+
+def test_eviction_sees_unsaved_access_times(store, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_CACHE_BYTES", 12)
+    first = cache.cache_key("first", "voice", {})
+    second = cache.cache_key("second", "voice", {})
+    cache.store_cached_audio(first, b"123456")
+    time.sleep(0.01)
+    cache.store_cached_audio(second, b"123456")
+    time.sleep(0.01)
+    # Played since, so it is no longer the least recently used.
+    assert cache.get_cached_audio(first) is not None
+    cache.store_cached_audio(cache.cache_key("third", "voice", {}), b"123456")
+    assert cache.get_cached_audio(first) is not None
+    assert cache.get_cached_audio(second) is None
@@ -1 +1,2 @@
 from .elevenlabs_tts import synthesize_speech_elevenlabs
+from .cache import cache_stats
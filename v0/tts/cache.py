@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from config import BASE_DIR
+
+# Content-addressed store for synthesized speech. Audio files live next to the
+# other served files in audio_cache/, and the index maps a hash of
+# (text, voice id, voice settings) to the file that holds the audio.
+AUDIO_DIR = os.path.join(BASE_DIR, "audio_cache")
+INDEX_FILE = os.path.join(AUDIO_DIR, "tts_index.json")
+MAX_CACHE_BYTES = int(float(os.getenv("JARVIS_TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+MAX_CACHE_AGE = float(os.getenv("JARVIS_TTS_CACHE_MAX_AGE_DAYS", "30")) * 24 * 60 * 60
+# Hits only update access times in memory; the index is rewritten at most this often
+# for them (stores and evictions still write it at once), sparing SD cards a write per sentence.
+INDEX_SAVE_INTERVAL = float(os.getenv("JARVIS_TTS_CACHE_SAVE_INTERVAL", "60"))
+
+_lock = threading.Lock()
+_index = None
+_index_mtime = None
+_index_saved_at = 0.0
+# key -> (last access, hits) not yet written to the index file.
+_pending_access = {}
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def cache_key(text: str, voice_id: str, voice_settings: dict) -> str:
+    payload = json.dumps(
+        {"text": text, "voice_id": voice_id, "voice_settings": voice_settings},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load_index():
+    global _index, _index_mtime
+    try:
+        mtime = os.path.getmtime(INDEX_FILE)
+    except OSError:
+        mtime = None
+    # Reload only when another process (webapp vs. voice loop) has rewritten the index.
+    if _index is None or mtime != _index_mtime:
+        if mtime is not None:
+            try:
+                with open(INDEX_FILE, "r") as f:
+                    _index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read TTS cache index, starting fresh: {e}")
+                _index = {}
+        else:
+            _index = {}
+        _index_mtime = mtime
+    return _index
+
+def _apply_pending_access():
+    # Kept apart from _index so a reload after another process's write doesn't lose them.
+    for key, (last_access, hits) in _pending_access.items():
+        entry = _index.get(key)
+        if entry:
+            entry["last_access"] = max(entry.get("last_access", 0), last_access)
+            entry["hits"] = entry.get("hits", 0) + hits
+    _pending_access.clear()
+
+def _save_index():
+    global _index_mtime, _index_saved_at
+    _apply_pending_access()
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    tmp_path = INDEX_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_index, f)
+    os.replace(tmp_path, INDEX_FILE)
+    _index_mtime = os.path.getmtime(INDEX_FILE)
+    _index_saved_at = time.time()
+
+def _remove_entry(key):
+    _pending_access.pop(key, None)
+    entry = _index.pop(key, None)
+    if entry:
+        try:
+            os.remove(os.path.join(AUDIO_DIR, entry["filename"]))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing cached TTS file {entry['filename']}: {e}")
+
+def _evict(keep=None):
+    _apply_pending_access()
+    now = time.time()
+    for key, entry in list(_index.items()):
+        if key == keep:
+            continue
+        path = os.path.join(AUDIO_DIR, entry["filename"])
+        if now - entry.get("last_access", 0) > MAX_CACHE_AGE or not os.path.exists(path):
+            _remove_entry(key)
+            stats["evictions"] += 1
+    total = sum(entry.get("size", 0) for entry in _index.values())
+    # Least recently played phrases go first.
+    for key, entry in sorted(_index.items(), key=lambda item: item[1].get("last_access", 0)):
+        if total <= MAX_CACHE_BYTES:
+            break
+        if key == keep:
+            continue
+        total -= entry.get("size", 0)
+        _remove_entry(key)
+        stats["evictions"] += 1
+
+def get_cached_audio(key: str):
+    """
+    Look up synthesized audio by cache key.
+    Returns the filename inside audio_cache/ on a hit, or None on a miss.
+    """
+    with _lock:
+        index = _load_index()
+        entry = index.get(key)
+        if entry and os.path.exists(os.path.join(AUDIO_DIR, entry["filename"])):
+            now = time.time()
+            last_access, hits = _pending_access.get(key, (entry.get("last_access", 0), 0))
+            if now - last_access <= MAX_CACHE_AGE:
+                _pending_access[key] = (now, hits + 1)
+                stats["hits"] += 1
+                if now - _index_saved_at >= INDEX_SAVE_INTERVAL:
+                    _save_index()
+                return entry["filename"]
+        if entry:
+            _remove_entry(key)
+            _save_index()
+        stats["misses"] += 1
+        return None
+
+def store_cached_audio(key: str, content: bytes, text: str = "") -> str:
+    """
+    Write audio for a cache key into audio_cache/ and evict old entries if needed.
+    Returns the filename of the cached audio.
+    """
+    filename = f"tts-{key[:32]}.mp3"
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    path = os.path.join(AUDIO_DIR, filename)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    # Rename into place so a speaker fetching the URL never sees a partial file.
+    os.replace(tmp_path, path)
+    with _lock:
+        index = _load_index()
+        now = time.time()
+        index[key] = {
+            "filename": filename,
+            "size": len(content),
+            "created": now,
+            "last_access": now,
+            "hits": 0,
+            "text": text[:80],
+        }
+        stats["stores"] += 1
+        _evict(keep=key)
+        _save_index()
+    return filename
+
+def flush_cache_index():
+    """Write access times from recent hits to the index file."""
+    with _lock:
+        if _pending_access:
+            _load_index()
+            _save_index()
+
+atexit.register(flush_cache_index)
+
+def evict_cache():
+    with _lock:
+        _load_index()
+        _evict()
+        _save_index()
+
+def cache_stats() -> dict:
+    with _lock:
+        index = _load_index()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(index),
+            "bytes": sum(entry.get("size", 0) for entry in index.values()),
+            "max_bytes": MAX_CACHE_BYTES,
+        }
+
@@ -1,36 +1,53 @@
 import os
 import uuid
+import shutil
 import requests
 from dotenv import load_dotenv
 from config import BASE_DIR
+from tts.cache import cache_key, get_cached_audio, store_cached_audio
 
 load_dotenv()
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+ELEVENLABS_VOICE_ID = "ulWtRlgyOsbPRpjVAuGP"
+VOICE_SETTINGS = {
+    "stability": 0.3,
+    "similarity_boost": 0.8
+}
 
-def synthesize_speech_elevenlabs(text: str, output_filename=None):
-    if not output_filename:
-        output_filename = f"{uuid.uuid4()}.mp3"
-        
+def synthesize_speech_elevenlabs(text: str, output_filename=None, use_cache=True):
     audio_dir = os.path.join(BASE_DIR, "audio_cache")
     os.makedirs(audio_dir, exist_ok=True)
 
-    filepath = os.path.join(audio_dir, output_filename)
+    key = cache_key(text, ELEVENLABS_VOICE_ID, VOICE_SETTINGS)
+    if use_cache:
+        cached_filename = get_cached_audio(key)
+        if cached_filename:
+            print("Using cached TTS audio:", cached_filename)
+            if output_filename and output_filename != cached_filename:
+                shutil.copyfile(os.path.join(audio_dir, cached_filename), os.path.join(audio_dir, output_filename))
+                return output_filename
+            return cached_filename
 
-    url = "https://api.elevenlabs.io/v1/text-to-speech/ulWtRlgyOsbPRpjVAuGP"
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
         "Content-Type": "application/json"
     }
     data = {
         "text": text,
-        "voice_settings": {
-            "stability": 0.3,
-            "similarity_boost": 0.8
-        }
+        "voice_settings": VOICE_SETTINGS
     }
     print("Generating TTS with ElevenLabs...")
     response = requests.post(url, headers=headers, json=data)
     if response.status_code == 200:
+        if use_cache:
+            cached_filename = store_cached_audio(key, response.content, text)
+            if not output_filename or output_filename == cached_filename:
+                print("TTS audio saved to:", os.path.join(audio_dir, cached_filename))
+                return cached_filename
+        if not output_filename:
+            output_filename = f"{uuid.uuid4()}.mp3"
+        filepath = os.path.join(audio_dir, output_filename)
         with open(filepath, "wb") as f:
             f.write(response.content)
         print("TTS audio saved to:", filepath)
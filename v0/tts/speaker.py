@@ -1,9 +1,11 @@
 import os
 import platform
 import subprocess
+import threading
 from playsound import playsound
-from sonos import play_on_sonos
+from sonos import play_on_sonos, play_sequence_on_sonos, broadcast_on_sonos, broadcast_sequence_on_sonos
 from tts.elevenlabs_tts import synthesize_speech_elevenlabs
+from tts.streaming import synthesize_streaming
 from utilities import logger
 from config import BASE_DIR
 import time
@@ -13,20 +15,53 @@ def cli_speak(text: str, speaker: str = None, filename: str = None):
         filename = synthesize_speech_elevenlabs(text)
     else:
         filename = synthesize_speech_elevenlabs(text, output_filename=filename)
-    play_on_sonos(filename, room_name=speaker)
+    if speaker and (speaker == "all" or "," in speaker):
+        broadcast_on_sonos(filename, speaker)
+    else:
+        play_on_sonos(filename, room_name=speaker)
     logger.info(f"CLI speak: '{text}' on speaker: '{speaker}', saved to audio_cache/{filename}")
     return filename
 
-def cli_speak_local(text: str, filename: str = None):
-    if filename is None:
-        filename = synthesize_speech_elevenlabs(text)
-    else:
-        filename = synthesize_speech_elevenlabs(text, output_filename=filename)
-    audio_path = os.path.join(BASE_DIR, "audio_cache", filename)
+class LocalPlayer:
+    """
+    One reply's playback on this machine. stop() cuts off the file it is
+    playing and keeps it from starting any more, without touching playback
+    that belongs to another reply (afplay only; playsound can't be interrupted).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+        self.stopped = False
+
+    def start(self, audio_path):
+        """Start afplay on audio_path, or return None if this player was stopped first."""
+        with self._lock:
+            if self.stopped:
+                return None
+            self._process = subprocess.Popen(["afplay", audio_path])
+            return self._process
+
+    def stop(self):
+        with self._lock:
+            self.stopped = True
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+
+def play_local_audio(audio_path: str, on_play=None, player: LocalPlayer = None):
+    """
+    Play a file on this machine, blocking until it ends; on_play(audio_path) is
+    called just before it starts. Pass a LocalPlayer to be able to stop it.
+    """
     try:
         if os.path.exists(audio_path):
+            if player is not None and player.stopped:
+                return
+            if on_play:
+                on_play(audio_path)
             if platform.system() == "Darwin":
-                subprocess.call(["afplay", audio_path])
+                process = (player or LocalPlayer()).start(audio_path)
+                if process is not None:
+                    process.wait()
             else:
                 playsound(audio_path)
         else:
@@ -35,5 +70,55 @@ def cli_speak_local(text: str, filename: str = None):
     except Exception as e:
         logger.error(f"Failed to play audio: {e}")
         print(f"Error: Failed to play audio: {e}")
+
+def cli_speak_local(text: str, filename: str = None):
+    if filename is None:
+        filename = synthesize_speech_elevenlabs(text)
+    else:
+        filename = synthesize_speech_elevenlabs(text, output_filename=filename)
+    play_local_audio(os.path.join(BASE_DIR, "audio_cache", filename))
     logger.info(f"CLI speak local: '{text}', saved to audio_cache/{filename}")
     return filename
+
+def cli_speak_stream(text_chunks, speaker: str = None, on_play=None, stop=None):
+    """
+    Speak text on Sonos sentence by sentence, in one room or, for "all" or a
+    comma-separated list, in several at once. text_chunks may be a full string or
+    an iterable of text deltas; playback starts once the first sentence is synthesized.
+    on_play(path) is called as each file is queued; setting the stop event queues nothing
+    more and stops reading text_chunks.
+    """
+    spoken = []
+
+    def filenames():
+        for sentence, filename in synthesize_streaming(text_chunks, stop=stop):
+            if stop is not None and stop.is_set():
+                return
+            spoken.append(sentence)
+            if on_play:
+                on_play(os.path.join(BASE_DIR, "audio_cache", filename))
+            yield filename
+
+    if speaker and (speaker == "all" or "," in speaker):
+        broadcast_sequence_on_sonos(filenames(), speaker)
+    else:
+        play_sequence_on_sonos(filenames(), room_name=speaker)
+    text = " ".join(spoken)
+    logger.info(f"CLI speak stream: '{text}' on speaker: '{speaker}'")
+    return text
+
+def cli_speak_local_stream(text_chunks, on_play=None, stop=None, player: LocalPlayer = None):
+    """
+    Speak text locally sentence by sentence, playing each chunk while later ones
+    are still being synthesized. Setting the stop event (and calling the
+    player's stop()) ends the reply after the current sentence is cut off.
+    """
+    spoken = []
+    for sentence, filename in synthesize_streaming(text_chunks, stop=stop):
+        if stop is not None and stop.is_set():
+            break
+        spoken.append(sentence)
+        play_local_audio(os.path.join(BASE_DIR, "audio_cache", filename), on_play, player)
+    text = " ".join(spoken)
+    logger.info(f"CLI speak local stream: '{text}'")
+    return text
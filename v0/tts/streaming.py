@@ -0,0 +1,109 @@
+import os
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tts.elevenlabs_tts import synthesize_speech_elevenlabs
+
+TTS_CONCURRENCY = int(os.getenv("JARVIS_TTS_CONCURRENCY", "3"))
+
+# A sentence ends at . ! ? or a newline, optionally followed by closing quotes/brackets.
+SENTENCE_END_RE = re.compile(r"""[.!?]+["')\]]*\s+|\n+""")
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e."}
+
+class SentenceChunker:
+    """
+    Accumulates text as it arrives (e.g. LLM token deltas) and hands back
+    complete sentences. Fragments shorter than min_chars are held back and
+    merged with the next sentence so we don't pay a TTS round trip per "Yes.".
+    """
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str):
+        self.buffer += text
+        sentences = []
+        search_from = 0
+        while True:
+            match = SENTENCE_END_RE.search(self.buffer, search_from)
+            if not match:
+                break
+            candidate = self.buffer[:match.end()].strip()
+            last_word = candidate.split()[-1].lower() if candidate.split() else ""
+            if len(candidate) < self.min_chars or last_word in ABBREVIATIONS:
+                search_from = match.end()
+                continue
+            sentences.append(candidate)
+            self.buffer = self.buffer[match.end():]
+            search_from = 0
+        return sentences
+
+    def flush(self):
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+def split_sentences(text: str, min_chars=12):
+    chunker = SentenceChunker(min_chars=min_chars)
+    return chunker.feed(text) + chunker.flush()
+
+def synthesize_streaming(text_chunks, max_workers=TTS_CONCURRENCY, stop=None):
+    """
+    Split text into sentences as it arrives and synthesize them concurrently.
+    text_chunks is either a full string or an iterable of text deltas.
+    Yields (sentence, filename) in reading order as soon as each one is ready,
+    while later sentences are still being synthesized.
+    Once the consumer stops early (or the stop event is set) no more text is
+    read and text_chunks is closed, so an interrupted LLM stream abandons its turn.
+    """
+    if isinstance(text_chunks, str):
+        text_chunks = [text_chunks]
+    pending = queue.Queue()
+    done = object()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    stopped = threading.Event()
+    # Held around submit() so the executor is never shut down under the producer.
+    submitting = threading.Lock()
+
+    def submit(sentence):
+        with submitting:
+            if stopped.is_set():
+                return False
+            pending.put((sentence, executor.submit(synthesize_speech_elevenlabs, sentence)))
+            return True
+
+    def produce():
+        chunker = SentenceChunker()
+        try:
+            for delta in text_chunks:
+                if stopped.is_set() or (stop is not None and stop.is_set()):
+                    return
+                for sentence in chunker.feed(delta):
+                    if not submit(sentence):
+                        return
+            for sentence in chunker.flush():
+                submit(sentence)
+        except Exception as e:
+            print("Error reading text stream for TTS:", e)
+        finally:
+            close = getattr(text_chunks, "close", None)
+            if close:
+                close()
+            pending.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = pending.get()
+            if item is done:
+                break
+            sentence, future = item
+            try:
+                yield sentence, future.result()
+            except Exception as e:
+                print(f"Error synthesizing '{sentence[:40]}': {e}")
+    finally:
+        with submitting:
+            stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
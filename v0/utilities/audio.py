@@ -0,0 +1,42 @@
+import os
+import wave
+
+# MPEG-1 Layer III bitrates in kbps, indexed by the 4-bit bitrate field.
+MP3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]
+# MPEG-2/2.5 Layer III bitrates (used by the low sample-rate formats).
+MP3_BITRATES_V2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0]
+
+def _skip_id3(f):
+    header = f.read(10)
+    if header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        return 10 + size
+    return 0
+
+def estimate_audio_duration(path: str):
+    """
+    Estimate the playing time of a WAV or MP3 file in seconds without decoding it.
+    MP3 duration is taken from the first frame's bitrate, which is exact for the
+    constant-bitrate files ElevenLabs produces. Returns None if it can't tell.
+    """
+    try:
+        if path.lower().endswith(".wav"):
+            with wave.open(path, "rb") as wf:
+                return wf.getnframes() / float(wf.getframerate())
+        with open(path, "rb") as f:
+            offset = _skip_id3(f)
+            f.seek(offset)
+            data = f.read(4096)
+        for i in range(len(data) - 3):
+            if data[i] == 0xFF and (data[i + 1] & 0xE0) == 0xE0:
+                version_bits = (data[i + 1] >> 3) & 0x03
+                bitrate_index = data[i + 2] >> 4
+                table = MP3_BITRATES if version_bits == 0x03 else MP3_BITRATES_V2
+                bitrate = table[bitrate_index] * 1000
+                if bitrate:
+                    audio_bytes = os.path.getsize(path) - offset - i
+                    return audio_bytes * 8 / bitrate
+        return None
+    except Exception as e:
+        print(f"Could not estimate duration of {path}: {e}")
+        return None
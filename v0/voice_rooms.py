@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import argparse
+import threading
+from dotenv import load_dotenv
+from config import BASE_DIR
+from jarvis_voice import voice_mode, AsyncVoicePipeline
+from stt import get_stt_backend
+from audio.wakeword import WakeWordPool, WAKEWORD_WORKERS
+from audio.chimes import ActivationChimes
+from llm.speculative import SPECULATE
+
+load_dotenv()
+
+ROOMS_FILE = os.getenv("JARVIS_ROOMS_FILE", os.path.join(BASE_DIR, "rooms.json"))
+# How long a room's loop waits before restarting after its source drops or it fails to start.
+RESTART_DELAY = float(os.getenv("JARVIS_ROOM_RESTART_DELAY", "5"))
+
+def load_rooms(path=ROOMS_FILE):
+    """
+    Room definitions from a JSON list, one object per room:
+      {"name": "Kitchen", "stream": "10.0.0.12:5000", "speaker": "Kitchen"}
+      {"name": "Office", "device_index": 2}
+    "stream" subscribes to an audio stream server, otherwise a local input
+    device is used; "speaker" sends replies to that Sonos room instead of the
+    local speakers.
+    """
+    with open(path, "r") as f:
+        rooms = json.load(f)
+    names = [room.get("name") for room in rooms]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError(f"{path}: every room needs a unique name")
+    return rooms
+
+class VoiceSupervisor:
+    """
+    Runs a voice loop per room in one process. Every room gets its own thread,
+    audio source, wake-word handle, echo suppressor and conversation session
+    ("voice_<room>"), so one room transcribing or waiting on the LLM never
+    holds up another room's wake word. The speech-to-text backend (one loaded
+    model), the decoded activation clips and, with use_async, the pipeline's
+    event loop and HTTP connection pool are shared by all of them. Wake-word detection runs on a WakeWordPool
+    of worker processes (up to one per core, never more than there are rooms);
+    wakeword_workers=0 gives each room its own in-process Porcupine instead.
+    A room whose loop ends (source dropped, device missing) is restarted
+    after RESTART_DELAY until stop().
+    """
+    def __init__(self, rooms, use_async=False, wakeword_workers=WAKEWORD_WORKERS, speculate=SPECULATE):
+        self.rooms = rooms
+        self.use_async = use_async
+        self.speculate = speculate
+        self.stop_event = threading.Event()
+        self.threads = {}
+        self.stt_backend = get_stt_backend()
+        self.pipeline = AsyncVoicePipeline() if use_async else None
+        self.chimes = ActivationChimes()
+        if wakeword_workers is None:
+            wakeword_workers = os.cpu_count() or 1
+        workers = min(wakeword_workers, len(rooms))
+        self.wake_pool = WakeWordPool(workers) if workers > 0 else None
+
+    def _run_room(self, room):
+        name = room["name"]
+        while not self.stop_event.is_set():
+            try:
+                voice_mode(
+                    use_sonos=bool(room.get("speaker")),
+                    speaker=room.get("speaker"),
+                    device_index=room.get("device_index"),
+                    stream_addr=room.get("stream"),
+                    use_async=self.use_async,
+                    session_id=f"voice_{name}",
+                    room=name,
+                    stt_backend=self.stt_backend,
+                    pipeline=self.pipeline,
+                    stop_event=self.stop_event,
+                    wake_word=self.wake_pool.stream(name) if self.wake_pool else None,
+                    chimes=self.chimes,
+                    speculate=self.speculate,
+                )
+            except Exception as e:
+                print(f"[{name}] Voice loop failed: {e}")
+            if self.stop_event.wait(RESTART_DELAY):
+                break
+            print(f"[{name}] Restarting voice loop...")
+
+    def start(self):
+        for room in self.rooms:
+            thread = threading.Thread(target=self._run_room, args=(room,), name=f"voice-{room['name']}", daemon=True)
+            self.threads[room["name"]] = thread
+            thread.start()
+        print(f"Listening in {len(self.rooms)} rooms: {', '.join(self.threads)}")
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        deadline = time.time() + timeout
+        for thread in self.threads.values():
+            thread.join(max(0.0, deadline - time.time()))
+        if self.pipeline:
+            self.pipeline.close()
+        if self.wake_pool:
+            self.wake_pool.close()
+        self.chimes.close()
+
+    def run(self):
+        """Start every room and block until Ctrl-C."""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self.threads.values()):
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("Voice rooms terminating...")
+        finally:
+            self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Jarvis voice mode for several rooms in one process")
+    parser.add_argument("--rooms", type=str, default=ROOMS_FILE, help="JSON file describing the rooms")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use the asyncio pipeline with barge-in")
+    parser.add_argument("--speculate", action="store_true", default=SPECULATE,
+                        help="Start the LLM on the partial transcript before the user has finished")
+    parser.add_argument("--wakeword-workers", type=int, default=WAKEWORD_WORKERS,
+                        help="Wake-word worker processes (0 runs Porcupine in each room's thread)")
+    args = parser.parse_args()
+    VoiceSupervisor(load_rooms(args.rooms), use_async=args.use_async, wakeword_workers=args.wakeword_workers,
+                    speculate=args.speculate).run()
@@ -1,13 +1,11 @@
 import os
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
-from flask import Flask, request, render_template, redirect, url_for, abort, jsonify
+from flask import Flask, request, render_template, redirect, url_for, abort, jsonify, Response, stream_with_context
 import json
-from sonos import play_on_sonos
-from tts import synthesize_speech_elevenlabs
-from sonos.speakers import find_sonos_speakers
-from sonos.cache import load_sonos_cache, save_sonos_cache
-from llm.chat import chat_with_jarvis_session, chat_with_jarvis_function_call, conversation_sessions
+from sonos import play_on_sonos, speaker_registry
+from tts import synthesize_speech_elevenlabs, cache_stats
+from llm.chat import chat_with_jarvis_session, chat_with_jarvis_function_call, chat_with_jarvis_function_call_stream, conversation_store
 from utilities import logger
 from db.models import (
     add_todo, get_todos, update_todo, delete_todo,
@@ -21,23 +19,13 @@ app = Flask(__name__)
 # For production, set the SECRET_KEY environment variable; otherwise, this generates a secure random key.
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 
-CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sonos_cache.json")
-
 def get_speaker_list():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, "r") as f:
-            cache = json.load(f)
-        return list(cache.keys())
-    return []
+    return list(speaker_registry.rooms().keys())
 
 def refresh_speaker_list():
-    speakers = find_sonos_speakers()
-    cache = load_sonos_cache()
-    if speakers:
-        for speaker in speakers:
-            cache[speaker.player_name] = speaker.ip_address
-        save_sonos_cache(cache)
-    return list(cache.keys())
+    # Discovery goes through the registry so the warm speaker pool picks up new rooms too.
+    speaker_registry.refresh()
+    return list(speaker_registry.rooms().keys())
 
 def get_history():
     import re
@@ -201,9 +189,8 @@ def chat():
         if user_message:
             # Use function calling to maintain conversation context
             chat_with_jarvis_function_call(user_id, user_message)
-    session_data = conversation_sessions.get(user_id, {"messages": []})
     # Filter out any system messages
-    conversation = [msg for msg in session_data["messages"] if msg.get("role") != "system"]
+    conversation = [msg for msg in conversation_store.get_messages(user_id) if msg.get("role") != "system"]
     return render_template("chat.html", conversation=conversation)
 
 @app.route("/chat_ajax", methods=["POST"])
@@ -212,14 +199,29 @@ def chat_ajax():
     user_message = request.form.get("message", "").strip()
     if not user_message:
         return jsonify({"error": "Empty message"}), 400
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        # Stream tokens as server-sent events while the reply is generated.
+        def events():
+            try:
+                for token in chat_with_jarvis_function_call_stream(user_id, user_message):
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                yield "event: done\ndata: {}\n\n"
+            except Exception as e:
+                logger.error(f"Error streaming chat reply for {user_id}: {e}")
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        return Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     # Process the message through your function-calling method.
     chat_with_jarvis_function_call(user_id, user_message)
-    session_data = conversation_sessions.get(user_id, {"messages": []})
-    conversation = [msg for msg in session_data["messages"] if msg.get("role") != "system"]
+    conversation = [msg for msg in conversation_store.get_messages(user_id) if msg.get("role") != "system"]
     # Return the latest assistant message.
     new_message = conversation[-1] if conversation and conversation[-1].get("role") == "assistant" else {}
     return jsonify({"new_message": new_message})
 
+@app.route("/tts_cache", methods=["GET"])
+def tts_cache():
+    return jsonify(cache_stats())
+
 app.register_blueprint(google_bp)
 
 if __name__ == "__main__":